@@ -0,0 +1,281 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import parse_qsl, urlencode
+
+from content_encoding import scope_encoding
+from responses import format_for_accept
+
+# ---------------------------
+# CACHE DE RESPOSTAS (LRU + TTL)
+# ---------------------------
+# Limites do cache: número de respostas e total de bytes guardados
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "256"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+
+def parse_ttls(value):
+    """
+    Lê TTLs por rota no formato "rota=segundos,rota=segundos"
+    (ex.: "/api/houses=30,/api/houses/price-stats=600").
+    """
+    ttls = {}
+    for item in value.split(","):
+        path, _, seconds = item.strip().partition("=")
+        if path and seconds:
+            ttls[path] = float(seconds)
+    return ttls
+
+
+class ResponseCache:
+    """
+    Cache LRU limitado por quantidade e por bytes, com TTL por entrada e
+    contadores de acertos/faltas por rota.
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.counters = {}
+
+    def _count(self, path, name):
+        counters = self.counters.setdefault(path, {"hits": 0, "misses": 0})
+        counters[name] += 1
+
+    def get(self, path, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                # Expirada: conta como falta e libera o espaço
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self._count(path, "misses")
+                return None
+
+            self._entries.move_to_end(key)
+            self._count(path, "hits")
+            return entry[1]
+
+    def set(self, key, value, size, ttl):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, value, size)
+            self._bytes += size
+            # Remove as entradas menos usadas até caber nos limites
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "endpoints": {path: dict(counters) for path, counters in self.counters.items()},
+            }
+
+
+def cache_key(scope, version):
+    """
+    Chave canônica: rota + parâmetros ordenados + formato pedido + codificação
+    negociada + versão dos dados.
+    Devolve None para requisições que não devem ser guardadas (streaming NDJSON).
+    """
+    params = sorted(parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True))
+    if any(name == "stream" and value.lower() in ("1", "true", "yes", "on") for name, value in params):
+        return None
+
+    headers = dict(scope["headers"])
+    fmt = format_for_accept(headers.get(b"accept", b"").decode("latin-1"))
+    if fmt == "ndjson":
+        return None
+
+    return (scope["path"], urlencode(params), fmt, scope_encoding(scope), version)
+
+
+class ResponseCacheMiddleware:
+    """
+    Middleware ASGI que guarda o corpo já serializado das respostas GET 200
+    das rotas configuradas. Um acerto devolve os bytes prontos, sem executar a rota.
+    """
+
+    def __init__(self, app, cache, ttls, version=lambda: None):
+        self.app = app
+        self.cache = cache
+        self.ttls = ttls
+        self.version = version
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path")
+        if scope["type"] != "http" or scope["method"] != "GET" or path not in self.ttls:
+            return await self.app(scope, receive, send)
+
+        version = self.version()
+        key = cache_key(scope, version)
+        if key is None:
+            return await self.app(scope, receive, send)
+
+        cached = self.cache.get(path, key)
+        if cached is not None:
+            status, headers, body = cached
+            await send({"type": "http.response.start", "status": status,
+                        "headers": headers + [(b"x-cache", b"HIT")]})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        start, chunks = {}, []
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                start.update(message)
+                message = {**message, "headers": list(message.get("headers", [])) + [(b"x-cache", b"MISS")]}
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body") and start.get("status") == 200:
+                    body = b"".join(chunks)
+                    # Guardado sob a versão do início: uma troca do snapshot durante a rota
+                    # não pode rotular o corpo antigo como atual. Só sem dados carregados
+                    # (versão 0) a versão é lida de novo, pois a rota fez a primeira carga
+                    store_key = key if version else cache_key(scope, self.version())
+                    self.cache.set(store_key, (200, list(start.get("headers", [])), body), len(body), self.ttls[path])
+            await send(message)
+
+        await self.app(scope, receive, capture)
+
+
+# ---------------------------
+# GET CONDICIONAL (ETag / Last-Modified)
+# ---------------------------
+def make_etag(*parts):
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match, etag):
+    # Lista de ETags do If-None-Match; comparação fraca (ignora o prefixo W/)
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def not_modified_since(if_modified_since, modified_at):
+    try:
+        since = parsedate_to_datetime(if_modified_since).timestamp()
+    except (TypeError, ValueError):
+        return False
+    # Datas HTTP têm resolução de segundos
+    return int(modified_at) <= since
+
+
+class ConditionalGetMiddleware:
+    """
+    Middleware ASGI que responde 304 Not Modified quando o cliente já tem a
+    versão atual da resposta.
+
+    Com a versão dos dados conhecida ("version" devolve o hash do snapshot), o
+    ETag sai da versão + chave canônica da requisição e o 304 é respondido antes
+    de executar a rota. Sem versão (snapshot ainda não carregado ou expirado,
+    ou consultas diretas ao Postgres), a rota executa e o ETag é o hash do
+    corpo gerado, o que ainda poupa a transferência.
+    """
+
+    def __init__(self, app, paths, version=lambda: None, last_modified=lambda: None):
+        self.app = app
+        self.paths = paths
+        self.version = version
+        self.last_modified = last_modified
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET" or scope.get("path") not in self.paths:
+            return await self.app(scope, receive, send)
+
+        key = cache_key(scope, None)
+        if key is None:
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        if_none_match = headers.get(b"if-none-match", b"").decode("latin-1")
+        if_modified_since = headers.get(b"if-modified-since", b"").decode("latin-1")
+
+        version = self.version()
+        if version is not None:
+            validators, modified_at = self._validators(make_etag(version, key))
+            if self._is_fresh(validators, modified_at, if_none_match, if_modified_since):
+                return await self._not_modified(send, validators)
+
+            async def tag(message):
+                if message["type"] == "http.response.start" and message["status"] == 200:
+                    message = {**message, "headers": list(message.get("headers", [])) + validators}
+                await send(message)
+
+            return await self.app(scope, receive, tag)
+
+        # Versão desconhecida: o corpo é guardado até o fim para montar o ETag
+        start, chunks = {}, []
+
+        async def buffer(message):
+            if message["type"] == "http.response.start":
+                start.update(message)
+                return
+            if message["type"] != "http.response.body":
+                return await send(message)
+
+            chunks.append(message.get("body", b""))
+            if message.get("more_body"):
+                return
+            body = b"".join(chunks)
+            headers = list(start.get("headers", []))
+            if start.get("status") == 200:
+                # ETag do próprio corpo, não da versão lida agora: o refresher pode ter
+                # trocado o snapshot enquanto a rota montava a resposta com o anterior
+                validators, modified_at = self._validators(
+                    make_etag(hashlib.blake2b(body, digest_size=16).hexdigest()), with_date=False
+                )
+                if self._is_fresh(validators, modified_at, if_none_match, if_modified_since):
+                    return await self._not_modified(send, validators)
+                headers += validators
+            await send({**start, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, buffer)
+
+    def _validators(self, etag, with_date=True):
+        modified_at = self.last_modified() if with_date else None
+        validators = [(b"etag", etag.encode()), (b"cache-control", b"no-cache")]
+        if modified_at is not None:
+            validators.append((b"last-modified", formatdate(modified_at, usegmt=True).encode()))
+        return validators, modified_at
+
+    @staticmethod
+    def _is_fresh(validators, modified_at, if_none_match, if_modified_since):
+        # If-None-Match tem precedência sobre If-Modified-Since (RFC 9110)
+        if if_none_match:
+            return etag_matches(if_none_match, validators[0][1].decode())
+        return bool(if_modified_since) and modified_at is not None \
+            and not_modified_since(if_modified_since, modified_at)
+
+    async def _not_modified(self, send, validators):
+        await send({"type": "http.response.start", "status": 304, "headers": validators})
+        await send({"type": "http.response.body", "body": b""})
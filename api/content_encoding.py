@@ -0,0 +1,198 @@
+import os
+import zlib
+
+# Codecs opcionais: sem o pacote instalado, a codificação simplesmente não é oferecida
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from offload import off_loop
+from responses import PARQUET_MEDIA_TYPE
+
+# ---------------------------
+# COMPRESSÃO DAS RESPOSTAS (Accept-Encoding)
+# ---------------------------
+# Corpos menores que isso (em bytes) seguem sem compressão
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+# Corpos (ou pedaços do streaming) a partir disso são comprimidos numa thread; abaixo,
+# a troca de thread custaria mais que a própria compressão
+COMPRESSION_THREAD_MIN_SIZE = int(os.getenv("COMPRESSION_THREAD_MIN_SIZE", str(64 * 1024)))
+
+# Nível de cada codificação (gzip 1-9, zstd 1-22, brotli 0-11)
+COMPRESSION_LEVELS = {
+    "gzip": int(os.getenv("GZIP_LEVEL", "6")),
+    "zstd": int(os.getenv("ZSTD_LEVEL", "3")),
+    "br": int(os.getenv("BROTLI_LEVEL", "4")),
+}
+
+# Ordem de preferência do servidor entre as codificações aceitas pelo cliente
+COMPRESSION_ENCODINGS = tuple(
+    e.strip() for e in os.getenv("COMPRESSION_ENCODINGS", "zstd,br,gzip").split(",") if e.strip()
+)
+
+# Formatos já comprimidos, que não ganham nada com uma segunda compressão
+SKIP_MEDIA_TYPES = (PARQUET_MEDIA_TYPE,)
+
+
+def available_encodings():
+    # Codificações preferidas cujo codec está instalado
+    installed = {"gzip": True, "zstd": zstandard is not None, "br": brotli is not None}
+    return [e for e in COMPRESSION_ENCODINGS if installed.get(e)]
+
+
+class Compressor:
+    """
+    Compressor incremental com a mesma interface para as três codificações:
+    compress() devolve os bytes prontos para envio de cada pedaço e finish()
+    fecha o fluxo.
+    """
+
+    def __init__(self, encoding, level=None):
+        self.encoding = encoding
+        level = COMPRESSION_LEVELS[encoding] if level is None else level
+        if encoding == "gzip":
+            # wbits=31: cabeçalho gzip com mtime zerado, saída determinística
+            self._obj = zlib.compressobj(level, zlib.DEFLATED, 31)
+        elif encoding == "zstd":
+            self._obj = zstandard.ZstdCompressor(level=level).compressobj()
+        else:
+            self._obj = brotli.Compressor(quality=level)
+
+    def compress(self, data, flush=False):
+        # flush=True esvazia o buffer para o cliente já poder descomprimir o pedaço
+        if self.encoding == "br":
+            out = self._obj.process(data)
+            return out + self._obj.flush() if flush else out
+        out = self._obj.compress(data)
+        if flush:
+            mode = zlib.Z_SYNC_FLUSH if self.encoding == "gzip" else zstandard.COMPRESSOBJ_FLUSH_BLOCK
+            out += self._obj.flush(mode)
+        return out
+
+    def finish(self):
+        if self.encoding == "br":
+            return self._obj.finish()
+        return self._obj.flush()
+
+
+def compress(data, encoding, level=None):
+    compressor = Compressor(encoding, level)
+    return compressor.compress(data) + compressor.finish()
+
+
+def choose_encoding(accept_encoding, encodings=None):
+    """
+    Codificação a usar para o cabeçalho Accept-Encoding: a de maior q aceita
+    pelo cliente e, no empate, a primeira na preferência do servidor.
+    None quando nenhuma serve (resposta sem compressão).
+    """
+    encodings = available_encodings() if encodings is None else encodings
+    weights = {}
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip()] = q
+
+    best, best_q = None, 0.0
+    for encoding in encodings:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def scope_encoding(scope):
+    headers = dict(scope["headers"])
+    return choose_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+
+
+class CompressionMiddleware:
+    """
+    Middleware ASGI que comprime as respostas com a codificação negociada
+    (zstd, brotli ou gzip). Respostas completas abaixo de "min_size" seguem
+    como estão; respostas em streaming (NDJSON) são comprimidas pedaço a pedaço.
+    A partir de "thread_min_size" bytes a compressão sai do event loop.
+    """
+
+    def __init__(self, app, min_size=COMPRESSION_MIN_SIZE, thread_min_size=COMPRESSION_THREAD_MIN_SIZE):
+        self.app = app
+        self.min_size = min_size
+        self.thread_min_size = thread_min_size
+
+    async def _compress(self, compressor, body, flush=False, finish=False):
+        def run():
+            out = compressor.compress(body, flush)
+            return out + compressor.finish() if finish else out
+
+        # Uma chamada por vez por compressor: os pedaços seguem em ordem mesmo numa thread
+        if len(body) >= self.thread_min_size:
+            return await off_loop(run)
+        return run()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        encoding = scope_encoding(scope)
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start = {}
+        state = {"compressor": None, "passthrough": False}
+
+        async def compressing_send(message):
+            if message["type"] == "http.response.start":
+                start.update(message)
+                return
+            if message["type"] != "http.response.body" or state["passthrough"]:
+                return await send(message)
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            compressor = state["compressor"]
+
+            if compressor is None:
+                headers = start.get("headers", [])
+                names = {name.lower(): value for name, value in headers}
+                media_type = names.get(b"content-type", b"").decode("latin-1")
+                skip = (
+                    start.get("status") != 200
+                    or b"content-encoding" in names
+                    or media_type.startswith(SKIP_MEDIA_TYPES)
+                    or (not more_body and len(body) < self.min_size)
+                )
+                if skip:
+                    state["passthrough"] = True
+                    await send(start)
+                    return await send(message)
+
+                compressor = state["compressor"] = Compressor(encoding)
+                headers = [(name, value) for name, value in headers if name.lower() != b"content-length"]
+                headers += [(b"content-encoding", encoding.encode()), (b"vary", b"Accept-Encoding")]
+                if not more_body:
+                    # Resposta completa: comprime de uma vez e informa o tamanho final
+                    body = await self._compress(compressor, body, finish=True)
+                    headers.append((b"content-length", str(len(body)).encode()))
+                    await send({**start, "headers": headers})
+                    return await send({"type": "http.response.body", "body": body})
+                await send({**start, "headers": headers})
+
+            if more_body:
+                body = await self._compress(compressor, body, flush=True)
+            else:
+                body = await self._compress(compressor, body, finish=True)
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self.app(scope, receive, compressing_send)
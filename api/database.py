@@ -0,0 +1,341 @@
+from collections import Counter
+from postgrest import AsyncPostgrestClient
+from supabase import AsyncClient
+import asyncio
+import httpx
+import math
+import os
+from dotenv import load_dotenv
+
+# h2 é opcional: sem ele, o cliente fica em HTTP/1.1 com keep-alive
+try:
+    import h2
+except ImportError:
+    h2 = None
+
+# ---------------------------
+# CONFIGURAÇÃO DO SUPABASE
+# ---------------------------
+# Carrega variáveis de ambiente do arquivo .env (URL e KEY do Supabase)
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+
+# ---------------------------
+# POOL DE CONEXÕES COM O PostgREST
+# ---------------------------
+# Conexões abertas ao mesmo tempo e quantas ficam abertas (keep-alive) entre requisições
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "20"))
+UPSTREAM_MAX_KEEPALIVE = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", str(UPSTREAM_MAX_CONNECTIONS)))
+# Segundos que uma conexão ociosa continua aberta
+UPSTREAM_KEEPALIVE_EXPIRY = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", "60"))
+# HTTP/2 (negociado via TLS) multiplexa as requisições numa mesma conexão
+UPSTREAM_HTTP2 = os.getenv("UPSTREAM_HTTP2", "1") == "1" and h2 is not None
+# Limites por chamada: abrir a conexão e cada etapa (espera por vaga no pool, envio, leitura)
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "5"))
+UPSTREAM_TIMEOUT = float(os.getenv("UPSTREAM_TIMEOUT", "60"))
+
+
+class UpstreamTransport(httpx.AsyncHTTPTransport):
+    """
+    Transporte httpx que conta requisições, conexões abertas e versões HTTP
+    negociadas: com o pool aquecido, conexões abertas param de crescer.
+    """
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.requests = 0
+        self.connections_opened = 0
+        self.http_versions = Counter()
+
+    async def _trace(self, event, info):
+        if event == "connection.connect_tcp.complete":
+            self.connections_opened += 1
+
+    async def handle_async_request(self, request):
+        self.requests += 1
+        request.extensions["trace"] = self._trace
+        response = await super().handle_async_request(request)
+        self.http_versions[response.extensions.get("http_version", b"").decode()] += 1
+        return response
+
+    def pool_connections(self):
+        """
+        Conexões abertas e ociosas no pool, ou None se não der para saber. O
+        httpcore não expõe o pool publicamente (as conexões fechadas por
+        inatividade nem passam pelo trace): os atributos internos são lidos
+        com getattr, e o pyproject fixa o httpcore na série 1.x que os tem.
+        """
+        connections = getattr(getattr(self, "_pool", None), "connections", None)
+        try:
+            return len(connections), sum(connection.is_idle() for connection in connections)
+        except (AttributeError, TypeError):
+            return None
+
+    def stats(self):
+        pool = self.pool_connections()
+        connections, idle = pool if pool is not None else (None, None)
+        return {
+            "requests": self.requests,
+            "connections_opened": self.connections_opened,
+            "reuse_ratio": 1 - self.connections_opened / self.requests if self.requests else None,
+            "connections": connections,
+            "active": connections - idle if pool is not None else None,
+            "idle": idle,
+            "http_versions": dict(self.http_versions),
+        }
+
+
+class PooledPostgrestClient(AsyncPostgrestClient):
+    # Sessão httpx com o pool, o HTTP/2 e os timeouts configurados acima
+    def create_session(self, base_url, headers, timeout, verify=True, proxy=None):
+        self.transport = UpstreamTransport(
+            limits=httpx.Limits(
+                max_connections=UPSTREAM_MAX_CONNECTIONS,
+                max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE,
+                keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY,
+            ),
+            http2=UPSTREAM_HTTP2,
+            verify=verify,
+            proxy=proxy,
+        )
+        return httpx.AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=httpx.Timeout(UPSTREAM_TIMEOUT, connect=UPSTREAM_CONNECT_TIMEOUT),
+            transport=self.transport,
+            follow_redirects=True,
+        )
+
+
+class PooledClient(AsyncClient):
+    # O supabase recria o cliente PostgREST quando a autenticação muda: sempre com o pool
+    @staticmethod
+    def _init_postgrest_client(rest_url, headers, schema, timeout=None, verify=True, proxy=None):
+        return PooledPostgrestClient(rest_url, headers=headers, schema=schema, verify=verify, proxy=proxy)
+
+
+# Cliente assíncrono: as chamadas ao PostgREST não ocupam uma thread enquanto esperam
+# e reaproveitam as conexões do pool
+supabase = PooledClient(SUPABASE_URL, SUPABASE_KEY)
+
+
+# ---------------------------
+# CONSULTAS COALESCIDAS (SINGLE-FLIGHT)
+# ---------------------------
+class SingleFlight:
+    """
+    Consultas idênticas feitas ao mesmo tempo compartilham uma única ida ao
+    PostgREST: a primeira dispara a busca e as demais aguardam o mesmo resultado
+    (ou a mesma exceção). Terminada a busca, a próxima chamada busca de novo.
+    O resultado é compartilhado, então quem o recebe não deve alterá-lo.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self.calls = 0
+        self.shared = 0
+
+    async def run(self, key, fn, *args, **kwargs):
+        self.calls += 1
+        task = self._flights.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn(*args, **kwargs))
+            self._flights[key] = task
+            task.add_done_callback(lambda _: self._flights.pop(key, None))
+        else:
+            self.shared += 1
+        # shield: uma requisição cancelada (cliente desconectou) não cancela a busca das demais
+        return await asyncio.shield(task)
+
+    def stats(self):
+        return {"calls": self.calls, "shared": self.shared, "in_flight": len(self._flights)}
+
+
+single_flight = SingleFlight()
+
+
+def pool_stats():
+    """
+    Configuração e uso do pool de conexões com o PostgREST.
+    """
+    return {
+        "max_connections": UPSTREAM_MAX_CONNECTIONS,
+        "max_keepalive": UPSTREAM_MAX_KEEPALIVE,
+        "keepalive_expiry": UPSTREAM_KEEPALIVE_EXPIRY,
+        "http2": UPSTREAM_HTTP2,
+        "connect_timeout": UPSTREAM_CONNECT_TIMEOUT,
+        "timeout": UPSTREAM_TIMEOUT,
+        **supabase.postgrest.transport.stats(),
+        "single_flight": single_flight.stats(),
+    }
+
+
+async def close_pool():
+    # Fecha as conexões persistentes (no desligamento da API)
+    await supabase.postgrest.aclose()
+
+TABLE_NAME = "miami_housing"
+PAGE_SIZE = 1000
+# Coluna cujo maior valor entra na assinatura da tabela; uma coluna de data de
+# atualização (ou checksum) detecta também edições que não mudam o número de linhas
+CHANGE_COLUMN = os.getenv("SNAPSHOT_CHANGE_COLUMN", "parcelno")
+
+# Modo de leitura: "sequential" (página a página) ou "parallel" (contagem + páginas concorrentes)
+FETCH_MODE = os.getenv("FETCH_MODE", "sequential")
+# Número máximo de páginas buscadas ao mesmo tempo no modo paralelo
+FETCH_WORKERS = int(os.getenv("FETCH_WORKERS", "8"))
+
+
+# ---------------------------
+# LEITURA PAGINADA
+# ---------------------------
+def _query(*columns, where=None, **options):
+    query = supabase.table(TABLE_NAME).select(*columns, **options)
+    # "where" recebe a consulta e devolve a mesma consulta com os filtros aplicados
+    return where(query) if where else query
+
+
+async def count_rows(where=None):
+    """
+    Conta as linhas da tabela sem baixá-las (HEAD com Prefer: count=exact).
+    """
+    response = await _query("*", where=where, count="exact", head=True).execute()
+    return response.count or 0
+
+
+async def fetch_page(columns, page, where=None, key="parcelno"):
+    # Sem ORDER BY o Postgres não garante a mesma ordem entre consultas (varreduras
+    # sincronizadas, planos paralelos): páginas por offset repetiriam ou perderiam linhas
+    response = await _query(*columns, where=where).order(key).range(
+        page * PAGE_SIZE, (page + 1) * PAGE_SIZE - 1).execute()
+    return response.data
+
+
+async def fetch_rows_sequential(*columns, where=None):
+    """
+    Busca todas as linhas da tabela, ordenadas por parcelno, página a página,
+    até receber uma página vazia.
+    """
+    columns = columns or ("*",)
+    data = []
+    page = 0
+
+    while True:
+        response = await fetch_page(columns, page, where)
+
+        if not response:
+            break
+
+        data.extend(response)
+        page += 1
+
+    return data
+
+
+async def fetch_rows_parallel(*columns, where=None, workers=None):
+    """
+    Conta as linhas e busca todas as páginas de uma vez, com no máximo
+    "workers" requisições em andamento.
+    O resultado mantém a mesma ordem de colunas e linhas do modo sequencial.
+    """
+    columns = columns or ("*",)
+    pages = math.ceil(await count_rows(where) / PAGE_SIZE)
+    limit = asyncio.Semaphore(workers or FETCH_WORKERS)
+
+    async def limited(page):
+        async with limit:
+            return await fetch_page(columns, page, where)
+
+    # gather devolve as páginas na ordem de submissão
+    data = []
+    for response in await asyncio.gather(*(limited(page) for page in range(pages))):
+        data.extend(response)
+
+    # Linhas inseridas depois da contagem: continua sequencialmente até a página vazia
+    page = pages
+    while len(data) == page * PAGE_SIZE:
+        response = await fetch_page(columns, page, where)
+        if not response:
+            break
+        data.extend(response)
+        page += 1
+
+    return data
+
+
+async def iter_keyset(*columns, where=None, key="parcelno", after=None, limit=None):
+    """
+    Percorre a tabela por cursor (key > after, ordenado por key), devolvendo
+    cada página assim que ela chega. Sem "limit", segue até o fim da tabela.
+    As linhas sempre trazem a coluna key, necessária para avançar o cursor.
+    """
+    columns = columns or ("*",)
+    select = columns if "*" in columns or key in columns else (*columns, key)
+    cursor = after
+    remaining = limit
+
+    # O PostgREST limita o tamanho da resposta, então lotes de até PAGE_SIZE linhas
+    while remaining is None or remaining > 0:
+        size = PAGE_SIZE if remaining is None else min(PAGE_SIZE, remaining)
+        query = _query(*select, where=where).order(key)
+        if cursor is not None:
+            query = query.gt(key, cursor)
+        response = (await query.limit(size).execute()).data
+
+        if response:
+            yield response
+        if len(response) < size:
+            break
+
+        cursor = response[-1][key]
+        if remaining is not None:
+            remaining -= len(response)
+
+
+def project(rows, columns, key="parcelno"):
+    # Remove a coluna key quando ela foi incluída só por causa do cursor
+    if not columns or "*" in columns or key in columns:
+        return rows
+    return [{c: row[c] for c in columns} for row in rows]
+
+
+async def fetch_keyset(*columns, where=None, key="parcelno", after=None, limit=PAGE_SIZE):
+    """
+    Paginação por cursor: busca até "limit" linhas com key > after, ordenadas por key.
+    Devolve as linhas e o próximo cursor (None quando não há mais linhas).
+    """
+    data = []
+    async for page in iter_keyset(*columns, where=where, key=key, after=after, limit=limit + 1):
+        data.extend(page)
+
+    next_cursor = None
+    if len(data) > limit:
+        data = data[:limit]
+        next_cursor = data[-1][key]
+    return project(data, columns, key), next_cursor
+
+
+async def fetch_rows(*columns, where=None, mode=None):
+    """
+    Busca todas as linhas da tabela. Sem colunas informadas, equivale a select("*").
+    Leituras iguais da tabela inteira feitas ao mesmo tempo viram uma só busca.
+    """
+    mode = mode or FETCH_MODE
+    fetch = fetch_rows_parallel if mode == "parallel" else fetch_rows_sequential
+    if where is not None:
+        # "where" é uma função e não serve de chave: busca sem coalescer
+        return await fetch(*columns, where=where)
+    return await single_flight.run(("rows", columns, mode), fetch, *columns)
+
+
+async def fetch_signature(column=None):
+    """
+    Assinatura barata da tabela: número de linhas e maior valor de "column"
+    (CHANGE_COLUMN por padrão). Duas requisições pequenas, sem baixar a tabela.
+    """
+    column = column or CHANGE_COLUMN
+    count, latest = await asyncio.gather(
+        count_rows(),
+        _query(column).order(column, desc=True, nullsfirst=False).limit(1).execute(),
+    )
+    return count, latest.data[0][column] if latest.data else None
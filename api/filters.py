@@ -0,0 +1,91 @@
+import operator
+
+import numpy as np
+from fastapi import Query
+
+# ---------------------------
+# FILTROS DE IMÓVEIS
+# ---------------------------
+# Cada filtro é uma tupla (coluna, operador, valor). A mesma lista é aplicada
+# tanto como máscara NumPy sobre o snapshot quanto como filtro do PostgREST.
+OPERATORS = {
+    "gte": operator.ge,
+    "lte": operator.le,
+    "eq": operator.eq,
+}
+
+
+def house_filters(
+    min_price: float = Query(None),
+    max_price: float = Query(None),
+    min_age: int = Query(None),
+    max_age: int = Query(None),
+    min_area: int = Query(None),
+    max_area: int = Query(None),
+    structure_quality: int = Query(None),
+    avno60plus: int = Query(None),
+    max_ocean_dist: int = Query(None),
+    max_hwy_dist: int = Query(None),
+):
+    """
+    Dependência FastAPI com os filtros da barra lateral, compartilhada por
+    todas as rotas de imóveis e estatísticas.
+    """
+    filters = []
+
+    # Mesma semântica da rota original: alguns filtros ignoram o valor 0
+    if min_price:
+        filters.append(("sale_prc", "gte", min_price))
+    if max_price:
+        filters.append(("sale_prc", "lte", max_price))
+    if min_age:
+        filters.append(("age", "gte", min_age))
+    if max_age:
+        filters.append(("age", "lte", max_age))
+    if min_area:
+        filters.append(("tot_lvg_area", "gte", min_area))
+    if max_area:
+        filters.append(("tot_lvg_area", "lte", max_area))
+    if structure_quality:
+        filters.append(("structure_quality", "eq", structure_quality))
+    if avno60plus is not None:
+        filters.append(("avno60plus", "eq", avno60plus))
+    if max_ocean_dist is not None:
+        filters.append(("ocean_dist", "lte", max_ocean_dist))
+    if max_hwy_dist is not None:
+        filters.append(("hwy_dist", "lte", max_hwy_dist))
+
+    return filters
+
+
+# Parâmetro da API (e das funções SQL) correspondente a cada (coluna, operador)
+PARAM_NAMES = {
+    ("sale_prc", "gte"): "min_price",
+    ("sale_prc", "lte"): "max_price",
+    ("age", "gte"): "min_age",
+    ("age", "lte"): "max_age",
+    ("tot_lvg_area", "gte"): "min_area",
+    ("tot_lvg_area", "lte"): "max_area",
+    ("structure_quality", "eq"): "structure_quality",
+    ("avno60plus", "eq"): "avno60plus",
+    ("ocean_dist", "lte"): "max_ocean_dist",
+    ("hwy_dist", "lte"): "max_hwy_dist",
+}
+
+
+def filter_params(filters):
+    # Filtros como argumentos nomeados das funções RPC
+    return {PARAM_NAMES[(column, op)]: value for column, op, value in filters}
+
+
+def apply_to_query(query, filters):
+    for column, op, value in filters:
+        query = getattr(query, op)(column, value)
+    return query
+
+
+def filter_mask(snap, filters):
+    mask = np.ones(len(snap), dtype=bool)
+    for column, op, value in filters:
+        mask &= OPERATORS[op](snap[column], value)
+    return mask
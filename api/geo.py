@@ -0,0 +1,311 @@
+import heapq
+import math
+
+import numpy as np
+
+# ---------------------------
+# GEOMETRIA (lat/lon -> metros)
+# ---------------------------
+EARTH_RADIUS_M = 6371008.8
+SQRT3 = math.sqrt(3)
+
+
+class Projection:
+    """
+    Projeção equiretangular local: converte lat/lon em metros (x leste, y norte)
+    em torno de uma origem. Na escala de uma região metropolitana o erro é
+    desprezível e as distâncias viram euclidianas.
+    """
+
+    def __init__(self, lat0, lon0):
+        self.lat0 = lat0
+        self.lon0 = lon0
+        self.kx = math.radians(1) * EARTH_RADIUS_M * math.cos(math.radians(lat0))
+        self.ky = math.radians(1) * EARTH_RADIUS_M
+
+    @classmethod
+    def around(cls, latitude, longitude):
+        # Origem no centro dos pontos válidos (ou 0, 0 se não houver nenhum)
+        valid = np.isfinite(latitude) & np.isfinite(longitude)
+        if not valid.any():
+            return cls(0.0, 0.0)
+        return cls(float(np.mean(latitude[valid])), float(np.mean(longitude[valid])))
+
+    def to_xy(self, latitude, longitude):
+        return (longitude - self.lon0) * self.kx, (latitude - self.lat0) * self.ky
+
+    def to_latlon(self, x, y):
+        return y / self.ky + self.lat0, x / self.kx + self.lon0
+
+
+# ---------------------------
+# GRADE HEXAGONAL
+# ---------------------------
+# Coordenadas axiais deslocadas para caber numa chave int64 (±1M hexágonos por eixo)
+HEX_KEY_OFFSET = 2**20
+HEX_KEY_SPAN = 2 * HEX_KEY_OFFSET
+
+
+def hex_cells(x, y, radius):
+    """
+    Coordenadas axiais (q, r) do hexágono (vértice para cima, raio = centro
+    ao vértice) que contém cada ponto, com arredondamento cúbico vetorizado.
+    """
+    qf = (SQRT3 / 3 * x - y / 3) / radius
+    rf = (2 / 3 * y) / radius
+    sf = -qf - rf
+
+    q, r, s = np.rint(qf), np.rint(rf), np.rint(sf)
+    dq, dr, ds = np.abs(q - qf), np.abs(r - rf), np.abs(s - sf)
+    # A coordenada com maior erro de arredondamento é recalculada pelas outras duas
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    q = np.where(fix_q, -r - s, q)
+    r = np.where(fix_r, -q - s, r)
+    return q.astype(np.int64), r.astype(np.int64)
+
+
+def hex_centers(q, r, radius):
+    return radius * SQRT3 * (q + r / 2), radius * 1.5 * r
+
+
+def hexbin(projection, latitude, longitude, radius, values=None):
+    """
+    Agrega pontos numa grade hexagonal de raio "radius" (metros) numa única
+    passada: devolve o centro (lat/lon) de cada hexágono ocupado, a contagem
+    de pontos e a média de cada coluna de "values" (NaN ignorado).
+    """
+    values = values or {}
+    valid = np.isfinite(latitude) & np.isfinite(longitude)
+    x, y = projection.to_xy(latitude[valid], longitude[valid])
+    q, r = hex_cells(x, y, radius)
+
+    # Uma chave inteira por hexágono para agrupar com unique + bincount
+    keys, inverse = np.unique((q + HEX_KEY_OFFSET) * HEX_KEY_SPAN + (r + HEX_KEY_OFFSET), return_inverse=True)
+    counts = np.bincount(inverse, minlength=len(keys))
+
+    cell_q = keys // HEX_KEY_SPAN - HEX_KEY_OFFSET
+    cell_r = keys % HEX_KEY_SPAN - HEX_KEY_OFFSET
+    center_lat, center_lon = projection.to_latlon(*hex_centers(cell_q, cell_r, radius))
+
+    cells = {"latitude": center_lat, "longitude": center_lon, "count": counts}
+    for name, column in values.items():
+        column = column[valid].astype(np.float64)
+        present = ~np.isnan(column)
+        sums = np.bincount(inverse, weights=np.where(present, column, 0), minlength=len(keys))
+        n = np.bincount(inverse, weights=present, minlength=len(keys))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cells[name] = sums / n
+    return cells
+
+
+# ---------------------------
+# ÍNDICE ESPACIAL EM GRADE
+# ---------------------------
+# Lado da célula do índice em metros; cresce se a extensão exigir mais células por eixo
+GRID_CELL_M = 500.0
+GRID_MAX_CELLS_PER_AXIS = 1024
+
+
+class GridIndex:
+    """
+    Grade uniforme sobre as coordenadas projetadas: as linhas ficam ordenadas
+    por célula e "starts" marca onde cada célula começa (layout CSR). Uma caixa
+    de consulta vira uma fatia contínua por linha da grade.
+    """
+
+    def __init__(self, projection, latitude, longitude, cell_m=GRID_CELL_M):
+        self.projection = projection
+        x, y = projection.to_xy(latitude, longitude)
+        valid = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+        x, y = x[valid], y[valid]
+
+        self.x0 = x.min() if len(x) else 0.0
+        self.y0 = y.min() if len(y) else 0.0
+        extent = max(np.ptp(x) if len(x) else 0.0, np.ptp(y) if len(y) else 0.0)
+        self.cell_m = max(cell_m, extent / GRID_MAX_CELLS_PER_AXIS)
+        self.nx = int((x.max() - self.x0) // self.cell_m) + 1 if len(x) else 1
+        self.ny = int((y.max() - self.y0) // self.cell_m) + 1 if len(y) else 1
+
+        cells = self._cell(x, y)
+        order = np.argsort(cells, kind="stable")
+        self.rows = valid[order]
+        self.starts = np.searchsorted(cells[order], np.arange(self.nx * self.ny + 1))
+
+    def _cell(self, x, y):
+        ix = ((x - self.x0) // self.cell_m).astype(np.int64)
+        iy = ((y - self.y0) // self.cell_m).astype(np.int64)
+        return iy * self.nx + ix
+
+    def query(self, latitude, longitude, west, south, east, north):
+        """
+        Índices (em ordem crescente) das linhas dentro da caixa lat/lon.
+        As células só reduzem os candidatos; a conferência final é exata.
+        """
+        x_min, y_min = self.projection.to_xy(south, west)
+        x_max, y_max = self.projection.to_xy(north, east)
+        ix0 = max(int((x_min - self.x0) // self.cell_m), 0)
+        ix1 = min(int((x_max - self.x0) // self.cell_m), self.nx - 1)
+        iy0 = max(int((y_min - self.y0) // self.cell_m), 0)
+        iy1 = min(int((y_max - self.y0) // self.cell_m), self.ny - 1)
+        if ix0 > ix1 or iy0 > iy1:
+            return np.array([], dtype=np.intp)
+
+        candidates = np.concatenate([
+            self.rows[self.starts[iy * self.nx + ix0]:self.starts[iy * self.nx + ix1 + 1]]
+            for iy in range(iy0, iy1 + 1)
+        ])
+        lat, lon = latitude[candidates], longitude[candidates]
+        inside = (lat >= south) & (lat <= north) & (lon >= west) & (lon <= east)
+        return np.sort(candidates[inside])
+
+
+# ---------------------------
+# AMOSTRAGEM ESPACIAL
+# ---------------------------
+# Tamanho de 1 pixel no equador no zoom 0 (tiles de 256 px, Web Mercator)
+METERS_PER_PIXEL_Z0 = 156543.03392
+# Lado da célula de amostragem em pixels de tela, quando o zoom é informado
+SAMPLE_CELL_PX = 8
+
+
+def meters_per_pixel(zoom, latitude):
+    return METERS_PER_PIXEL_Z0 * math.cos(math.radians(latitude)) / 2 ** zoom
+
+
+def priority(keys):
+    # Hash multiplicativo (Knuth) da chave: ordem pseudoaleatória, mas estável entre requisições
+    return (keys.astype(np.uint64) * np.uint64(2654435761)) % np.uint64(2**32)
+
+
+def sample_per_cell(x, y, keys, budget, cell_m):
+    """
+    Amostra determinística de até "budget" pontos: cada célula de lado "cell_m"
+    fica com os mesmos k pontos de menor prioridade, de modo que áreas densas
+    são afinadas e áreas esparsas continuam representadas. Devolve as posições
+    escolhidas, em ordem crescente.
+    """
+    if len(keys) <= budget:
+        return np.arange(len(keys))
+
+    ix = np.floor((x - x.min()) / cell_m).astype(np.int64)
+    iy = np.floor((y - y.min()) / cell_m).astype(np.int64)
+    cells = iy * (int(ix.max()) + 1) + ix
+    ranks = priority(keys)
+
+    # Ordena por célula e, dentro dela, por prioridade; a posição no grupo é o ranking
+    order = np.lexsort((ranks, cells))
+    sorted_cells = cells[order]
+    group_start = np.flatnonzero(np.r_[True, sorted_cells[1:] != sorted_cells[:-1]])
+    per_cell = -(-budget // len(group_start))
+    position = np.arange(len(order)) - np.repeat(group_start, np.diff(np.r_[group_start, len(order)]))
+    keep = position < per_cell
+    chosen, position = order[keep], position[keep]
+
+    # Arredondar k para cima estoura o orçamento: saem primeiro as posições mais
+    # altas dentro de cada célula (e, entre elas, as de maior prioridade)
+    if len(chosen) > budget:
+        chosen = chosen[np.lexsort((ranks[chosen], position))[:budget]]
+    return np.sort(chosen)
+
+
+# ---------------------------
+# KD-TREE (vizinhos mais próximos)
+# ---------------------------
+# Pontos por folha: as folhas são conferidas de forma vetorizada
+KD_LEAF_SIZE = 32
+
+
+class KDTree:
+    """
+    KD-tree estática sobre coordenadas projetadas (metros). Cada nó guarda a
+    caixa envolvente dos seus pontos e a faixa de "rows" que ocupa; as folhas
+    têm até KD_LEAF_SIZE pontos. A busca visita os nós em ordem de distância
+    à caixa e para quando nenhum nó pode ter um vizinho melhor: O(log n + k)
+    nós por consulta em vez de varrer a tabela.
+    """
+
+    def __init__(self, x, y, leaf_size=KD_LEAF_SIZE):
+        self.x, self.y = x, y
+        self.rows = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+        self.lo_x, self.lo_y, self.hi_x, self.hi_y = [], [], [], []
+        self.left, self.right, self.start, self.end = [], [], [], []
+
+        if len(self.rows):
+            stack = [(self._node(0, len(self.rows)), 0, len(self.rows))]
+            while stack:
+                node, start, end = stack.pop()
+                if end - start <= leaf_size:
+                    continue
+                # Divide pela mediana do eixo mais espalhado
+                points = self.rows[start:end]
+                px, py = x[points], y[points]
+                coords = px if np.ptp(px) >= np.ptp(py) else py
+                mid = (end - start) // 2
+                self.rows[start:end] = points[np.argpartition(coords, mid)]
+                self.left[node] = self._node(start, start + mid)
+                self.right[node] = self._node(start + mid, end)
+                stack.append((self.left[node], start, start + mid))
+                stack.append((self.right[node], start + mid, end))
+
+    def _node(self, start, end):
+        points = self.rows[start:end]
+        px, py = self.x[points], self.y[points]
+        self.lo_x.append(px.min())
+        self.lo_y.append(py.min())
+        self.hi_x.append(px.max())
+        self.hi_y.append(py.max())
+        self.left.append(-1)
+        self.right.append(-1)
+        self.start.append(start)
+        self.end.append(end)
+        return len(self.start) - 1
+
+    def _box_distance(self, node, px, py):
+        dx = max(self.lo_x[node] - px, 0.0, px - self.hi_x[node])
+        dy = max(self.lo_y[node] - py, 0.0, py - self.hi_y[node])
+        return math.hypot(dx, dy)
+
+    def query(self, px, py, k, radius=math.inf, accept=None):
+        """
+        Até k linhas mais próximas de (px, py) dentro de "radius" metros, em
+        ordem de distância. "accept" recebe os índices de uma folha e devolve a
+        máscara das linhas elegíveis (filtros adicionais).
+        Devolve (linhas, distâncias).
+        """
+        best_rows = np.array([], dtype=np.intp)
+        best_dist = np.array([], dtype=np.float64)
+        if not self.start:
+            return best_rows, best_dist
+
+        bound = radius
+        heap = [(self._box_distance(0, px, py), 0)]
+        while heap:
+            distance, node = heapq.heappop(heap)
+            if distance > bound:
+                break
+
+            if self.left[node] < 0:
+                points = self.rows[self.start[node]:self.end[node]]
+                dist = np.hypot(self.x[points] - px, self.y[points] - py)
+                keep = dist <= bound
+                if accept is not None:
+                    keep &= accept(points)
+                if keep.any():
+                    best_rows = np.concatenate([best_rows, points[keep]])
+                    best_dist = np.concatenate([best_dist, dist[keep]])
+                    if len(best_dist) > k:
+                        top = np.argpartition(best_dist, k - 1)[:k]
+                        best_rows, best_dist = best_rows[top], best_dist[top]
+                    if len(best_dist) == k:
+                        # Só interessam nós mais próximos que o k-ésimo vizinho atual
+                        bound = min(radius, best_dist.max())
+                continue
+
+            for child in (self.left[node], self.right[node]):
+                child_distance = self._box_distance(child, px, py)
+                if child_distance <= bound:
+                    heapq.heappush(heap, (child_distance, child))
+
+        order = np.lexsort((best_rows, best_dist))
+        return best_rows[order], best_dist[order]
@@ -0,0 +1,105 @@
+import numpy as np
+
+from filters import OPERATORS, filter_mask
+
+# ---------------------------
+# ÍNDICES DAS COLUNAS DE FILTRO
+# ---------------------------
+# Construídos uma vez por snapshot. Cada predicado vira um intervalo de linhas
+# via searchsorted (O(log n)), sem varrer a tabela inteira.
+
+# Filtros de intervalo (gte/lte): permutação ordenada da coluna
+RANGE_COLUMNS = ("sale_prc", "age", "tot_lvg_area", "ocean_dist", "hwy_dist")
+# Filtros de igualdade em colunas de baixa cardinalidade: lista de linhas por valor
+POSTING_COLUMNS = ("structure_quality", "avno60plus")
+
+EMPTY_ROWS = np.array([], dtype=np.intp)
+
+
+class RangeIndex:
+    """
+    Permutação que ordena a coluna; um intervalo de valores corresponde a uma
+    fatia contínua dessa permutação.
+    """
+
+    def __init__(self, values):
+        self.order = np.argsort(values, kind="stable")
+        self.sorted = values[self.order]
+        # NaN fica no fim da ordenação e nunca satisfaz um predicado
+        self.n_valid = len(values) - int(np.count_nonzero(np.isnan(self.sorted))) \
+            if self.sorted.dtype.kind == "f" else len(values)
+
+    def select(self, predicates):
+        lo, hi = 0, self.n_valid
+        for op, value in predicates:
+            if op in ("gte", "eq"):
+                lo = max(lo, int(np.searchsorted(self.sorted, value, side="left")))
+            if op in ("lte", "eq"):
+                hi = min(hi, int(np.searchsorted(self.sorted, value, side="right")))
+        return self.order[lo:max(lo, hi)]
+
+
+class PostingIndex:
+    """
+    Para cada valor distinto, os índices das linhas com esse valor, em ordem crescente.
+    """
+
+    def __init__(self, values):
+        order = np.argsort(values, kind="stable")
+        keys, starts = np.unique(values[order], return_index=True)
+        bounds = np.append(starts, len(order))
+        self.postings = {
+            key: order[bounds[i]:bounds[i + 1]] for i, key in enumerate(keys.tolist())
+        }
+
+    def select(self, predicates):
+        # Só atende igualdade; outros operadores ficam para a conferência linha a linha
+        if any(op != "eq" for op, _ in predicates):
+            return None
+        values = {value for _, value in predicates}
+        if len(values) > 1:
+            return EMPTY_ROWS
+        return self.postings.get(values.pop(), EMPTY_ROWS)
+
+
+def build_indexes(snap):
+    indexes = {}
+    for name in RANGE_COLUMNS:
+        indexes[name] = RangeIndex(snap[name])
+    for name in POSTING_COLUMNS:
+        indexes[name] = PostingIndex(snap[name])
+    return indexes
+
+
+def select_rows(snap, filters):
+    """
+    Índices (em ordem crescente) das linhas que passam em todos os filtros,
+    ou None quando não há filtros (todas as linhas).
+
+    Cada coluna filtrada resolve seus predicados no próprio índice; a menor
+    lista de candidatos é então conferida contra os demais predicados, o que
+    equivale à interseção dos conjuntos sem varrer a tabela.
+    """
+    if not filters:
+        return None
+
+    by_column = {}
+    for column, op, value in filters:
+        by_column.setdefault(column, []).append((op, value))
+
+    best, best_column = None, None
+    for column, predicates in by_column.items():
+        index = snap.indexes.get(column)
+        rows = index.select(predicates) if index is not None else None
+        if rows is not None and (best is None or len(rows) < len(best)):
+            best, best_column = rows, column
+
+    # Nenhuma coluna indexada: varredura com máscara
+    if best is None:
+        return np.flatnonzero(filter_mask(snap, filters))
+
+    rows = np.sort(best)
+    for column, op, value in filters:
+        if column != best_column and len(rows):
+            rows = rows[OPERATORS[op](snap[column][rows], value)]
+    return rows
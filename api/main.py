@@ -1,25 +1,293 @@
-from fastapi import FastAPI, Query
-from supabase import create_client
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
+import geo
+import math
+import numpy as np
 import os
-from dotenv import load_dotenv
+import pushdown
+import stats
+from cache import ConditionalGetMiddleware, ResponseCache, ResponseCacheMiddleware, parse_ttls
+from content_encoding import CompressionMiddleware
+from database import close_pool, pool_stats
+from filters import house_filters
+from indexes import select_rows
+from offload import off_loop
+from responses import (
+    FastJSONResponse, json_response, negotiate_format, ndjson_response, payload_response, table_response, to_table
+)
+from snapshot import SCHEMA, get_snapshot, store
+
+@asynccontextmanager
+async def lifespan(app):
+    # Refresher do snapshot em segundo plano: carrega na subida e recarrega quando a tabela muda
+    store.start()
+    yield
+    await store.stop()
+    # Fecha as conexões mantidas abertas com o PostgREST
+    await close_pool()
+
+
+# Instância principal da aplicação FastAPI (JSON via orjson, quando instalado)
+app = FastAPI(default_response_class=FastJSONResponse, lifespan=lifespan)
+
+# Tamanho máximo de página aceito por /api/houses
+MAX_PAGE_LIMIT = 10000
+# Número máximo de faixas do histograma de preços (modo resumo)
+MAX_HISTOGRAM_BINS = 500
+# Orçamento de pontos padrão de /api/houses quando uma bbox é informada
+DEFAULT_MAP_POINTS = 5000
+# Raio (metros, centro ao vértice) aceito pela grade hexagonal de /api/houses/hexbins
+MIN_HEX_RADIUS = 25
+MAX_HEX_RADIUS = 50000
+# Vizinhos por imóvel e imóveis por requisição aceitos pelas rotas de comparáveis
+MAX_COMPARABLES = 100
+MAX_COMPARABLE_BATCH = 1000
+# Número máximo de clusters de /api/houses/price-clusters (rótulos em int8)
+MAX_PRICE_CLUSTERS = 20
+# Menor orçamento "max_points" das rotas de estatística (a amostra sempre guarda 3 extremos)
+MIN_SAMPLE_POINTS = 10
+# Colunas aceitas pelas curvas preço x distância de /api/houses/distance-impact
+DISTANCE_COLUMNS = ("rail_dist", "ocean_dist", "water_dist", "cntr_dist", "subcntr_di", "hwy_dist", "spec_feat_val")
 
-# Instância principal da aplicação FastAPI
-app = FastAPI()
+# ---------------------------
+# CACHE DE RESPOSTAS
+# ---------------------------
+# TTL em segundos por rota; CACHE_TTLS ("rota=segundos,...") sobrescreve os padrões
+CACHE_TTLS = {
+    "/api/houses": 60,
+    "/api/houses/price-stats": 300,
+    "/api/houses/sales-time": 300,
+    "/api/houses/distance-impact": 300,
+    "/api/houses/hexbins": 300,
+    "/api/houses/comparables": 300,
+    "/api/houses/price-clusters": 300,
+    "/api/houses/filters-range": 600,
+    **parse_ttls(os.getenv("CACHE_TTLS", "")),
+}
+response_cache = ResponseCache()
+# Ajustes do k-means por versão dos dados + filtros + k: a mesma combinação não é recalculada
+CLUSTER_CACHE_TTL = float(os.getenv("CLUSTER_CACHE_TTL", "3600"))
+cluster_cache = ResponseCache(max_entries=int(os.getenv("CLUSTER_CACHE_ENTRIES", "64")))
+# Compressão por dentro do cache: um acerto já devolve o corpo comprimido
+app.add_middleware(CompressionMiddleware)
+# A geração do snapshot entra na chave: uma recarga invalida as respostas antigas
+app.add_middleware(
+    ResponseCacheMiddleware, cache=response_cache, ttls=CACHE_TTLS, version=lambda: store.generation
+)
+
+
+def dataset_version():
+    # Hash do snapshot em uso; None quando as rotas leem direto do Postgres
+    # ou quando a próxima requisição vai recarregar o snapshot
+    if pushdown.use_pushdown():
+        return None
+    snap = store.current()
+    return snap.version if snap is not None else None
+
+
+def dataset_modified_at():
+    snap = store.current()
+    return snap.modified_at if snap is not None else None
+
+
+# Adicionado por último, fica por fora do cache: um 304 nem chega a consultá-lo
+app.add_middleware(
+    ConditionalGetMiddleware, paths=CACHE_TTLS, version=dataset_version, last_modified=dataset_modified_at
+)
 
 # ---------------------------
-# CONFIGURAÇÃO DO SUPABASE
+# FUNÇÕES AUXILIARES
 # ---------------------------
-# Carrega variáveis de ambiente do arquivo .env (URL e KEY do Supabase)
-load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+def parse_fields(fields):
+    """
+    Converte o parâmetro "fields" (ex.: "latitude,longitude") em lista de colunas
+    válidas do esquema. Sem o parâmetro, devolve None (todas as colunas).
+    """
+    if not fields:
+        return None
+
+    columns = list(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    unknown = [c for c in columns if c not in SCHEMA]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return columns or None
+
+
+def parse_bbox(bbox):
+    """
+    Converte o parâmetro "bbox" ("oeste,sul,leste,norte", em graus) em tupla
+    de floats. Sem o parâmetro, devolve None.
+    """
+    if not bbox:
+        return None
+
+    try:
+        west, south, east, north = (float(v) for v in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox must be west,south,east,north")
+    # float() aceita "nan" e "inf"; NaN passaria pelas comparações abaixo
+    if not all(math.isfinite(v) for v in (west, south, east, north)):
+        raise HTTPException(status_code=400, detail="bbox values must be finite numbers")
+    if west > east or south > north:
+        raise HTTPException(status_code=400, detail="bbox must satisfy west <= east and south <= north")
+    return west, south, east, north
+
+
+def viewport_rows(snap, rows, bbox, zoom, max_points):
+    """
+    Restringe as linhas selecionadas à bbox (índice em grade do snapshot) e,
+    acima de "max_points", fica com uma amostra determinística por célula.
+    Devolve (linhas, total antes da amostragem, se houve amostragem).
+    """
+    if bbox is not None:
+        in_box = snap.grid.query(snap["latitude"], snap["longitude"], *bbox)
+        rows = in_box if rows is None else np.intersect1d(rows, in_box, assume_unique=True)
+
+    total = len(snap) if rows is None else len(rows)
+    if max_points is None or total <= max_points:
+        return rows, total, False
+
+    if rows is None:
+        rows = np.arange(len(snap))
+    x, y = snap.projection.to_xy(snap["latitude"][rows], snap["longitude"][rows])
+    # Linhas sem coordenadas caem todas na célula da origem da projeção
+    x, y = np.nan_to_num(x), np.nan_to_num(y)
+    if zoom is not None:
+        # Células com alguns pixels de lado: a amostra acompanha a resolução da tela
+        cell_m = geo.SAMPLE_CELL_PX * geo.meters_per_pixel(zoom, snap.projection.lat0)
+    else:
+        # Sem zoom: células suficientes para cobrir a área com cerca de max_points pontos
+        cell_m = max(np.sqrt(np.ptp(x) * np.ptp(y) / max_points), 1.0)
+
+    chosen = geo.sample_per_cell(x, y, snap["parcelno"][rows], max_points, cell_m)
+    return rows[chosen], total, True
+
+
+def parse_parcelnos(parcelnos):
+    """
+    Converte o parâmetro "parcelnos" ("123,456,...") em lista de inteiros sem
+    repetições, na ordem pedida.
+    """
+    try:
+        values = list(dict.fromkeys(int(v) for v in parcelnos.split(",") if v.strip()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="parcelnos must be comma-separated integers")
+    if not values:
+        raise HTTPException(status_code=400, detail="parcelnos must not be empty")
+    if len(values) > MAX_COMPARABLE_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_COMPARABLE_BATCH} parcelnos per request")
+    return values
+
+
+def comparable_records(snap, row, k, radius_m, same_quality, area_tolerance, columns):
+    """
+    Até k imóveis mais próximos da linha "row" (KD-tree do snapshot), sem o
+    próprio imóvel, opcionalmente com a mesma qualidade e área dentro da
+    tolerância relativa. Registros em ordem de distância, com "distance_m".
+    """
+    quality, area = snap["structure_quality"], snap["tot_lvg_area"]
+
+    def accept(points):
+        keep = points != row
+        if same_quality:
+            keep &= quality[points] == quality[row]
+        if area_tolerance is not None:
+            keep &= np.abs(area[points] - area[row]) <= area_tolerance * area[row]
+        return keep
+
+    x, y = snap.projection.to_xy(snap["latitude"][row], snap["longitude"][row])
+    if not (np.isfinite(x) and np.isfinite(y)):
+        return []
+    rows, distances = snap.kdtree.query(x, y, k, radius_m or np.inf, accept)
+
+    records = snap.to_records(rows, columns)
+    for record, distance in zip(records, distances.tolist()):
+        record["distance_m"] = round(distance, 1)
+    return records
+
+
+def parse_distance_columns(columns):
+    # Lista "coluna,coluna" restrita a DISTANCE_COLUMNS, sem repetições
+    names = list(dict.fromkeys(c.strip() for c in columns.split(",") if c.strip()))
+    unknown = [c for c in names if c not in DISTANCE_COLUMNS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown distance columns: {', '.join(unknown)}")
+    return names
+
+
+def parse_edges(edges):
+    """
+    Converte o parâmetro "edges" ("0,1000,5000") em lista de bordas
+    estritamente crescentes. Sem o parâmetro, devolve None (larguras iguais).
+    """
+    if not edges:
+        return None
+
+    try:
+        values = [float(v) for v in edges.split(",")]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="edges must be comma-separated numbers")
+    # NaN nunca falha a comparação a >= b: bordas não finitas são recusadas antes
+    if not all(math.isfinite(v) for v in values):
+        raise HTTPException(status_code=400, detail="edges must be finite numbers")
+    if len(values) < 2 or any(a >= b for a, b in zip(values, values[1:])):
+        raise HTTPException(status_code=400, detail="edges must have at least two strictly increasing values")
+    return values
+
+
+def fit_price_clusters(full, snap, k):
+    """
+    K-means em (x, y, log do preço) das linhas filtradas. As coordenadas vão
+    para metros na projeção do snapshot e são divididas por uma escala comum
+    (o mapa não se deforma); o log do preço, pelo seu desvio padrão.
+    Clusters ordenados pelo preço do centro; rótulo -1 para linhas sem
+    coordenadas ou preço.
+    """
+    x, y = full.projection.to_xy(snap["latitude"], snap["longitude"])
+    prices = snap["sale_prc"].astype(np.float64)
+    valid = np.isfinite(x) & np.isfinite(y) & (prices > 0)
+    raw = np.column_stack([x[valid], y[valid], np.log(prices[valid])])
+
+    offset, scale = np.zeros(3), np.ones(3)
+    if len(raw):
+        offset = raw.mean(axis=0)
+        spatial_scale = np.sqrt(raw[:, :2].var(axis=0).sum() / 2)
+        scale = np.array([spatial_scale, spatial_scale, raw[:, 2].std()])
+        scale[scale == 0] = 1
+
+    centers, fitted = stats.minibatch_kmeans((raw - offset) / scale, k)
+    centers = centers * scale + offset
+    order = np.argsort(centers[:, 2], kind="stable")
+    rank = np.empty(len(order), dtype=np.int8)
+    rank[order] = np.arange(len(order))
+
+    labels = np.full(len(snap), -1, dtype=np.int8)
+    labels[valid] = rank[fitted]
+    latitude, longitude = full.projection.to_latlon(centers[order, 0], centers[order, 1])
+    return {
+        "centroids": {
+            "latitude": latitude,
+            "longitude": longitude,
+            "sale_prc": np.exp(centers[order, 2]),
+            "size": np.bincount(labels[valid], minlength=len(order)),
+        },
+        "labels": labels,
+    }
+
+
+def houses_response(data, next_cursor, fmt, headers):
+    # Páginas ordenadas por parcelno; o cabeçalho indica onde continuar
+    if next_cursor is not None:
+        headers["X-Next-Cursor"] = str(next_cursor)
+    if fmt in ("arrow", "parquet"):
+        return table_response(to_table(data), fmt, headers)
+    return json_response(data, headers)
 
 # ---------------------------
 # ROTA DE TESTE
 # ---------------------------
 @app.get("/")
-def root():
+async def root():
     return {"message": "API funcionando!"}
 
 # ---------------------------
@@ -27,290 +295,445 @@ def root():
 # Lista de imóveis com filtros dinâmicos
 # ---------------------------
 @app.get("/api/houses")
-def get_houses(
-    min_price: float = Query(None),
-    max_price: float = Query(None),
-    min_age: int = Query(None),
-    max_age: int = Query(None),
-    min_area: int = Query(None),
-    max_area: int = Query(None),
-    structure_quality: int = Query(None),
-    avno60plus: int = Query(None),
-    max_ocean_dist: int = Query(None),     
-    max_hwy_dist: int = Query(None),       
-    limit: int = Query(500)
+async def get_houses(
+    request: Request,
+    filters: list = Depends(house_filters),
+    limit: int = Query(500, ge=1, le=MAX_PAGE_LIMIT),
+    after: int = Query(None, description="Cursor: parcelno da última linha da página anterior"),
+    fields: str = Query(None, description="Colunas separadas por vírgula (padrão: todas)"),
+    stream: bool = Query(False, description="Envia todas as linhas como NDJSON, sem limite de página"),
+    bbox: str = Query(None, description="Área visível do mapa: oeste,sul,leste,norte (graus)"),
+    zoom: float = Query(None, ge=0, le=24, description="Zoom do mapa; define o tamanho das células de amostragem"),
+    max_points: int = Query(None, ge=1, description=f"Orçamento de pontos (padrão {DEFAULT_MAP_POINTS} com bbox)")
 ):
-    data = []
-    page = 0
-    page_size = 1000
-
-    # Paginação para buscar todos os registros
-    while True:
-        query = supabase.table("miami_housing").select("*").range(page * page_size, (page + 1) * page_size - 1)
-
-        # Aplicação dos filtros, se fornecidos
-        if min_price:
-            query = query.gte("sale_prc", min_price)
-        if max_price:
-            query = query.lte("sale_prc", max_price)
-        if min_age:
-            query = query.gte("age", min_age)
-        if max_age:
-            query = query.lte("age", max_age)
-        if min_area:
-            query = query.gte("tot_lvg_area", min_area)
-        if max_area:
-            query = query.lte("tot_lvg_area", max_area)
-        if structure_quality:
-            query = query.eq("structure_quality", structure_quality)
-        if avno60plus is not None:
-            query = query.eq("avno60plus", avno60plus)
-        if max_ocean_dist is not None:
-            query = query.lte("ocean_dist", max_ocean_dist)
-        if max_hwy_dist is not None:
-            query = query.lte("hwy_dist", max_hwy_dist)
-
-        # Executa a consulta paginada
-        response = query.execute().data
-        if not response:
-            break
-
-        data.extend(response)
-        page += 1
-
-    return data
+    columns = parse_fields(fields)
+    box = parse_bbox(bbox)
+    if box is not None and max_points is None:
+        max_points = DEFAULT_MAP_POINTS
+
+    fmt = negotiate_format(request)
+    # Modo streaming (?stream=1 ou Accept: application/x-ndjson): uma página em memória por vez
+    streaming = stream or fmt == "ndjson"
+
+    # Consulta filtrada diretamente no Postgres, se configurado
+    if pushdown.use_pushdown():
+        if box is not None:
+            # No Postgres a bbox vira filtro de intervalo; a amostragem fica só no snapshot
+            west, south, east, north = box
+            filters = filters + [
+                ("latitude", "gte", south), ("latitude", "lte", north),
+                ("longitude", "gte", west), ("longitude", "lte", east),
+            ]
+        if streaming:
+            return ndjson_response(pushdown.iter_houses(filters, columns, after), {})
+        data, next_cursor = await pushdown.houses(filters, columns, after, limit)
+        return await off_loop(houses_response, data, next_cursor, fmt, {})
+
+    snap = await get_snapshot()
+
+    def build():
+        rows, total, sampled = viewport_rows(snap, select_rows(snap, filters), box, zoom, max_points)
+        headers = {}
+        if max_points is not None:
+            # Total antes da amostragem, para o cliente indicar que vê só parte dos imóveis
+            headers = {"X-Total-Count": str(total), "X-Sampled": str(sampled).lower()}
+        if streaming:
+            return ndjson_response(snap.iter_records(snap.rows_after(rows, after), columns), headers)
+
+        rows, next_cursor = snap.page_after(rows, after, limit)
+        if fmt in ("arrow", "parquet"):
+            # Colunas NumPy do snapshot vão direto para o Arrow, sem passar por dicionários
+            data = {name: snap[name][rows] for name in columns or SCHEMA}
+        else:
+            data = snap.to_records(rows, columns)
+        return houses_response(data, next_cursor, fmt, headers)
+
+    return await off_loop(build)
 
 # ---------------------------
 # ROTA: /api/houses/price-stats
 # Estatísticas gerais de preço e clusterização
 # ---------------------------
 @app.get("/api/houses/price-stats")
-def price_stats():
-    data = []
-    page = 0
-    page_size = 1000
-
-    # Paginação da tabela
-    while True:
-        response = supabase.table("miami_housing").select(
-            "sale_prc", "lnd_sqfoot", "tot_lvg_area", "structure_quality", "latitude", "longitude"
-        ).range(page * page_size, (page + 1) * page_size - 1).execute().data
-
-        if not response:
-            break
-
-        data.extend(response)
-        page += 1
-
-    # Coleta e validação dos campos principais
-    prices = [d['sale_prc'] for d in data if 'sale_prc' in d]
-    land_area = [d['lnd_sqfoot'] for d in data if 'lnd_sqfoot' in d]
-    living_area = [d['tot_lvg_area'] for d in data if 'tot_lvg_area' in d]
-    structure_quality = [d['structure_quality'] for d in data if 'structure_quality' in d]
-
-    # Estatísticas descritivas de preço
-    price_avg = sum(prices) / len(prices) if prices else 0
-    price_min = min(prices) if prices else 0
-    price_max = max(prices) if prices else 0
-    price_median = sorted(prices)[len(prices) // 2] if prices else 0
-    price_stddev = (sum((x - price_avg) ** 2 for x in prices) / len(prices)) ** 0.5 if prices else 0
-    price_iqr = sorted(prices)[int(0.75 * len(prices))] - sorted(prices)[int(0.25 * len(prices))] if prices else 0
-
-    # Preço médio por qualidade da estrutura
-    quality_price_avg = {}
-    for quality in set(structure_quality):
-        quality_prices = [p for p, q in zip(prices, structure_quality) if q == quality]
-        if quality_prices:
-            quality_price_avg[str(quality)] = sum(quality_prices) / len(quality_prices)
-
-    # Clusterização simples por faixas de preço (baixo, médio, alto)
-    q1 = sorted(prices)[int(len(prices) * 0.33)]
-    q2 = sorted(prices)[int(len(prices) * 0.66)]
-
-    price_cluster = []
-    for d in data:
-        if all(k in d for k in ["latitude", "longitude", "sale_prc"]):
-            sale = d["sale_prc"]
-            range_label = "Low" if sale <= q1 else "Medium" if sale <= q2 else "High"
-            price_cluster.append({
-                "latitude": d["latitude"],
-                "longitude": d["longitude"],
-                "sale_prc": sale,
-                "Price Range": range_label
-            })
+async def price_stats(
+    request: Request,
+    filters: list = Depends(house_filters),
+    summary: bool = Query(False, description="Histograma e boxplot pré-calculados no lugar das listas de preço e área"),
+    bins: int = Query(30, ge=1, le=MAX_HISTOGRAM_BINS, description="Faixas do histograma no modo resumo"),
+    max_points: int = Query(None, ge=MIN_SAMPLE_POINTS, description="Máximo de linhas nas listas por imóvel (amostra)")
+):
+    # Agregação calculada no próprio Postgres, se configurado
+    if pushdown.use_pushdown():
+        return payload_response(request, await pushdown.price_stats(filters, summary, bins, max_points))
+
+    full = await get_snapshot()
+
+    def build():
+        # Colunas necessárias, lidas do snapshot em memória
+        snap = full.take(select_rows(full, filters), (
+            "parcelno", "sale_prc", "lnd_sqfoot", "tot_lvg_area", "structure_quality"
+        ))
+        prices = snap["sale_prc"]
+        living_area = snap["tot_lvg_area"]
+
+        # Estatísticas descritivas de preço; mediana e IQR numa única partição
+        price_summary = stats.describe(prices)
+        p25, median, p75 = stats.quantiles(prices, (0.25, 0.5, 0.75))
+
+        # Preço médio por qualidade da estrutura
+        quality_price_avg = {
+            str(quality): avg for quality, avg in stats.grouped_mean(prices, snap["structure_quality"]).items()
+        }
 
+        # Pontos do gráfico área x preço (os clusters por localização vêm de /price-clusters);
+        # no modo resumo só existem com orçamento: sem ele seriam uma entrada por linha
+        with_points = not summary or max_points is not None
+        cluster_columns = {"sale_prc": prices, "tot_lvg_area": living_area} if with_points else {}
+
+        # Listas por imóvel (gráfico área x preço): amostra de até max_points linhas
+        sample = None
+        if max_points is not None and len(snap) > max_points:
+            sample = stats.scatter_sample(living_area, prices, snap["parcelno"], max_points)
+            cluster_columns = {name: column[sample] for name, column in cluster_columns.items()}
+        names = list(cluster_columns)
+        price_cluster = [
+            dict(zip(names, row)) for row in zip(*(column.tolist() for column in cluster_columns.values()))
+        ]
+
+        # Resultado final retornado à API
+        stats_payload = {
+            "price_avg": price_summary["mean"],
+            "price_min": price_summary["min"],
+            "price_max": price_summary["max"],
+            "price_median": median,
+            "price_stddev": price_summary["std"],
+            "price_iqr": p75 - p25,
+            "land_area_avg": stats.mean_or(snap["lnd_sqfoot"], 0),
+            "living_area_avg": stats.mean_or(living_area, 0),
+            "quality_price_avg": quality_price_avg,
+            "price_distribution": prices if sample is None else prices[sample],
+            "living_area_distribution": living_area if sample is None else living_area[sample],
+            "price_cluster": price_cluster,
+            "population_size": len(snap),
+            "sampled": sample is not None,
+        }
 
-    # Resultado final retornado à API
-    stats = {
-        "price_avg": price_avg,
-        "price_min": price_min,
-        "price_max": price_max,
-        "price_median": price_median,
-        "price_stddev": price_stddev,
-        "price_iqr": price_iqr,
-        "land_area_avg": sum(land_area) / len(land_area) if land_area else 0,
-        "living_area_avg": sum(living_area) / len(living_area) if living_area else 0,
-        "quality_price_avg": quality_price_avg,
-        "price_distribution": prices,
-        "living_area_distribution": living_area,
-        "price_cluster": price_cluster
-    }
+        # Modo resumo: distribuição de preços em O(bins) em vez de O(linhas)
+        if summary:
+            del stats_payload["price_distribution"], stats_payload["living_area_distribution"]
+            if not with_points:
+                del stats_payload["price_cluster"]
+            stats_payload["price_histogram"] = stats.histogram(prices, bins)
+            stats_payload["price_box"] = stats.box_summary(prices)
+
+        # JSON por padrão; Arrow/Parquet se pedido no cabeçalho Accept
+        return payload_response(request, stats_payload)
 
-    return stats
+    return await off_loop(build)
 
 # ---------------------------
 # ROTA: /api/houses/sales-time
 # Estatísticas mensais de venda
 # ---------------------------
 @app.get("/api/houses/sales-time")
-def sales_time():
-    data = []
-    page = 0
-    page_size = 1000
-
-    while True:
-        response = supabase.table("miami_housing").select("month_sold", "sale_prc").range(
-            page * page_size, (page + 1) * page_size - 1).execute().data
-
-        if not response:
-            break
-
-        data.extend(response)
-        page += 1
-
-    # Agrupamento dos preços por mês
-    monthly_data = {}
-    for d in data:
-        month = d['month_sold']
-        price = d['sale_prc']
-        monthly_data.setdefault(month, []).append(price)
-
-    # Constrói resposta com volume de vendas e preço médio
-    result = []
-    for month in sorted(monthly_data):
-        prices = monthly_data[month]
-        result.append({
-            "month": month,
-            "total_sales": len(prices),
-            "average_price": sum(prices) / len(prices)
-        })
+async def sales_time(filters: list = Depends(house_filters)):
+    # Agregação calculada no próprio Postgres, se configurado
+    if pushdown.use_pushdown():
+        return json_response(await pushdown.sales_time(filters))
+
+    full = await get_snapshot()
+
+    def build():
+        # Agrupamento dos preços por mês numa única passada
+        snap = full.take(select_rows(full, filters), ("month_sold", "sale_prc"))
+        months, total_sales, average_price = stats.grouped(snap["sale_prc"], snap["month_sold"])
+
+        # Constrói resposta com volume de vendas e preço médio
+        return json_response([
+            {"month": month, "total_sales": total, "average_price": avg}
+            for month, total, avg in zip(months.tolist(), total_sales.tolist(), average_price.tolist())
+        ])
 
-    return result
+    return await off_loop(build)
 
 # ---------------------------
 # ROTA: /api/houses/distance-impact
 # Analisa impacto de distâncias e ruído no preço
 # ---------------------------
 @app.get("/api/houses/distance-impact")
-def distance_impact():
-    data = []
-    page = 0
-    page_size = 1000
-
-    while True:
-        response = supabase.table("miami_housing").select(
-            "sale_prc", "ocean_dist", "hwy_dist", "avno60plus"
-        ).range(page * page_size, (page + 1) * page_size - 1).execute().data
-
-        if not response:
-            break
-        data.extend(response)
-        page += 1
-
-    # Inicializa agrupamentos por categoria
-    near_ocean, far_ocean = [], []
-    near_hwy, far_hwy = [], []
-    airport_noise, no_airport_noise = [], []
-
-    dist_ocean, dist_ocean_price = [], []
-    dist_hwy, dist_hwy_price = [], []
-
-    # Classificação das distâncias e ruído
-    for d in data:
-        price = d.get("sale_prc")
-        ocean_dist = d.get("ocean_dist", 0)
-        hwy_dist = d.get("hwy_dist", 0)
-        ruido = d.get("avno60plus")
-
-        if price is None:
-            continue
-
-        if ocean_dist <= 15000:
-            near_ocean.append(price)
-        else:
-            far_ocean.append(price)
+async def distance_impact(
+    filters: list = Depends(house_filters),
+    columns: str = Query("ocean_dist,hwy_dist", description=f"Colunas das curvas: {', '.join(DISTANCE_COLUMNS)}"),
+    edges: str = Query(None, description="Bordas das faixas separadas por vírgula (padrão: larguras iguais)"),
+    buckets: int = Query(10, ge=1, le=MAX_HISTOGRAM_BINS, description="Faixas de larguras iguais, sem \"edges\""),
+    ocean_near: float = Query(15000, ge=0, description="Distância (m) até a qual o imóvel está perto do mar"),
+    hwy_near: float = Query(5000, ge=0, description="Distância (m) até a qual o imóvel está perto da rodovia"),
+    raw: bool = Query(False, description="Inclui as listas por imóvel dos gráficos de dispersão"),
+    max_points: int = Query(None, ge=MIN_SAMPLE_POINTS, description="Máximo de valores por lista por imóvel (amostra)")
+):
+    curve_columns = parse_distance_columns(columns)
+    bucket_edges = parse_edges(edges)
+
+    # Agregação calculada no próprio Postgres, se configurado
+    if pushdown.use_pushdown():
+        return json_response(await pushdown.distance_impact(
+            filters, ocean_near, hwy_near, curve_columns, bucket_edges, buckets, raw, max_points
+        ))
+
+    full = await get_snapshot()
+
+    def build():
+        fields = dict.fromkeys(("parcelno", "sale_prc", "ocean_dist", "hwy_dist", "avno60plus", *curve_columns))
+        snap = full.take(select_rows(full, filters), tuple(fields))
+        valid = ~np.isnan(snap["sale_prc"])
+        prices = snap["sale_prc"][valid]
+        ocean_dist = snap["ocean_dist"][valid]
+        hwy_dist = snap["hwy_dist"][valid]
+        ruido = snap["avno60plus"][valid]
+        parcelno = snap["parcelno"][valid]
+
+        # Classificação das distâncias e ruído como máscaras booleanas
+        near_ocean = ocean_dist <= ocean_near
+        near_hwy = hwy_dist <= hwy_near
+        airport_noise = ruido == 1
+        no_airport_noise = ruido == 0
+
+        # Curvas preço x distância: contagem, média e mediana por faixa da coluna
+        distance_curves = {}
+        for name in curve_columns:
+            keys = snap[name][valid]
+            if bucket_edges is not None:
+                column_edges = np.array(bucket_edges)
+            else:
+                column_edges = stats.equal_width_edges(keys[~np.isnan(keys)] if keys.dtype.kind == "f" else keys, buckets)
+            distance_curves[name] = stats.binned_stats(keys, prices, column_edges)
+
+        # Listas por imóvel limitadas a max_points valores cada (amostra com os extremos)
+        sampled = max_points is not None and len(prices) > max_points
+
+        def prices_in(mask):
+            if max_points is None:
+                return prices[mask]
+            return prices[mask][stats.scatter_sample(prices[mask], prices[mask], parcelno[mask], max_points)]
+
+        # Arrays NumPy vão direto para o serializador, sem .tolist()
+        payload = {
+            "avg_price_near_ocean": stats.mean_or(prices[near_ocean]),
+            "avg_price_far_from_ocean": stats.mean_or(prices[~near_ocean]),
+            "avg_price_near_highway": stats.mean_or(prices[near_hwy]),
+            "avg_price_far_from_highway": stats.mean_or(prices[~near_hwy]),
+            "avg_price_airport_noise": stats.mean_or(prices[airport_noise]),
+            "avg_price_no_airport_noise": stats.mean_or(prices[no_airport_noise]),
+            "count_near_ocean": int(near_ocean.sum()),
+            "count_near_highway": int(near_hwy.sum()),
+            "count_airport_noise": int(airport_noise.sum()),
+            "prices_near_ocean": prices_in(near_ocean),
+            "prices_far_ocean": prices_in(~near_ocean),
+            "prices_near_highway": prices_in(near_hwy),
+            "prices_far_highway": prices_in(~near_hwy),
+            "prices_airport_noise": prices_in(airport_noise),
+            "prices_no_airport_noise": prices_in(no_airport_noise),
+            "distance_curves": distance_curves,
+            "population_size": len(prices),
+            "sampled": sampled,
+        }
 
-        if hwy_dist <= 5000:
-            near_hwy.append(price)
-        else:
-            far_hwy.append(price)
+        # Pontos por imóvel só quando pedidos: as curvas já resumem a relação
+        if raw:
+            ocean_rows = hwy_rows = slice(None)
+            if sampled:
+                ocean_rows = stats.scatter_sample(ocean_dist, prices, parcelno, max_points)
+                hwy_rows = stats.scatter_sample(hwy_dist, prices, parcelno, max_points)
+            payload.update({
+                "dist_ocean": ocean_dist[ocean_rows],
+                "dist_ocean_price": prices[ocean_rows],
+                "dist_hwy": hwy_dist[hwy_rows],
+                "dist_hwy_price": prices[hwy_rows],
+            })
+        return json_response(payload)
 
-        if ruido == 1:
-            airport_noise.append(price)
-        elif ruido == 0:
-            no_airport_noise.append(price)
+    return await off_loop(build)
 
-        dist_ocean.append(ocean_dist)
-        dist_ocean_price.append(price)
-        dist_hwy.append(hwy_dist)
-        dist_hwy_price.append(price)
+# ---------------------------
+# ROTA: /api/houses/hexbins
+# Densidade de imóveis agregada numa grade hexagonal
+# ---------------------------
+@app.get("/api/houses/hexbins")
+async def hexbins(
+    request: Request,
+    filters: list = Depends(house_filters),
+    radius_m: float = Query(200, ge=MIN_HEX_RADIUS, le=MAX_HEX_RADIUS, description="Raio do hexágono em metros")
+):
+    # Sempre a partir do snapshot; a projeção é a do snapshot inteiro, então os
+    # hexágonos são os mesmos para qualquer combinação de filtros
+    full = await get_snapshot()
+
+    def build():
+        snap = full.take(select_rows(full, filters), ("latitude", "longitude", "sale_prc", "structure_quality"))
+        cells = geo.hexbin(full.projection, snap["latitude"], snap["longitude"], radius_m, {
+            "mean_price": snap["sale_prc"],
+            "mean_quality": snap["structure_quality"],
+        })
 
-    return {
-        "avg_price_near_ocean": sum(near_ocean) / len(near_ocean) if near_ocean else None,
-        "avg_price_far_from_ocean": sum(far_ocean) / len(far_ocean) if far_ocean else None,
-        "avg_price_near_highway": sum(near_hwy) / len(near_hwy) if near_hwy else None,
-        "avg_price_far_from_highway": sum(far_hwy) / len(far_hwy) if far_hwy else None,
-        "avg_price_airport_noise": sum(airport_noise) / len(airport_noise) if airport_noise else None,
-        "avg_price_no_airport_noise": sum(no_airport_noise) / len(no_airport_noise) if no_airport_noise else None,
-        "count_near_ocean": len(near_ocean),
-        "count_near_highway": len(near_hwy),
-        "count_airport_noise": len(airport_noise),
-        "prices_near_ocean": near_ocean,
-        "prices_far_ocean": far_ocean,
-        "prices_near_highway": near_hwy,
-        "prices_far_highway": far_hwy,
-        "prices_airport_noise": airport_noise,
-        "prices_no_airport_noise": no_airport_noise,
-        "dist_ocean": dist_ocean,
-        "dist_ocean_price": dist_ocean_price,
-        "dist_hwy": dist_hwy,
-        "dist_hwy_price": dist_hwy_price
+        # Uma entrada por hexágono ocupado: centro, contagem, preço e qualidade médios
+        return payload_response(request, {"radius_m": radius_m, "total": len(snap), **cells})
+
+    return await off_loop(build)
+
+# ---------------------------
+# ROTA: /api/houses/comparables
+# Imóveis vizinhos (comparáveis) de um ou vários imóveis
+# ---------------------------
+@app.get("/api/houses/comparables")
+async def batch_comparables(
+    request: Request,
+    parcelnos: str = Query(..., description="parcelno dos imóveis separados por vírgula"),
+    k: int = Query(10, ge=1, le=MAX_COMPARABLES),
+    radius_m: float = Query(None, gt=0, description="Distância máxima em metros (padrão: sem limite)"),
+    same_quality: bool = Query(False, description="Só imóveis com a mesma structure_quality"),
+    area_tolerance: float = Query(None, ge=0, description="Diferença relativa máxima de tot_lvg_area (0.2 = ±20%)"),
+    fields: str = Query(None, description="Colunas separadas por vírgula (padrão: todas)")
+):
+    values = parse_parcelnos(parcelnos)
+    columns = parse_fields(fields)
+
+    # Sempre a partir do snapshot: a KD-tree é montada na carga
+    snap = await get_snapshot()
+
+    def search():
+        results = []
+        for parcelno, row in zip(values, snap.rows_of(values).tolist()):
+            # Um registro por imóvel pedido; os inexistentes vêm com found=false
+            records = [] if row < 0 else comparable_records(snap, row, k, radius_m, same_quality, area_tolerance, columns)
+            results.append({"parcelno": parcelno, "found": row >= 0, "comparables": records})
+        return results
+
+    # Até MAX_COMPARABLE_BATCH buscas
+    return payload_response(request, {"results": await off_loop(search)})
+
+
+@app.get("/api/houses/{parcelno}/comparables")
+async def comparables(
+    request: Request,
+    parcelno: int,
+    k: int = Query(10, ge=1, le=MAX_COMPARABLES),
+    radius_m: float = Query(None, gt=0, description="Distância máxima em metros (padrão: sem limite)"),
+    same_quality: bool = Query(False, description="Só imóveis com a mesma structure_quality"),
+    area_tolerance: float = Query(None, ge=0, description="Diferença relativa máxima de tot_lvg_area (0.2 = ±20%)"),
+    fields: str = Query(None, description="Colunas separadas por vírgula (padrão: todas)")
+):
+    columns = parse_fields(fields)
+    snap = await get_snapshot()
+
+    def build():
+        row = int(snap.rows_of([parcelno])[0])
+        if row < 0:
+            raise HTTPException(status_code=404, detail=f"parcelno {parcelno} not found")
+
+        records = comparable_records(snap, row, k, radius_m, same_quality, area_tolerance, columns)
+        return payload_response(request, {"parcelno": parcelno, "comparables": records})
+
+    return await off_loop(build)
+
+# ---------------------------
+# ROTA: /api/houses/price-clusters
+# Clusters geográficos de preço (k-means em mini-lotes)
+# ---------------------------
+@app.get("/api/houses/price-clusters")
+async def price_clusters(
+    request: Request,
+    filters: list = Depends(house_filters),
+    k: int = Query(5, ge=1, le=MAX_PRICE_CLUSTERS, description="Número de clusters"),
+    points: bool = Query(False, description="Inclui latitude, longitude e preço de cada imóvel, alinhados aos rótulos")
+):
+    # Sempre a partir do snapshot; o ajuste fica guardado por versão + filtros + k
+    full = await get_snapshot()
+    snap = await off_loop(lambda: full.take(select_rows(full, filters), ("latitude", "longitude", "sale_prc")))
+    key = (full.version, tuple(filters), k)
+    fit = cluster_cache.get("/api/houses/price-clusters", key)
+    if fit is None:
+        fit = await off_loop(fit_price_clusters, full, snap, k)
+        cluster_cache.set(key, fit, fit["labels"].nbytes, CLUSTER_CACHE_TTL)
+
+    # Centros e tamanhos compactos; um rótulo int8 por imóvel
+    payload = {
+        "k": len(fit["centroids"]["size"]),
+        "centroids": fit["centroids"],
+        "labels": fit["labels"],
     }
+    if points:
+        # Colunas float64 por imóvel só para quem desenha os pontos (o mapa do painel)
+        payload.update({name: snap[name] for name in ("latitude", "longitude", "sale_prc")})
+    return payload_response(request, payload)
 
 # ---------------------------
 # ROTA: /api/houses/filters-range
 # Gera os limites dos filtros com base nos dados reais
 # ---------------------------
 @app.get("/api/houses/filters-range")
-def get_filters_range():
-    response = supabase.table("miami_housing").select(
-        "sale_prc", "age", "tot_lvg_area", "structure_quality"
-    ).limit(10000).execute()
-
-    data = response.data
+async def get_filters_range():
+    snap = await get_snapshot()
+
+    def build():
+        # Nulos (NaN) ficam de fora, como na versão original; sem valores válidos, vale o padrão
+        prices = stats.dropna(snap["sale_prc"])
+        ages = stats.dropna(snap["age"])
+        areas = stats.dropna(snap["tot_lvg_area"])
+        qualities = np.unique(stats.dropna(snap["structure_quality"])).astype(int).tolist()
+        ocean = stats.dropna(snap["ocean_dist"])
+        highway = stats.dropna(snap["hwy_dist"])
 
-    if not data:
         return {
-            "price_min": 50000,
-            "price_max": 3000000,
-            "age_min": 0,
-            "age_max": 100,
-            "area_min": 500,
-            "area_max": 5000,
-            "qualities": list(range(1, 10)),
+            "price_min": int(prices.min()) if len(prices) else 50000,
+            "price_max": int(prices.max()) if len(prices) else 3000000,
+            "age_min": int(ages.min()) if len(ages) else 0,
+            "age_max": int(ages.max()) if len(ages) else 100,
+            "area_min": int(areas.min()) if len(areas) else 500,
+            "area_max": int(areas.max()) if len(areas) else 5000,
+            "qualities": qualities if qualities else list(range(1, 10)),
+            # Limites dos filtros de distância (arredondados para cima, em metros)
+            "ocean_dist_max": int(np.ceil(ocean.max())) if len(ocean) else 30000,
+            "hwy_dist_max": int(np.ceil(highway.max())) if len(highway) else 10000,
         }
 
-    prices = [d["sale_prc"] for d in data if d.get("sale_prc") is not None]
-    ages = [d["age"] for d in data if d.get("age") is not None]
-    areas = [d["tot_lvg_area"] for d in data if d.get("tot_lvg_area") is not None]
-    qualities = sorted(set(d["structure_quality"] for d in data if d.get("structure_quality") is not None))
+    return await off_loop(build)
 
+# ---------------------------
+# ROTA: /api/snapshot/refresh
+# Recarrega sob demanda o snapshot em memória da tabela
+# ---------------------------
+@app.post("/api/snapshot/refresh")
+async def refresh_snapshot():
+    snap = await store.refresh()
+    response_cache.clear()
     return {
-        "price_min": int(min(prices)) if prices else 50000,
-        "price_max": int(max(prices)) if prices else 3000000,
-        "age_min": int(min(ages)) if ages else 0,
-        "age_max": int(max(ages)) if ages else 100,
-        "area_min": int(min(areas)) if areas else 500,
-        "area_max": int(max(areas)) if areas else 5000,
-        "qualities": qualities if qualities else list(range(1, 10)),
+        "rows": len(snap),
+        "generation": snap.generation,
+        "version": snap.version,
+        "loaded_at": snap.loaded_at,
+        "modified_at": snap.modified_at,
     }
+
+# ---------------------------
+# ROTA: /api/snapshot/stats
+# Idade do snapshot, limites de desatualização e métricas do refresher
+# ---------------------------
+@app.get("/api/snapshot/stats")
+async def snapshot_stats():
+    return store.stats()
+
+# ---------------------------
+# ROTA: /api/cache/stats
+# Ocupação e contadores de acerto/falta do cache de respostas
+# ---------------------------
+@app.get("/api/cache/stats")
+async def cache_stats():
+    return {**response_cache.stats(), "clusters": cluster_cache.stats()}
+
+# ---------------------------
+# ROTA: /api/upstream/stats
+# Configuração e uso do pool de conexões com o PostgREST
+# ---------------------------
+@app.get("/api/upstream/stats")
+async def upstream_stats():
+    return pool_stats()
@@ -0,0 +1,14 @@
+import asyncio
+
+# ---------------------------
+# TRABALHO DE CPU FORA DO EVENT LOOP
+# ---------------------------
+async def off_loop(fn, *args, **kwargs):
+    """
+    Executa "fn" numa thread do pool padrão e devolve o resultado. Usado para
+    o trabalho de CPU das rotas (filtros, estatísticas, índices, serialização,
+    compressão): enquanto ele roda, o event loop segue atendendo as outras
+    requisições. NumPy, orjson e os compressores liberam o GIL na maior parte
+    desse trabalho.
+    """
+    return await asyncio.to_thread(fn, *args, **kwargs)
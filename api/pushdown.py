@@ -0,0 +1,74 @@
+import json
+import os
+
+from database import fetch_keyset, iter_keyset, project, single_flight, supabase
+from filters import apply_to_query, filter_params
+
+# ---------------------------
+# AGREGAÇÕES NO POSTGRES
+# ---------------------------
+# "python" calcula as estatísticas a partir do snapshot em memória;
+# "postgres" chama as funções de api/sql/aggregations.sql via RPC.
+AGGREGATION_BACKEND = os.getenv("AGGREGATION_BACKEND", "python")
+
+
+def use_pushdown():
+    return AGGREGATION_BACKEND == "postgres"
+
+
+async def rpc(fn, params):
+    # Chamadas iguais em andamento (mesma função e parâmetros) compartilham uma só RPC
+    async def call():
+        response = await supabase.rpc(fn, params).execute()
+        return response.data
+
+    return await single_flight.run(("rpc", fn, json.dumps(params, sort_keys=True)), call)
+
+
+async def houses(filters, columns=None, after=None, limit=500):
+    columns = tuple(columns or ())
+    return await single_flight.run(
+        ("houses", tuple(filters), columns, after, limit),
+        fetch_keyset,
+        *columns,
+        where=lambda query: apply_to_query(query, filters),
+        after=after,
+        limit=limit,
+    )
+
+
+async def iter_houses(filters, columns=None, after=None):
+    # Páginas da consulta filtrada, devolvidas conforme chegam do PostgREST
+    async for page in iter_keyset(
+        *(columns or ()),
+        where=lambda query: apply_to_query(query, filters),
+        after=after,
+    ):
+        yield project(page, columns)
+
+
+async def price_stats(filters=(), summary=False, bins=30, max_points=None):
+    params = filter_params(filters)
+    if summary:
+        params.update(summary=True, bins=bins)
+    if max_points is not None:
+        params["max_points"] = max_points
+    return await rpc("houses_price_stats", params)
+
+
+async def sales_time(filters=()):
+    return await rpc("houses_sales_time", filter_params(filters))
+
+
+async def distance_impact(filters=(), ocean_near=15000, hwy_near=5000, columns=("ocean_dist", "hwy_dist"),
+                          edges=None, buckets=10, raw=False, max_points=None):
+    return await rpc("houses_distance_impact", {
+        **filter_params(filters),
+        "ocean_near": ocean_near,
+        "hwy_near": hwy_near,
+        "dist_columns": list(columns),
+        "edges": edges,
+        "buckets": buckets,
+        "raw": raw,
+        "max_points": max_points,
+    })
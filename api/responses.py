@@ -0,0 +1,183 @@
+import json
+import math
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+from fastapi import Response
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# orjson é dependência do projeto; sem ele (instalação parcial), o JSON sai pelo módulo json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# ---------------------------
+# SERIALIZAÇÃO JSON
+# ---------------------------
+def _default(value):
+    # Arrays e escalares NumPy fora do caminho nativo do orjson (ou sem orjson)
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def _without_nan(value):
+    # Mesmo resultado do orjson para floats não finitos (NaN/Infinity viram null)
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, np.ndarray):
+        return _without_nan(value.tolist())
+    if isinstance(value, np.generic):
+        return _without_nan(value.item())
+    if isinstance(value, dict):
+        return {key: _without_nan(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_without_nan(item) for item in value]
+    return value
+
+
+def dumps(content):
+    """
+    Serializa em bytes JSON. Com orjson, arrays e escalares NumPy são escritos
+    diretamente (NaN vira null), sem passar por .tolist(). Sem orjson, o módulo
+    json recebe uma cópia com NaN trocado por None, para gerar o mesmo documento.
+    """
+    if orjson is not None:
+        return orjson.dumps(
+            content, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        )
+    return json.dumps(
+        _without_nan(content), default=_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    Resposta JSON padrão da aplicação, serializada por dumps().
+    """
+
+    def render(self, content):
+        return dumps(content)
+
+
+def json_response(content, headers=None):
+    # Devolver a resposta pronta evita o jsonable_encoder do FastAPI, que copia cada elemento
+    return FastJSONResponse(content, headers=headers)
+
+
+# ---------------------------
+# FORMATOS DE RESPOSTA
+# ---------------------------
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+
+# Formatos reconhecidos no cabeçalho Accept, em ordem de preferência
+FORMATS = (
+    (ARROW_MEDIA_TYPE, "arrow"),
+    (PARQUET_MEDIA_TYPE, "parquet"),
+    (NDJSON_MEDIA_TYPE, "ndjson"),
+)
+
+
+def format_for_accept(accept):
+    """
+    Escolhe o formato da resposta pelo cabeçalho Accept: "arrow", "parquet",
+    "ndjson" ou "json" (padrão).
+    """
+    for media_type, fmt in FORMATS:
+        if media_type in accept:
+            return fmt
+    return "json"
+
+
+def negotiate_format(request):
+    return format_for_accept(request.headers.get("accept", ""))
+
+
+def ndjson_response(pages, headers=None):
+    """
+    Resposta NDJSON em streaming: um objeto JSON por linha, enviado página a
+    página conforme o iterador produz os registros.
+    """
+    def encode(page):
+        return b"".join(dumps(row) + b"\n" for row in page)
+
+    # Páginas do snapshot (iterador comum) ou do PostgREST (iterador assíncrono)
+    if hasattr(pages, "__aiter__"):
+        async def lines():
+            async for page in pages:
+                yield encode(page)
+    else:
+        def lines():
+            for page in pages:
+                yield encode(page)
+
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE, headers=headers)
+
+
+def table_response(table, fmt, headers=None):
+    """
+    Serializa uma tabela Arrow como Arrow IPC (stream) ou Parquet.
+    """
+    sink = pa.BufferOutputStream()
+    if fmt == "parquet":
+        pq.write_table(table, sink)
+        media_type = PARQUET_MEDIA_TYPE
+    else:
+        with ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        media_type = ARROW_MEDIA_TYPE
+
+    return Response(sink.getvalue().to_pybytes(), media_type=media_type, headers=headers)
+
+
+def to_table(data):
+    # Dicionário de colunas (NumPy) ou lista de registros -> tabela Arrow
+    if isinstance(data, dict):
+        return pa.table(data)
+    return pa.Table.from_pylist(data)
+
+
+def payload_table(payload):
+    """
+    Converte um payload de estatísticas em tabela Arrow. As listas (de números
+    ou de dicionários) viram colunas de mesmo tamanho; os escalares e a
+    disposição das colunas vão como JSON nos metadados do schema ("payload").
+    """
+    layout = {"scalars": {}, "arrays": [], "frames": {}}
+    columns = {}
+
+    for name, value in payload.items():
+        if isinstance(value, np.ndarray):
+            layout["arrays"].append(name)
+            columns[name] = value
+        elif isinstance(value, list) and value and isinstance(value[0], dict):
+            # Lista de registros: uma coluna "<nome>.<campo>" por campo
+            frame = pa.Table.from_pylist(value)
+            layout["frames"][name] = frame.column_names
+            for column in frame.column_names:
+                columns[f"{name}.{column}"] = frame.column(column)
+        elif isinstance(value, list):
+            layout["arrays"].append(name)
+            columns[name] = value
+        else:
+            layout["scalars"][name] = value
+
+    table = pa.table(columns)
+    return table.replace_schema_metadata({"payload": dumps(layout)})
+
+
+def payload_response(request, payload):
+    """
+    Devolve o payload como JSON ou, se o cliente pedir, como Arrow/Parquet.
+    """
+    fmt = negotiate_format(request)
+    if fmt in ("arrow", "parquet"):
+        return table_response(payload_table(payload), fmt)
+    return json_response(payload)
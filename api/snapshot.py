@@ -0,0 +1,428 @@
+import asyncio
+import hashlib
+import os
+import time
+from functools import cached_property
+
+import numpy as np
+
+from database import PAGE_SIZE, fetch_rows, fetch_signature
+from geo import GridIndex, KDTree, Projection
+from indexes import build_indexes
+from offload import off_loop
+
+# ---------------------------
+# ESQUEMA DA TABELA miami_housing
+# ---------------------------
+# Ordem das colunas igual à carga feita em script.py
+SCHEMA = {
+    "latitude": np.float64,
+    "longitude": np.float64,
+    "parcelno": np.int64,
+    "sale_prc": np.float64,
+    "lnd_sqfoot": np.int64,
+    "tot_lvg_area": np.int64,
+    "spec_feat_val": np.int64,
+    "rail_dist": np.float64,
+    "ocean_dist": np.float64,
+    "water_dist": np.float64,
+    "cntr_dist": np.float64,
+    "subcntr_di": np.float64,
+    "hwy_dist": np.float64,
+    "age": np.int64,
+    "avno60plus": np.int64,
+    "month_sold": np.int64,
+    "structure_quality": np.int64,
+}
+
+# Segundos de validade do snapshot desde a última confirmação (0 desativa a expiração).
+# Vencido, a assinatura é conferida: igual, o prazo é estendido sem recarregar
+SNAPSHOT_TTL = float(os.getenv("SNAPSHOT_TTL", "300"))
+# Rede de segurança: idade máxima do snapshot antes de uma recarga completa, mesmo
+# com a assinatura igual (0 desativa)
+SNAPSHOT_FULL_RELOAD_INTERVAL = float(os.getenv("SNAPSHOT_FULL_RELOAD_INTERVAL", "86400"))
+# Intervalo do refresher em segundo plano entre verificações da assinatura (0 desativa o refresher)
+SNAPSHOT_CHECK_INTERVAL = float(os.getenv("SNAPSHOT_CHECK_INTERVAL", "30"))
+# Segundos sem confirmação após os quais o snapshot deixa de ser servido e a requisição espera a recarga
+SNAPSHOT_MAX_STALENESS = float(os.getenv("SNAPSHOT_MAX_STALENESS", "3600"))
+
+
+def _column_array(values, dtype):
+    # Colunas inteiras com valores nulos caem para float64 (None -> NaN)
+    try:
+        return np.asarray(values, dtype=dtype)
+    except (TypeError, ValueError):
+        return np.asarray([np.nan if v is None else v for v in values], dtype=np.float64)
+
+
+# ---------------------------
+# SNAPSHOT COLUNAR
+# ---------------------------
+class Snapshot:
+    """
+    Cópia em memória da tabela, uma coluna NumPy por campo do esquema.
+    É imutável: uma recarga gera um novo Snapshot em vez de alterar este.
+    """
+
+    def __init__(self, columns, generation, loaded_at):
+        self.columns = columns
+        self.generation = generation
+        self.loaded_at = loaded_at
+        # Momento em que o conteúdo mudou pela última vez (recargas iguais o preservam)
+        self.modified_at = loaded_at
+        self.n_rows = len(next(iter(columns.values()))) if columns else 0
+
+    @classmethod
+    def from_rows(cls, rows, generation=0):
+        columns = {
+            name: _column_array([r.get(name) for r in rows], dtype)
+            for name, dtype in SCHEMA.items()
+        }
+        return cls(columns, generation, time.time())
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __len__(self):
+        return self.n_rows
+
+    @cached_property
+    def parcel_order(self):
+        # Permutação que ordena as linhas por parcelno (base da paginação por cursor)
+        return np.argsort(self.columns["parcelno"], kind="stable")
+
+    @cached_property
+    def sorted_parcelno(self):
+        return self.columns["parcelno"][self.parcel_order]
+
+    @cached_property
+    def version(self):
+        """
+        Hash do conteúdo das colunas: identifica os dados independentemente da
+        geração, então uma recarga sem mudanças (ou um novo processo) mantém a versão.
+        """
+        digest = hashlib.blake2b(digest_size=12)
+        for name, values in self.columns.items():
+            digest.update(f"{name}:{values.dtype.str}:".encode())
+            digest.update(np.ascontiguousarray(values).data)
+        return digest.hexdigest()
+
+    @cached_property
+    def projection(self):
+        # Origem fixa por snapshot: as grades geográficas coincidem entre filtros
+        return Projection.around(self.columns["latitude"], self.columns["longitude"])
+
+    @cached_property
+    def grid(self):
+        # Índice espacial das consultas por bbox
+        return GridIndex(self.projection, self.columns["latitude"], self.columns["longitude"])
+
+    @cached_property
+    def kdtree(self):
+        # Vizinhos mais próximos (imóveis comparáveis) sobre as coordenadas projetadas
+        x, y = self.projection.to_xy(self.columns["latitude"], self.columns["longitude"])
+        return KDTree(x, y)
+
+    @cached_property
+    def indexes(self):
+        # Índices das colunas de filtro, construídos uma vez por snapshot
+        return build_indexes(self)
+
+    def rows_of(self, parcelnos):
+        """
+        Linha de cada parcelno (busca binária na ordem por parcelno); -1 para
+        os que não existem no snapshot.
+        """
+        parcelnos = np.asarray(parcelnos, dtype=self.sorted_parcelno.dtype)
+        if not self.n_rows:
+            return np.full(len(parcelnos), -1)
+        positions = np.minimum(np.searchsorted(self.sorted_parcelno, parcelnos), self.n_rows - 1)
+        found = self.sorted_parcelno[positions] == parcelnos
+        return np.where(found, self.parcel_order[positions], -1)
+
+    def take(self, rows, fields=None):
+        """
+        Novo Snapshot só com as linhas selecionadas (máscara ou índices) e,
+        opcionalmente, só com algumas colunas. rows=None mantém todas as linhas.
+        """
+        if rows is None:
+            return self
+        columns = {name: self.columns[name][rows] for name in fields or self.columns}
+        return Snapshot(columns, self.generation, self.loaded_at)
+
+    def rows_after(self, rows=None, after=None):
+        """
+        Índices, em ordem de parcelno, das linhas selecionadas (rows=None: todas)
+        que vêm depois do cursor "after".
+        """
+        if rows is not None and len(rows) < self.n_rows // 8:
+            # Poucas linhas: ordena só elas por parcelno
+            keys = self.columns["parcelno"][rows]
+            order = np.argsort(keys, kind="stable")
+            rows, keys = rows[order], keys[order]
+            if after is not None:
+                rows = rows[np.searchsorted(keys, after, side="right"):]
+            return rows
+
+        order = self.parcel_order
+        if after is not None:
+            order = order[np.searchsorted(self.sorted_parcelno, after, side="right"):]
+        if rows is None:
+            return order
+
+        mask = np.zeros(self.n_rows, dtype=bool)
+        mask[rows] = True
+        return order[mask[order]]
+
+    def page_after(self, rows=None, after=None, limit=500):
+        """
+        Paginação por cursor (keyset) em parcelno: devolve os índices das até
+        "limit" linhas selecionadas seguintes a "after", e o próximo cursor.
+        """
+        rows = self.rows_after(rows, after)[:limit + 1]
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = int(self.columns["parcelno"][rows[-1]])
+        return rows, next_cursor
+
+    def iter_records(self, rows, fields=None, page_size=PAGE_SIZE):
+        # Converte as linhas em dicionários aos poucos, uma página por vez
+        for start in range(0, len(rows), page_size):
+            yield self.to_records(rows[start:start + page_size], fields)
+
+    def to_records(self, rows=None, fields=None):
+        """
+        Converte as linhas (opcionalmente selecionadas por máscara booleana ou
+        array de índices) em lista de dicionários, no formato devolvido pelo Supabase.
+        """
+        fields = list(fields or self.columns)
+        values = []
+        for name in fields:
+            column = self.columns[name] if rows is None else self.columns[name][rows]
+            if column.dtype.kind == "f":
+                values.append([None if v != v else v for v in column.tolist()])
+            else:
+                values.append(column.tolist())
+        return [dict(zip(fields, row)) for row in zip(*values)]
+
+
+class SnapshotStore:
+    """
+    Guarda o snapshot atual. Com o refresher em segundo plano (start/stop),
+    verifica a cada "check_interval" segundos se a tabela mudou e recarrega
+    fora do caminho das requisições: quem lê continua recebendo a versão
+    anterior até a troca. Sem o refresher, confere a assinatura quando o TTL
+    expira e só recarrega se ela mudou.
+    """
+
+    def __init__(self, loader, signature=None, ttl=SNAPSHOT_TTL,
+                 check_interval=SNAPSHOT_CHECK_INTERVAL, max_staleness=SNAPSHOT_MAX_STALENESS,
+                 full_reload_interval=SNAPSHOT_FULL_RELOAD_INTERVAL):
+        # "loader" e "signature" são assíncronos: a leitura do PostgREST não bloqueia o event loop
+        self.loader = loader
+        self.signature = signature
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self.max_staleness = max_staleness
+        self.full_reload_interval = full_reload_interval
+        self._snapshot = None
+        self._signature = None
+        self._generation = 0
+        # Última vez em que o snapshot foi confirmado igual à tabela (carga ou assinatura igual)
+        self._verified_at = None
+        self._lock = asyncio.Lock()
+        self._refresher = None
+        self.metrics = {
+            "checks": 0, "changes": 0, "reloads": 0, "failures": 0,
+            "last_check_at": None, "last_reload_at": None, "last_reload_seconds": None, "last_error": None,
+        }
+
+    @property
+    def generation(self):
+        # Geração do snapshot carregado (0 antes da primeira carga)
+        return self._generation
+
+    def is_expired(self, snapshot):
+        # TTL desde a última confirmação (carga ou assinatura igual), não desde a carga
+        if snapshot is None:
+            return True
+        return self.ttl > 0 and time.time() - self._verified_at >= self.ttl
+
+    def needs_full_reload(self, snapshot):
+        # Idade desde a carga: recarrega tudo de tempos em tempos, mesmo com a assinatura igual
+        if snapshot is None:
+            return True
+        return self.full_reload_interval > 0 and time.time() - snapshot.loaded_at >= self.full_reload_interval
+
+    def is_usable(self, snapshot):
+        """
+        Se o snapshot ainda pode ser servido. Com o refresher rodando, vale até
+        "max_staleness" segundos sem confirmação; sem ele, até o TTL.
+        """
+        if snapshot is None:
+            return False
+        if not self.refreshing_in_background:
+            return not self.is_expired(snapshot)
+        return self.max_staleness <= 0 or time.time() - self._verified_at < self.max_staleness
+
+    @property
+    def refreshing_in_background(self):
+        return self._refresher is not None and not self._refresher.done()
+
+    async def get(self):
+        snapshot = self._snapshot
+        if self.is_usable(snapshot):
+            return snapshot
+
+        async with self._lock:
+            # Outra requisição (ou o refresher) pode ter recarregado enquanto esperávamos o lock
+            snapshot = self._snapshot
+            if not self.is_usable(snapshot):
+                # TTL vencido com a assinatura igual: só estende o prazo, sem recarregar
+                if self.needs_full_reload(snapshot) or not await self._signature_matches():
+                    await self._load()
+            return self._snapshot
+
+    def current(self):
+        # Snapshot carregado e ainda servível, sem disparar uma carga
+        snapshot = self._snapshot
+        return snapshot if self.is_usable(snapshot) else None
+
+    async def refresh(self):
+        if self._lock.locked():
+            # Uma carga já em andamento atende este pedido: espera por ela em vez de recarregar de novo
+            async with self._lock:
+                return self._snapshot
+
+        async with self._lock:
+            await self._load()
+            return self._snapshot
+
+    @staticmethod
+    def _build(rows, generation):
+        snapshot = Snapshot.from_rows(rows, generation)
+        # Índices montados na carga, fora do caminho das requisições
+        snapshot.indexes
+        snapshot.grid
+        snapshot.kdtree
+        snapshot.version
+        return snapshot
+
+    async def _load(self):
+        started = time.time()
+        try:
+            # Assinatura lida antes das linhas: uma mudança durante a carga aparece na próxima verificação
+            signature = await self.signature() if self.signature else None
+            rows = await self.loader()
+            snapshot = await off_loop(self._build, rows, self._generation + 1)
+        except Exception as exc:
+            self.metrics["failures"] += 1
+            self.metrics["last_error"] = repr(exc)
+            raise
+
+        previous = self._snapshot
+        if previous is not None and previous.version == snapshot.version:
+            # Mesmo conteúdo: mantém geração e data de modificação (cache e ETags seguem válidos)
+            snapshot.generation = previous.generation
+            snapshot.modified_at = previous.modified_at
+        else:
+            self._generation = snapshot.generation
+        # Troca atômica: quem já pegou o snapshot anterior continua com ele até terminar
+        self._snapshot = snapshot
+        self._signature = signature
+        self._verified_at = started
+        self.metrics["reloads"] += 1
+        self.metrics["last_reload_at"] = snapshot.loaded_at
+        self.metrics["last_reload_seconds"] = time.time() - started
+
+    async def _signature_matches(self):
+        """
+        Confere a assinatura da tabela. Igual à da última carga, marca o snapshot
+        como conferido (o que estende o TTL) e devolve True.
+        """
+        if self.signature is None:
+            return False
+
+        checked_at = time.time()
+        self.metrics["checks"] += 1
+        self.metrics["last_check_at"] = checked_at
+        try:
+            signature = await self.signature()
+        except Exception as exc:
+            self.metrics["failures"] += 1
+            self.metrics["last_error"] = repr(exc)
+            raise
+
+        if signature != self._signature:
+            self.metrics["changes"] += 1
+            return False
+        self._verified_at = checked_at
+        return True
+
+    async def revalidate(self):
+        """
+        Uma rodada do refresher: recarrega se não há snapshot, se a assinatura da
+        tabela mudou ou se passou o intervalo da recarga completa; senão, só marca
+        o snapshot como conferido. Sem assinatura, recarrega quando o TTL expira.
+        """
+        snapshot = self._snapshot
+        if self.needs_full_reload(snapshot):
+            await self.refresh()
+        elif self.signature is None:
+            if self.is_expired(snapshot):
+                await self.refresh()
+        elif not await self._signature_matches():
+            await self.refresh()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.revalidate()
+            except Exception:
+                # Falha já contada nas métricas; os leitores seguem com o snapshot anterior
+                pass
+            await asyncio.sleep(self.check_interval)
+
+    def start(self):
+        # Inicia o refresher (a primeira rodada já carrega o snapshot); check_interval=0 o desativa
+        if self.check_interval > 0 and not self.refreshing_in_background:
+            self._refresher = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._refresher is not None:
+            self._refresher.cancel()
+            try:
+                await self._refresher
+            except asyncio.CancelledError:
+                pass
+            self._refresher = None
+
+    def stats(self):
+        snapshot = self._snapshot
+        now = time.time()
+        return {
+            "rows": len(snapshot) if snapshot is not None else 0,
+            "generation": self._generation,
+            "version": snapshot.version if snapshot is not None else None,
+            "signature": self._signature,
+            "loaded_at": snapshot.loaded_at if snapshot is not None else None,
+            "modified_at": snapshot.modified_at if snapshot is not None else None,
+            "age_seconds": now - snapshot.loaded_at if snapshot is not None else None,
+            "staleness_seconds": now - self._verified_at if self._verified_at is not None else None,
+            "ttl": self.ttl,
+            "check_interval": self.check_interval,
+            "max_staleness": self.max_staleness,
+            "full_reload_interval": self.full_reload_interval,
+            "background": self.refreshing_in_background,
+            "loading": self._lock.locked(),
+            **self.metrics,
+        }
+
+
+store = SnapshotStore(fetch_rows, fetch_signature)
+
+
+async def get_snapshot():
+    return await store.get()
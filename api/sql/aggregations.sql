@@ -0,0 +1,515 @@
+-- ---------------------------
+-- AGREGAÇÕES NO POSTGRES (AGGREGATION_BACKEND=postgres)
+-- ---------------------------
+-- Funções chamadas via supabase.rpc(...) pelas rotas de estatística.
+-- Cada função devolve o mesmo JSON que o caminho em Python de api/main.py.
+-- As posições de mediana e IQR replicam os índices usados em Python
+-- (sorted(prices)[int(n * q)]) para que os dois backends devolvam os mesmos valores.
+--
+-- Todas aceitam os mesmos filtros opcionais da rota /api/houses (nulos = sem filtro).
+--
+-- Instalação: execute este arquivo no SQL Editor do Supabase (ou via psql).
+
+-- Versões anteriores, sem filtros, tornariam as chamadas ambíguas
+drop function if exists houses_price_stats();
+drop function if exists houses_sales_time();
+drop function if exists houses_distance_impact(float8, float8);
+-- Assinatura anterior ao modo resumo (summary, bins)
+drop function if exists houses_price_stats(float8, float8, int, int, int, int, int, int, float8, float8);
+-- Assinatura anterior às curvas por faixa de distância (dist_columns, edges, buckets, raw)
+drop function if exists houses_distance_impact(float8, float8, int, int, int, int, int, int, float8, float8, float8, float8);
+-- Assinaturas anteriores ao orçamento de pontos (max_points)
+drop function if exists houses_price_stats(float8, float8, int, int, int, int, int, int, float8, float8, boolean, int);
+drop function if exists houses_distance_impact(
+    float8, float8, int, int, int, int, int, int, float8, float8, float8, float8, text[], float8[], int, boolean
+);
+
+-- ---------------------------
+-- FILTROS COMPARTILHADOS
+-- ---------------------------
+create or replace function houses_filtered(
+    min_price float8 default null,
+    max_price float8 default null,
+    min_age int default null,
+    max_age int default null,
+    min_area int default null,
+    max_area int default null,
+    structure_quality int default null,
+    avno60plus int default null,
+    max_ocean_dist float8 default null,
+    max_hwy_dist float8 default null
+)
+returns setof miami_housing
+language sql
+stable
+as $$
+    -- Parâmetros qualificados pelo nome da função: colunas têm precedência em SQL
+    select *
+    from miami_housing m
+    where (houses_filtered.min_price is null or m.sale_prc >= houses_filtered.min_price)
+      and (houses_filtered.max_price is null or m.sale_prc <= houses_filtered.max_price)
+      and (houses_filtered.min_age is null or m.age >= houses_filtered.min_age)
+      and (houses_filtered.max_age is null or m.age <= houses_filtered.max_age)
+      and (houses_filtered.min_area is null or m.tot_lvg_area >= houses_filtered.min_area)
+      and (houses_filtered.max_area is null or m.tot_lvg_area <= houses_filtered.max_area)
+      and (houses_filtered.structure_quality is null or m.structure_quality = houses_filtered.structure_quality)
+      and (houses_filtered.avno60plus is null or m.avno60plus = houses_filtered.avno60plus)
+      and (houses_filtered.max_ocean_dist is null or m.ocean_dist <= houses_filtered.max_ocean_dist)
+      and (houses_filtered.max_hwy_dist is null or m.hwy_dist <= houses_filtered.max_hwy_dist)
+$$;
+
+-- ---------------------------
+-- AMOSTRAGEM COMPARTILHADA
+-- ---------------------------
+-- Mesmo critério de stats.scatter_sample: com n linhas ordenadas e orçamento
+-- max_points, ficam as posições floor(i * (n - 1) / (k - 1)), i = 0..k-1, com
+-- k = max_points - 3 (os três extremos restantes são testados por quem chama).
+create or replace function houses_sample_keep(pos bigint, n bigint, max_points int)
+returns boolean
+language sql
+immutable
+as $$
+    select max_points is null
+        or n <= max_points
+        -- i = ceil(pos * (k - 1) / (n - 1)) é o único passo que pode cair em "pos"
+        or (pos * (greatest(max_points - 3, 1) - 1) + n - 2) / (n - 1) * (n - 1)
+               / greatest(max_points - 4, 1) = pos
+$$;
+
+-- ---------------------------
+-- /api/houses/price-stats
+-- ---------------------------
+create or replace function houses_price_stats(
+    min_price float8 default null,
+    max_price float8 default null,
+    min_age int default null,
+    max_age int default null,
+    min_area int default null,
+    max_area int default null,
+    structure_quality int default null,
+    avno60plus int default null,
+    max_ocean_dist float8 default null,
+    max_hwy_dist float8 default null,
+    summary boolean default false,
+    bins int default 30,
+    max_points int default null
+)
+returns json
+language sql
+stable
+as $$
+    with base as (
+        -- "ord" guarda a ordem das linhas: as listas saem na mesma ordem do snapshot,
+        -- que é carregado ordenado por parcelno
+        select row_number() over (order by parcelno) as ord,
+               parcelno,
+               sale_prc::float8 as sale_prc,
+               lnd_sqfoot::float8 as lnd_sqfoot,
+               tot_lvg_area,
+               structure_quality
+        from houses_filtered(
+            min_price, max_price, min_age, max_age, min_area, max_area,
+            structure_quality, avno60plus, max_ocean_dist, max_hwy_dist
+        )
+    ),
+    ordered as (
+        -- Só preços conhecidos: nulos deslocariam as posições de mediana, IQR e quartis
+        select array_agg(sale_prc order by sale_prc) filter (where sale_prc is not null) as prices,
+               count(sale_prc) as n
+        from base
+    ),
+    cuts as (
+        select prices[floor(n * 0.5::float8)::int + 1] as price_median,
+               prices[floor(n * 0.75::float8)::int + 1] - prices[floor(n * 0.25::float8)::int + 1] as price_iqr
+        from ordered
+    ),
+    -- Linhas das listas por imóvel: amostra em (tot_lvg_area, sale_prc), com os extremos.
+    -- materialized: sem isso o plano genérico da função refaz as janelas a cada linha de base
+    kept as materialized (
+        select ord
+        from (
+            select ord,
+                   houses_sample_keep(
+                       row_number() over (order by tot_lvg_area, sale_prc, parcelno) - 1,
+                       count(*) over (),
+                       houses_price_stats.max_points
+                   )
+                   or row_number() over (order by sale_prc, tot_lvg_area, parcelno) = 1
+                   or row_number() over (
+                       order by tot_lvg_area desc nulls last, sale_prc desc nulls last, parcelno desc) = 1
+                   or row_number() over (
+                       order by sale_prc desc nulls last, tot_lvg_area desc nulls last, parcelno desc) = 1 as keep
+            from base
+            where houses_price_stats.max_points is not null
+        ) r
+        where keep
+    ),
+    quality as (
+        select json_object_agg(structure_quality::text, avg_price order by structure_quality) as quality_price_avg
+        from (
+            select structure_quality, avg(sale_prc) as avg_price
+            from base
+            where structure_quality is not null
+            group by structure_quality
+        ) q
+    ),
+    totals as (
+        select avg(b.sale_prc) as price_avg,
+               min(b.sale_prc) as price_min,
+               max(b.sale_prc) as price_max,
+               stddev_pop(b.sale_prc) as price_stddev,
+               avg(b.lnd_sqfoot) as land_area_avg,
+               avg(b.tot_lvg_area)::float8 as living_area_avg,
+               count(*) as population_size,
+               -- No modo resumo as listas por linha não são montadas
+               json_agg(b.sale_prc order by b.ord)
+                   filter (where not houses_price_stats.summary and s.keep) as price_distribution,
+               json_agg(b.tot_lvg_area order by b.ord)
+                   filter (where not houses_price_stats.summary and s.keep) as living_area_distribution,
+               -- Pontos do gráfico área x preço; no modo resumo, só com orçamento (max_points)
+               json_agg(json_build_object(
+                   'sale_prc', b.sale_prc,
+                   'tot_lvg_area', b.tot_lvg_area
+               ) order by b.ord) filter (
+                   where s.keep and (not houses_price_stats.summary or houses_price_stats.max_points is not null)
+               ) as price_cluster
+        from base b
+        left join kept k on k.ord = b.ord
+        -- Sem orçamento todas as linhas ficam
+        cross join lateral (
+            select houses_price_stats.max_points is null or k.ord is not null as keep
+        ) s
+    ),
+    -- ---------- Modo resumo: boxplot e histograma ----------
+    quartiles as (
+        select prices[floor(n * 0.25::float8)::int + 1] as q1,
+               prices[floor(n * 0.5::float8)::int + 1] as median,
+               prices[floor(n * 0.75::float8)::int + 1] as q3
+        from ordered
+    ),
+    fences as (
+        select q1, median, q3,
+               q1 - 1.5 * (q3 - q1) as low_fence,
+               q3 + 1.5 * (q3 - q1) as high_fence
+        from quartiles
+    ),
+    box as (
+        select min(p) filter (where p >= f.low_fence) as lower_whisker,
+               max(p) filter (where p <= f.high_fence) as upper_whisker,
+               coalesce(array_agg(p order by p) filter (where p < f.low_fence or p > f.high_fence), '{}') as outliers
+        from ordered o
+        cross join fences f
+        cross join lateral unnest(o.prices) p
+        where houses_price_stats.summary
+    ),
+    box_sample as (
+        -- Até 100 outliers em passos regulares, incluindo os extremos (mesmo critério do Python)
+        select case when cardinality(outliers) <= 100 then outliers
+                    else array(
+                        select outliers[(i * (cardinality(outliers) - 1)) / 99 + 1]
+                        from generate_series(0, 99) i
+                        order by i
+                    ) end as outliers
+        from box
+    ),
+    hist_range as (
+        select case when price_min = price_max then price_min - 0.5 else price_min end as lo,
+               case when price_min = price_max then price_max + 0.5 else price_max end as hi
+        from totals
+        where houses_price_stats.summary and price_min is not null
+    ),
+    hist as (
+        select json_build_object(
+                   'edges', (
+                       select json_agg(case when i = houses_price_stats.bins then r.hi
+                                            else r.lo + i * (r.hi - r.lo) / houses_price_stats.bins end order by i)
+                       from generate_series(0, houses_price_stats.bins) i
+                   ),
+                   'counts', (
+                       select json_agg(coalesce(k.count, 0) order by g.bucket)
+                       from generate_series(1, houses_price_stats.bins) g(bucket)
+                       left join (
+                           -- O maior valor cai no último intervalo, como no np.histogram
+                           select least(width_bucket(b.sale_prc, r.lo, r.hi, houses_price_stats.bins),
+                                        houses_price_stats.bins) as bucket,
+                                  count(*) as count
+                           from base b
+                           where b.sale_prc is not null
+                           group by 1
+                       ) k on k.bucket = g.bucket
+                   )
+               ) as price_histogram
+        from hist_range r
+    ),
+    result as (
+        select json_build_object(
+            'price_avg', coalesce(t.price_avg, 0),
+            'price_min', coalesce(t.price_min, 0),
+            'price_max', coalesce(t.price_max, 0),
+            'price_median', coalesce(c.price_median, 0),
+            'price_stddev', coalesce(t.price_stddev, 0),
+            'price_iqr', coalesce(c.price_iqr, 0),
+            'land_area_avg', coalesce(t.land_area_avg, 0),
+            'living_area_avg', coalesce(t.living_area_avg, 0),
+            'quality_price_avg', coalesce(q.quality_price_avg, '{}'::json),
+            'price_distribution', coalesce(t.price_distribution, '[]'::json),
+            'living_area_distribution', coalesce(t.living_area_distribution, '[]'::json),
+            'price_cluster', coalesce(t.price_cluster, '[]'::json),
+            'population_size', t.population_size,
+            'sampled', coalesce(t.population_size > houses_price_stats.max_points, false)
+        ) as payload
+        from totals t, cuts c, quality q
+    )
+    select case when not houses_price_stats.summary then r.payload
+        else (
+            r.payload::jsonb - 'price_distribution' - 'living_area_distribution'
+            -- Sem max_points a lista de pontos teria uma entrada por linha
+            - case when houses_price_stats.max_points is null then 'price_cluster' else '' end
+            || jsonb_build_object(
+                'price_histogram', coalesce(
+                    (select price_histogram from hist), '{"edges": [], "counts": []}'::json
+                ),
+                'price_box', coalesce(
+                    (select json_build_object(
+                        'q1', f.q1,
+                        'median', f.median,
+                        'q3', f.q3,
+                        'lower_whisker', b.lower_whisker,
+                        'upper_whisker', b.upper_whisker,
+                        'outliers', to_json(s.outliers),
+                        'outlier_count', cardinality(b.outliers)
+                    )
+                    from fences f, box b, box_sample s
+                    where f.median is not null),
+                    '{"q1": 0, "median": 0, "q3": 0, "lower_whisker": 0, "upper_whisker": 0,
+                      "outliers": [], "outlier_count": 0}'::json
+                )
+            )
+        )::json end
+    from result r
+$$;
+
+-- ---------------------------
+-- /api/houses/sales-time
+-- ---------------------------
+create or replace function houses_sales_time(
+    min_price float8 default null,
+    max_price float8 default null,
+    min_age int default null,
+    max_age int default null,
+    min_area int default null,
+    max_area int default null,
+    structure_quality int default null,
+    avno60plus int default null,
+    max_ocean_dist float8 default null,
+    max_hwy_dist float8 default null
+)
+returns json
+language sql
+stable
+as $$
+    select coalesce(json_agg(json_build_object(
+        'month', month_sold,
+        'total_sales', total_sales,
+        'average_price', average_price
+    ) order by month_sold), '[]'::json)
+    from (
+        select month_sold,
+               count(*) as total_sales,
+               avg(sale_prc)::float8 as average_price
+        from houses_filtered(
+            min_price, max_price, min_age, max_age, min_area, max_area,
+            structure_quality, avno60plus, max_ocean_dist, max_hwy_dist
+        )
+        group by month_sold
+    ) m
+$$;
+
+-- ---------------------------
+-- /api/houses/distance-impact
+-- ---------------------------
+create or replace function houses_distance_impact(
+    min_price float8 default null,
+    max_price float8 default null,
+    min_age int default null,
+    max_age int default null,
+    min_area int default null,
+    max_area int default null,
+    structure_quality int default null,
+    avno60plus int default null,
+    max_ocean_dist float8 default null,
+    max_hwy_dist float8 default null,
+    ocean_near float8 default 15000,
+    hwy_near float8 default 5000,
+    dist_columns text[] default array['ocean_dist', 'hwy_dist'],
+    edges float8[] default null,
+    buckets int default 10,
+    raw boolean default false,
+    max_points int default null
+)
+returns json
+language sql
+stable
+as $$
+    with d as (
+        select row_number() over (order by parcelno) as ord,
+               parcelno,
+               sale_prc::float8 as sale_prc,
+               ocean_dist::float8 as ocean_dist,
+               hwy_dist::float8 as hwy_dist,
+               avno60plus,
+               rail_dist::float8 as rail_dist,
+               water_dist::float8 as water_dist,
+               cntr_dist::float8 as cntr_dist,
+               subcntr_di::float8 as subcntr_di,
+               spec_feat_val::float8 as spec_feat_val
+        from houses_filtered(
+            min_price, max_price, min_age, max_age, min_area, max_area,
+            structure_quality, avno60plus, max_ocean_dist, max_hwy_dist
+        )
+        where sale_prc is not null
+    ),
+    -- Amostra de cada lista por imóvel (mesmo critério de stats.scatter_sample);
+    -- listas de preço em 1D: o menor valor já é a posição 0 da ordenação
+    s as (
+        select d.*,
+               houses_sample_keep(row_number() over ocean_side - 1, count(*) over ocean_part, max_points)
+                   or row_number() over ocean_side_desc = 1 as keep_ocean_side,
+               houses_sample_keep(row_number() over hwy_side - 1, count(*) over hwy_part, max_points)
+                   or row_number() over hwy_side_desc = 1 as keep_hwy_side,
+               houses_sample_keep(row_number() over noise - 1, count(*) over noise_part, max_points)
+                   or row_number() over noise_desc = 1 as keep_noise,
+               houses_sample_keep(row_number() over (order by ocean_dist, sale_prc, parcelno) - 1, count(*) over (), max_points)
+                   or row_number() over (order by sale_prc, ocean_dist, parcelno) = 1
+                   or row_number() over (
+                       order by ocean_dist desc nulls last, sale_prc desc nulls last, parcelno desc) = 1
+                   or row_number() over (
+                       order by sale_prc desc nulls last, ocean_dist desc nulls last, parcelno desc) = 1 as keep_ocean_raw,
+               houses_sample_keep(row_number() over (order by hwy_dist, sale_prc, parcelno) - 1, count(*) over (), max_points)
+                   or row_number() over (order by sale_prc, hwy_dist, parcelno) = 1
+                   or row_number() over (
+                       order by hwy_dist desc nulls last, sale_prc desc nulls last, parcelno desc) = 1
+                   or row_number() over (
+                       order by sale_prc desc nulls last, hwy_dist desc nulls last, parcelno desc) = 1 as keep_hwy_raw
+        from d
+        where houses_distance_impact.max_points is not null
+        window ocean_part as (partition by ocean_dist <= houses_distance_impact.ocean_near),
+               ocean_side as (ocean_part order by sale_prc, parcelno),
+               ocean_side_desc as (ocean_part order by sale_prc desc, parcelno desc),
+               hwy_part as (partition by hwy_dist <= houses_distance_impact.hwy_near),
+               hwy_side as (hwy_part order by sale_prc, parcelno),
+               hwy_side_desc as (hwy_part order by sale_prc desc, parcelno desc),
+               noise_part as (partition by avno60plus),
+               noise as (noise_part order by sale_prc, parcelno),
+               noise_desc as (noise_part order by sale_prc desc, parcelno desc)
+        union all
+        -- Sem orçamento todas as linhas ficam
+        select d.*, true, true, true, true, true
+        from d
+        where houses_distance_impact.max_points is null
+    ),
+    -- Uma linha por (coluna pedida, imóvel)
+    v as (
+        select c.name,
+               case c.name
+                   when 'rail_dist' then d.rail_dist
+                   when 'ocean_dist' then d.ocean_dist
+                   when 'water_dist' then d.water_dist
+                   when 'cntr_dist' then d.cntr_dist
+                   when 'subcntr_di' then d.subcntr_di
+                   when 'hwy_dist' then d.hwy_dist
+                   when 'spec_feat_val' then d.spec_feat_val
+               end as value,
+               d.sale_prc
+        from d
+        cross join unnest(houses_distance_impact.dist_columns) as c(name)
+    ),
+    -- Bordas pedidas ou larguras iguais entre mínimo e máximo (mesma conta do np.linspace)
+    bounds as (
+        select c.name, c.ord,
+               case when min(v.value) = max(v.value) then min(v.value) - 0.5 else min(v.value) end as lo,
+               case when min(v.value) = max(v.value) then max(v.value) + 0.5 else max(v.value) end as hi
+        from unnest(houses_distance_impact.dist_columns) with ordinality as c(name, ord)
+        left join v on v.name = c.name
+        group by c.name, c.ord
+    ),
+    bucket_edges as (
+        select b.name, b.ord,
+               case
+                   when houses_distance_impact.edges is not null then houses_distance_impact.edges
+                   when b.lo is null then array[]::float8[]
+                   else array(
+                       select case when i = houses_distance_impact.buckets then b.hi
+                                   else b.lo + i * ((b.hi - b.lo) / houses_distance_impact.buckets) end
+                       from generate_series(0, houses_distance_impact.buckets) as i
+                       order by i
+                   )
+               end as e
+        from bounds b
+    ),
+    -- Faixas [e_i, e_i+1), a última fechada à direita; fora das bordas fica de fora
+    binned as (
+        select v.name, v.sale_prc,
+               case when v.value = b.e[cardinality(b.e)] then cardinality(b.e) - 1
+                    else width_bucket(v.value, b.e) end as bucket
+        from v
+        join bucket_edges b on b.name = v.name
+        where cardinality(b.e) >= 2
+    ),
+    bucket_stats as (
+        select name, bucket, count(*) as n, avg(sale_prc) as mean,
+               (array_agg(sale_prc order by sale_prc))[floor(count(*) * 0.5::float8)::int + 1] as median
+        from binned
+        group by name, bucket
+    ),
+    curves as (
+        select b.name, b.ord, json_build_object(
+                   'edges', to_json(b.e),
+                   'count', coalesce(json_agg(coalesce(s.n, 0) order by i) filter (where i is not null), '[]'::json),
+                   'mean', coalesce(json_agg(s.mean order by i) filter (where i is not null), '[]'::json),
+                   'median', coalesce(json_agg(s.median order by i) filter (where i is not null), '[]'::json)
+               ) as curve
+        from bucket_edges b
+        left join lateral generate_series(1, cardinality(b.e) - 1) as i on true
+        left join bucket_stats s on s.name = b.name and s.bucket = i
+        group by b.name, b.ord, b.e
+    ),
+    result as (
+        select jsonb_build_object(
+            'avg_price_near_ocean', avg(sale_prc) filter (where ocean_dist <= ocean_near),
+            'avg_price_far_from_ocean', avg(sale_prc) filter (where ocean_dist > ocean_near),
+            'avg_price_near_highway', avg(sale_prc) filter (where hwy_dist <= hwy_near),
+            'avg_price_far_from_highway', avg(sale_prc) filter (where hwy_dist > hwy_near),
+            'avg_price_airport_noise', avg(sale_prc) filter (where avno60plus = 1),
+            'avg_price_no_airport_noise', avg(sale_prc) filter (where avno60plus = 0),
+            'count_near_ocean', count(*) filter (where ocean_dist <= ocean_near),
+            'count_near_highway', count(*) filter (where hwy_dist <= hwy_near),
+            'count_airport_noise', count(*) filter (where avno60plus = 1),
+            'prices_near_ocean', coalesce(
+                jsonb_agg(sale_prc order by ord) filter (where ocean_dist <= ocean_near and keep_ocean_side), '[]'::jsonb),
+            'prices_far_ocean', coalesce(
+                jsonb_agg(sale_prc order by ord) filter (where ocean_dist > ocean_near and keep_ocean_side), '[]'::jsonb),
+            'prices_near_highway', coalesce(
+                jsonb_agg(sale_prc order by ord) filter (where hwy_dist <= hwy_near and keep_hwy_side), '[]'::jsonb),
+            'prices_far_highway', coalesce(
+                jsonb_agg(sale_prc order by ord) filter (where hwy_dist > hwy_near and keep_hwy_side), '[]'::jsonb),
+            'prices_airport_noise', coalesce(
+                jsonb_agg(sale_prc order by ord) filter (where avno60plus = 1 and keep_noise), '[]'::jsonb),
+            'prices_no_airport_noise', coalesce(
+                jsonb_agg(sale_prc order by ord) filter (where avno60plus = 0 and keep_noise), '[]'::jsonb),
+            'distance_curves', coalesce(
+                (select jsonb_object_agg(name, curve) from curves), '{}'::jsonb
+            ),
+            'population_size', count(*),
+            'sampled', coalesce(count(*) > houses_distance_impact.max_points, false)
+        ) || case when houses_distance_impact.raw then jsonb_build_object(
+            -- Pontos por imóvel só quando pedidos
+            'dist_ocean', coalesce(jsonb_agg(ocean_dist order by ord) filter (where keep_ocean_raw), '[]'::jsonb),
+            'dist_ocean_price', coalesce(jsonb_agg(sale_prc order by ord) filter (where keep_ocean_raw), '[]'::jsonb),
+            'dist_hwy', coalesce(jsonb_agg(hwy_dist order by ord) filter (where keep_hwy_raw), '[]'::jsonb),
+            'dist_hwy_price', coalesce(jsonb_agg(sale_prc order by ord) filter (where keep_hwy_raw), '[]'::jsonb)
+        ) else '{}'::jsonb end as payload
+        from s
+    )
+    select payload::json from result
+$$;
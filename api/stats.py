@@ -0,0 +1,278 @@
+import numpy as np
+
+# ---------------------------
+# ESTATÍSTICAS VETORIZADAS (NumPy)
+# ---------------------------
+# Funções compartilhadas pelas rotas de estatística. Todas recebem colunas
+# NumPy do snapshot e evitam laços em Python.
+
+def dropna(values):
+    # Colunas com nulos chegam do snapshot como float com NaN (None -> NaN)
+    return values[~np.isnan(values)] if values.dtype.kind == "f" else values
+
+
+def positions(n, probs):
+    # Mesmo critério de posição da versão original: sorted(values)[int(n * q)]
+    return [min(int(n * q), n - 1) for q in probs]
+
+
+def quantiles(values, probs):
+    """
+    Quantis exatos (valores reais da amostra) para várias probabilidades,
+    calculados com um único np.partition em vez de ordenar o array inteiro.
+    Nulos (NaN) ficam de fora, como no Postgres.
+    """
+    values = dropna(values)
+    if len(values) == 0:
+        return [0] * len(probs)
+
+    kth = positions(len(values), probs)
+    partitioned = np.partition(values, sorted(set(kth)))
+    return [partitioned[k].item() for k in kth]
+
+
+def describe(values):
+    """
+    Média, mínimo, máximo e desvio padrão populacional de uma coluna, sem os nulos.
+    """
+    values = dropna(values)
+    if len(values) == 0:
+        return {"mean": 0, "min": 0, "max": 0, "std": 0}
+
+    return {
+        "mean": values.mean().item(),
+        "min": values.min().item(),
+        "max": values.max().item(),
+        "std": values.std().item(),
+    }
+
+
+def mean_or(values, default=None):
+    values = dropna(values)
+    return values.mean().item() if len(values) else default
+
+
+def grouped(values, groups):
+    """
+    Agrupa "values" por "groups" numa única passada: devolve as chaves
+    ordenadas, a contagem e a média de cada grupo. Como count(*) e avg() no
+    Postgres, valores nulos (NaN) contam no grupo mas ficam fora da média;
+    um grupo só de nulos tem média NaN.
+    """
+    small = groups.dtype.kind in "iu" and len(groups) and 0 <= groups.min() and groups.max() < 65536
+    if small:
+        # Grupos inteiros pequenos (qualidade, mês): o próprio valor serve de índice
+        index, size = groups, groups.max() + 1
+    else:
+        keys, index = np.unique(groups, return_inverse=True)
+        size = len(keys)
+
+    counts = np.bincount(index, minlength=size)
+    if values.dtype.kind == "f" and np.isnan(values).any():
+        valid = ~np.isnan(values)
+        sums = np.bincount(index[valid], weights=values[valid], minlength=size)
+        filled = np.bincount(index[valid], minlength=size)
+    else:
+        sums = np.bincount(index, weights=values, minlength=size)
+        filled = counts
+
+    if small:
+        keys = np.flatnonzero(counts)
+        counts, sums, filled = counts[keys], sums[keys], filled[keys]
+    means = np.divide(sums, filled, out=np.full(len(sums), np.nan), where=filled > 0)
+    return keys, counts, means
+
+
+def grouped_mean(values, groups):
+    # Média por grupo como dicionário {grupo: média}; grupos nulos (NaN) ficam de fora
+    keys, _, means = grouped(values, groups)
+    if keys.dtype.kind == "f":
+        known = ~np.isnan(keys)
+        keys, means = keys[known], means[known]
+    return dict(zip(keys.tolist(), means.tolist()))
+
+
+def equal_width_edges(values, bins):
+    """
+    bins + 1 bordas de larguras iguais entre o mínimo e o máximo (valores
+    sem NaN); vazio quando não há valores.
+    """
+    if len(values) == 0:
+        return np.array([], dtype=np.float64)
+
+    lo, hi = values.min().item(), values.max().item()
+    if lo == hi:
+        # Um único valor: intervalo de largura 1 centrado nele, como o np.histogram
+        lo, hi = lo - 0.5, hi + 0.5
+    return np.linspace(lo, hi, bins + 1)
+
+
+def histogram(values, bins):
+    """
+    Histograma de larguras iguais entre o mínimo e o máximo: bins + 1 bordas
+    e bins contagens (o último intervalo inclui a borda direita).
+    """
+    values = dropna(values)
+    if len(values) == 0:
+        return {"edges": [], "counts": []}
+
+    edges = equal_width_edges(values, bins)
+    counts, _ = np.histogram(values, edges)
+    return {"edges": edges, "counts": counts}
+
+
+def binned_stats(keys, values, edges):
+    """
+    Contagem, média e mediana de "values" por faixa de "keys" numa única
+    ordenação. Faixas [e_i, e_i+1), a última fechada à direita; chaves fora
+    das bordas (ou NaN) ficam de fora. Mediana no mesmo critério de posição
+    de quantiles; média e mediana None nas faixas vazias.
+    """
+    n_bins = max(len(edges) - 1, 0)
+    bucket = np.searchsorted(edges, keys, side="right") - 1
+    if n_bins:
+        bucket[keys == edges[-1]] = n_bins - 1
+    inside = (bucket >= 0) & (bucket < n_bins)
+    bucket, values = bucket[inside], values[inside]
+
+    counts = np.bincount(bucket, minlength=n_bins)
+    sums = np.bincount(bucket, weights=values, minlength=n_bins)
+    # Ordenado por faixa e depois por valor: cada faixa é uma fatia contínua
+    ordered = values[np.lexsort((values, bucket))]
+    starts = np.cumsum(counts) - counts
+    filled = counts > 0
+    medians = ordered[(starts + counts // 2)[filled]]
+
+    mean, median = [None] * n_bins, [None] * n_bins
+    for i, avg, med in zip(np.flatnonzero(filled).tolist(), (sums[filled] / counts[filled]).tolist(), medians.tolist()):
+        mean[i], median[i] = avg, med
+    return {"edges": edges, "count": counts, "mean": mean, "median": median}
+
+
+def scatter_sample(x, y, ids, max_points):
+    """
+    Índices (em ordem crescente) de uma amostra reproduzível de até
+    "max_points" pontos (x, y). Estratificada pela ordem de x: posições em
+    passos regulares da ordenação por (x, y, ids), o que preserva a densidade
+    ao longo de x e inclui o menor x; mais os pontos de menor y e de maior x
+    e y (NaN nunca conta como extremo). "ids" desempata valores iguais.
+    Sem amostragem quando os pontos cabem no orçamento.
+    """
+    n = len(x)
+    if n <= max_points:
+        return np.arange(n)
+
+    k = max(max_points - 3, 1)
+    order = np.lexsort((ids, y, x))
+    picked = order[np.arange(k) * (n - 1) // max(k - 1, 1)]
+    extremes = [
+        np.lexsort((ids, x, y))[0],
+        np.lexsort((-ids, -y, -x))[0],
+        np.lexsort((-ids, -x, -y))[0],
+    ]
+    return np.union1d(picked, extremes)
+
+
+def box_summary(values, max_outliers=100):
+    """
+    Estatísticas de boxplot: quartis (mesmo critério de posição de quantiles),
+    bigodes de Tukey (valores mais extremos dentro de 1,5 IQR) e até
+    "max_outliers" outliers amostrados em passos regulares, sempre incluindo os extremos.
+    """
+    values = np.sort(dropna(values))
+    n = len(values)
+    if n == 0:
+        return {"q1": 0, "median": 0, "q3": 0, "lower_whisker": 0, "upper_whisker": 0,
+                "outliers": [], "outlier_count": 0}
+
+    q1, median, q3 = (values[k].item() for k in positions(n, (0.25, 0.5, 0.75)))
+    low_fence, high_fence = q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1)
+    # Array ordenado: os valores dentro das cercas formam uma fatia contínua
+    lo = int(np.searchsorted(values, low_fence, side="left"))
+    hi = int(np.searchsorted(values, high_fence, side="right"))
+    outliers = np.concatenate([values[:lo], values[hi:]])
+
+    m = len(outliers)
+    if m > max_outliers:
+        outliers = outliers[np.arange(max_outliers) * (m - 1) // (max_outliers - 1)]
+
+    return {
+        "q1": q1,
+        "median": median,
+        "q3": q3,
+        "lower_whisker": values[lo].item(),
+        "upper_whisker": values[hi - 1].item(),
+        "outliers": outliers,
+        "outlier_count": m,
+    }
+
+
+# ---------------------------
+# K-MEANS EM MINI-LOTES
+# ---------------------------
+# Pontos por mini-lote, limite de iterações e deslocamento mínimo dos centros
+KMEANS_BATCH_SIZE = 1024
+KMEANS_MAX_ITER = 100
+KMEANS_TOL = 1e-4
+
+
+def nearest_center(points, centers, chunk=65536):
+    """
+    Índice do centro mais próximo de cada ponto, em blocos para limitar a
+    matriz de distâncias (pontos x centros) em memória.
+    """
+    labels = np.empty(len(points), dtype=np.intp)
+    center_norms = (centers ** 2).sum(axis=1)
+    for start in range(0, len(points), chunk):
+        block = points[start:start + chunk]
+        # |x - c|² sem o termo |x|², que não muda o centro escolhido
+        labels[start:start + chunk] = (center_norms - 2 * block @ centers.T).argmin(axis=1)
+    return labels
+
+
+def kmeans_plus_plus(points, k, rng):
+    # Centros iniciais do k-means++: cada novo centro sorteado com peso na distância²
+    centers = [points[rng.integers(len(points))]]
+    closest = ((points - centers[0]) ** 2).sum(axis=1)
+    for _ in range(1, k):
+        total = closest.sum()
+        chosen = rng.choice(len(points), p=closest / total) if total > 0 else rng.integers(len(points))
+        centers.append(points[chosen])
+        closest = np.minimum(closest, ((points - points[chosen]) ** 2).sum(axis=1))
+    return np.array(centers)
+
+
+def minibatch_kmeans(points, k, batch_size=KMEANS_BATCH_SIZE, max_iter=KMEANS_MAX_ITER, tol=KMEANS_TOL, seed=0):
+    """
+    K-means em mini-lotes (Sculley, 2010): cada iteração atribui um lote
+    sorteado aos centros e move cada centro para a média ponderada pelo total
+    de pontos que já recebeu. Inicialização k-means++ numa amostra; semente
+    fixa, então o resultado é o mesmo para os mesmos dados.
+    Devolve (centros, rótulo de cada ponto).
+    """
+    n = len(points)
+    k = min(k, n)
+    if k == 0:
+        return np.empty((0, points.shape[1])), np.empty(0, dtype=np.intp)
+
+    rng = np.random.default_rng(seed)
+    sample = points if n <= 3 * batch_size else points[rng.choice(n, 3 * batch_size, replace=False)]
+    centers = kmeans_plus_plus(sample, k, rng)
+    counts = np.zeros(k)
+
+    for _ in range(max_iter):
+        batch = points[rng.integers(0, n, batch_size)]
+        labels = nearest_center(batch, centers)
+        batch_counts = np.bincount(labels, minlength=k)
+        sums = np.stack([np.bincount(labels, weights=batch[:, d], minlength=k) for d in range(points.shape[1])], axis=1)
+
+        new_counts = counts + batch_counts
+        moved = batch_counts > 0
+        updated = centers.copy()
+        updated[moved] = (centers[moved] * counts[moved, None] + sums[moved]) / new_counts[moved, None]
+        shift = ((updated - centers) ** 2).sum()
+        centers, counts = updated, new_counts
+        if shift < tol:
+            break
+
+    return centers, nearest_center(points, centers)
@@ -0,0 +1,94 @@
+"""
+Benchmark: response compression per endpoint (wire bytes and CPU per encoding).
+
+Fetches each endpoint from a running API once per encoding, reporting the bytes
+actually sent over the wire and the request time. The CPU cost of compressing
+and decompressing the same body is then measured locally, at the levels
+configured in api/content_encoding.py (GZIP_LEVEL, ZSTD_LEVEL, BROTLI_LEVEL).
+
+Usage (from the repository root, with the API running on localhost:8000):
+    python benchmarks/bench_compression.py
+    python benchmarks/bench_compression.py --url http://localhost:8000/api --repeat 5
+"""
+import argparse
+import gzip
+import os
+import sys
+import time
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "api"))
+import content_encoding  # noqa: E402
+
+ENDPOINTS = (
+    "houses?limit=10000",
+    "houses/price-stats",
+    "houses/sales-time",
+    "houses/distance-impact",
+    "houses/filters-range",
+)
+
+
+def decompress(data, encoding):
+    if encoding == "gzip":
+        return gzip.decompress(data)
+    if encoding == "zstd":
+        return content_encoding.zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    return content_encoding.brotli.decompress(data)
+
+
+def fetch(url, encoding):
+    # Body exactly as sent over the wire (not decoded) and the request time
+    start = time.perf_counter()
+    response = requests.get(url, headers={"Accept-Encoding": encoding}, stream=True)
+    response.raise_for_status()
+    body = response.raw.read(decode_content=False)
+    elapsed = time.perf_counter() - start
+    return body, response.headers.get("Content-Encoding", "identity"), elapsed
+
+
+def cpu_time(fn, *args, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.process_time()
+        fn(*args)
+        best = min(best, time.process_time() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000/api")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    encodings = ["identity"] + content_encoding.available_encodings()
+    print(f"{'endpoint':<26} {'encoding':>8} {'served':>8} {'wire bytes':>12} {'ratio':>7} "
+          f"{'request (ms)':>13} {'compress cpu (ms)':>18} {'decompress cpu (ms)':>20}")
+
+    for endpoint in ENDPOINTS:
+        url = f"{args.url}/{endpoint}"
+        # First call warms the snapshot and the response cache
+        raw, _, _ = fetch(url, "identity")
+
+        for encoding in encodings:
+            body, served, elapsed = min(
+                (fetch(url, encoding) for _ in range(args.repeat)), key=lambda result: result[2]
+            )
+            if encoding == "identity":
+                compress_ms = decompress_ms = 0.0
+            else:
+                level = content_encoding.COMPRESSION_LEVELS[encoding]
+                compress_ms = cpu_time(content_encoding.compress, raw, encoding, level, repeat=args.repeat) * 1000
+                local = content_encoding.compress(raw, encoding, level)
+                assert decompress(local, encoding) == raw
+                decompress_ms = cpu_time(decompress, local, encoding, repeat=args.repeat) * 1000
+
+            # "served" stays identity for bodies below COMPRESSION_MIN_SIZE
+            print(f"{endpoint:<26} {encoding:>8} {served:>8} {len(body):>12,} {len(raw) / max(len(body), 1):>6.1f}x "
+                  f"{elapsed * 1000:>13.1f} {compress_ms:>18.2f} {decompress_ms:>20.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark: JSON encode time of the /api/houses full-table response.
+
+Compares FastAPI's default path (jsonable_encoder + json) with the
+application's serializer in api/responses.py (orjson when installed), for
+the records the route returns and for the same table as NumPy columns.
+
+Usage (from the repository root):
+    python benchmarks/bench_json.py
+    python benchmarks/bench_json.py --sizes 14000,1000000 --repeat 1
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "api"))
+import responses  # noqa: E402
+
+# Same columns and dtypes as the miami_housing snapshot
+FLOAT_COLUMNS = ("latitude", "longitude", "sale_prc", "rail_dist", "ocean_dist", "water_dist",
+                 "cntr_dist", "subcntr_di", "hwy_dist")
+INT_COLUMNS = ("parcelno", "lnd_sqfoot", "tot_lvg_area", "spec_feat_val", "age", "avno60plus",
+               "month_sold", "structure_quality")
+
+
+def synthetic_columns(n, seed=0):
+    rng = np.random.default_rng(seed)
+    columns = {name: np.round(rng.uniform(0, 100000, n), 1) for name in FLOAT_COLUMNS}
+    columns.update({name: rng.integers(0, 10000, n) for name in INT_COLUMNS})
+    columns["parcelno"] = np.arange(n, dtype=np.int64)
+    return columns
+
+
+def to_records(columns):
+    # Same shape as Snapshot.to_records: one dict per row
+    names = list(columns)
+    return [dict(zip(names, row)) for row in zip(*(columns[name].tolist() for name in names))]
+
+
+def fastapi_default(records):
+    return JSONResponse(jsonable_encoder(records)).body
+
+
+def timed(fn, *args, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="14000,100000", help="comma-separated row counts")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    backend = "orjson" if responses.orjson is not None else "json (orjson not installed)"
+    print(f"serializer: {backend}")
+    print(f"{'rows':>10} {'default (s)':>12} {'dumps (s)':>11} {'speedup':>8} {'columns (s)':>12} {'MB':>8}")
+    for n in (int(size) for size in args.sizes.split(",")):
+        columns = synthetic_columns(n)
+        records = to_records(columns)
+
+        # Both paths must produce the same document before timing them
+        body = responses.dumps(records)
+        assert json.loads(body) == json.loads(fastapi_default(records))
+
+        default_time = timed(fastapi_default, records, repeat=args.repeat)
+        dumps_time = timed(responses.dumps, records, repeat=args.repeat)
+        columns_time = timed(responses.dumps, columns, repeat=args.repeat)
+        print(f"{n:>10,} {default_time:>12.4f} {dumps_time:>11.4f} {default_time / dumps_time:>7.1f}x "
+              f"{columns_time:>12.4f} {len(body) / 1e6:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark: latency percentiles of the API under concurrent load.
+
+Keeps --concurrency requests in flight against each --url until --requests
+responses have arrived, cycling through a mix of endpoints, and prints
+p50/p90/p99/max latency and throughput per target (and per endpoint when
+there are several). Each request gets a distinct min_price so the response
+cache does not absorb the load.
+
+To compare two designs, run both side by side against the same upstream,
+e.g. the current tree on :8000 and an older checkout on :8001
+(git worktree add /tmp/api-old <commit>), both with AGGREGATION_BACKEND=postgres
+so every request goes to PostgREST.
+
+Usage (from the repository root, with the API(s) running):
+    python benchmarks/bench_load.py
+    python benchmarks/bench_load.py --url http://localhost:8000/api --url http://localhost:8001/api \\
+        --concurrency 200 --requests 2000
+    python benchmarks/bench_load.py --endpoint "houses?limit=2000" --concurrency 200
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+import numpy as np
+
+ENDPOINTS = (
+    "houses?limit=500",
+    "houses/price-stats?summary=1",
+    "houses/sales-time",
+    "houses/distance-impact",
+)
+
+
+async def run(url, endpoints, concurrency, total, timeout):
+    latencies, errors = {endpoint: [] for endpoint in endpoints}, 0
+    counter = iter(range(total))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+        async def worker():
+            nonlocal errors
+            for i in counter:
+                endpoint = endpoints[i % len(endpoints)]
+                separator = "&" if "?" in endpoint else "?"
+                start = time.perf_counter()
+                try:
+                    response = await client.get(f"{url}/{endpoint}{separator}min_price={50000 + i}")
+                    response.raise_for_status()
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                latencies[endpoint].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return {endpoint: np.array(values) * 1000 for endpoint, values in latencies.items()}, errors, elapsed
+
+
+def report(label, latencies, errors, elapsed):
+    if not len(latencies):
+        print(f"{label:<40} {0:>6} {errors:>6}")
+        return
+    p50, p90, p99 = np.percentile(latencies, (50, 90, 99))
+    print(f"{label:<40} {len(latencies):>6} {errors:>6} {len(latencies) / elapsed:>8.1f} "
+          f"{p50:>9.1f} {p90:>9.1f} {p99:>9.1f} {latencies.max():>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", action="append", help="API base URL (repeat to compare targets)")
+    parser.add_argument("--endpoint", action="append", help="endpoint to request (repeat for a mix)")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    endpoints = args.endpoint or ENDPOINTS
+    print(f"{'target':<40} {'ok':>6} {'errors':>6} {'req/s':>8} "
+          f"{'p50 (ms)':>9} {'p90 (ms)':>9} {'p99 (ms)':>9} {'max (ms)':>9}")
+    for url in args.url or ["http://localhost:8000/api"]:
+        latencies, errors, elapsed = asyncio.run(run(url, endpoints, args.concurrency, args.requests, args.timeout))
+        report(url, np.concatenate(list(latencies.values())), errors, elapsed)
+        if len(endpoints) > 1:
+            # Cheap requests stuck behind heavy ones show up in their own p99
+            for endpoint, values in latencies.items():
+                report(f"  {endpoint}", values, 0, elapsed)
+
+
+if __name__ == "__main__":
+    main()
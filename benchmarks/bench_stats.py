@@ -0,0 +1,79 @@
+"""
+Benchmark: statistics of /api/houses/price-stats, pure Python vs api/stats.py (NumPy).
+
+Usage (from the repository root):
+    python benchmarks/bench_stats.py
+    python benchmarks/bench_stats.py --sizes 14000,1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "api"))
+import stats  # noqa: E402
+
+
+def synthetic_columns(n, seed=0):
+    rng = np.random.default_rng(seed)
+    prices = np.round(rng.lognormal(12.6, 0.6, n), 0)
+    quality = rng.integers(1, 6, n)
+    return prices, quality
+
+
+def legacy_stats(prices, structure_quality):
+    # Same computations as the original pure-Python price_stats route
+    price_avg = sum(prices) / len(prices)
+    price_median = sorted(prices)[len(prices) // 2]
+    price_stddev = (sum((x - price_avg) ** 2 for x in prices) / len(prices)) ** 0.5
+    price_iqr = sorted(prices)[int(0.75 * len(prices))] - sorted(prices)[int(0.25 * len(prices))]
+
+    quality_price_avg = {}
+    for quality in set(structure_quality):
+        quality_prices = [p for p, q in zip(prices, structure_quality) if q == quality]
+        if quality_prices:
+            quality_price_avg[str(quality)] = sum(quality_prices) / len(quality_prices)
+    return price_avg, price_median, price_stddev, price_iqr, quality_price_avg
+
+
+def vectorized_stats(prices, structure_quality):
+    summary = stats.describe(prices)
+    p25, median, p75 = stats.quantiles(prices, (0.25, 0.5, 0.75))
+    quality_price_avg = stats.grouped_mean(prices, structure_quality)
+    return summary["mean"], median, summary["std"], p75 - p25, quality_price_avg
+
+
+def timed(fn, *args, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="14000,1000000,10000000", help="comma-separated row counts")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rows':>12} {'python (s)':>12} {'numpy (s)':>12} {'speedup':>9}")
+    for n in (int(size) for size in args.sizes.split(",")):
+        prices, quality = synthetic_columns(n)
+        prices_list, quality_list = prices.tolist(), quality.tolist()
+
+        # Both versions must agree before timing them
+        legacy = legacy_stats(prices_list, quality_list)
+        fast = vectorized_stats(prices, quality)
+        assert legacy[1] == fast[1] and legacy[3] == fast[3]
+
+        python_time = timed(legacy_stats, prices_list, quality_list, repeat=1 if n > 1_000_000 else args.repeat)
+        numpy_time = timed(vectorized_stats, prices, quality, repeat=args.repeat)
+        print(f"{n:>12,} {python_time:>12.4f} {numpy_time:>12.4f} {python_time / numpy_time:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
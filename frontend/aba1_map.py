@@ -1,75 +1,124 @@
 # frontend/pages/aba1_map.py
 
+import math
 import streamlit as st
 import pandas as pd
 import pydeck as pdk
 
+# Hexagon radius (meters) of the density map, aggregated by the API
+HEX_RADIUS_M = 200
+# Most points drawn by the scatter map; denser views are sampled by the API
+MAP_POINT_BUDGET = 5000
+# Nominal map size in pixels, used to turn center + zoom into the visible bbox
+MAP_VIEWPORT_PX = (1400, 700)
+
+def viewport_bbox(latitude, longitude, zoom, viewport=MAP_VIEWPORT_PX, margin=1.5):
+    """
+    Approximate west,south,east,north of a Web Mercator view, with a margin
+    for the tilted camera (pitch) and wider screens.
+    """
+    degrees_per_px = 360 / (256 * 2 ** zoom)
+    half_width = viewport[0] / 2 * degrees_per_px * margin
+    half_height = viewport[1] / 2 * degrees_per_px * math.cos(math.radians(latitude)) * margin
+    return (longitude - half_width, latitude - half_height, longitude + half_width, latitude + half_height)
+
 def render_mapa(get_data, params):
     st.header("📍 Interactive Map with Advanced Filters")
 
-    houses = get_data("houses", params)
-
-    if not houses:
+    # Hexagons aggregated by the API: one row per occupied cell instead of one per property
+    hexbins = get_data("houses/hexbins", {**params, "radius_m": HEX_RADIUS_M}, arrow=True)
+    if not hexbins or not len(hexbins.get("count", [])):
         st.warning("No data found for the selected filters.")
         return
 
-    df = pd.DataFrame(houses)
+    df_hex = pd.DataFrame({name: hexbins[name] for name in ("latitude", "longitude", "count", "mean_price", "mean_quality")})
+
+    # Map center: mean position of the filtered properties
+    center_lat = (df_hex["latitude"] * df_hex["count"]).sum() / df_hex["count"].sum()
+    center_lon = (df_hex["longitude"] * df_hex["count"]).sum() / df_hex["count"].sum()
+    zoom = st.slider("Map Zoom", 8, 16, 10)
+
+    # Only the columns drawn on the map, only for the properties in view
     required_cols = ["latitude", "longitude", "sale_prc", "tot_lvg_area", "structure_quality"]
-    if not all(col in df.columns for col in required_cols):
-        st.error("Insufficient data to generate the map.")
-        return
+    houses = get_data("houses", {
+        **params,
+        "fields": ",".join(required_cols),
+        "bbox": ",".join(f"{v:.5f}" for v in viewport_bbox(center_lat, center_lon, zoom)),
+        "zoom": zoom,
+        "max_points": MAP_POINT_BUDGET,
+        "limit": 10000,
+    }, paginate=True, arrow=True)
 
     # ------- Map 1: Scatterplot by Structure Quality --------
     st.subheader("🔴 Property Distribution by Structure Quality")
 
-    df["color"] = df["structure_quality"].apply(lambda q: [255, int(255 - q * 28), 0, 160])  # orange/red gradient
+    df = pd.DataFrame(houses)
+    if len(df) == 0:
+        st.warning("No properties in view for the selected filters.")
+    elif not all(col in df.columns for col in required_cols):
+        st.error("Insufficient data to generate the map.")
+    else:
+        total = houses.attrs.get("total_count", len(df)) if isinstance(houses, pd.DataFrame) else len(df)
+        if total > len(df):
+            st.caption(f"Showing a spatial sample of {len(df):,} of the {total:,} properties in view.")
 
-    st.pydeck_chart(pdk.Deck(
-        map_style='mapbox://styles/mapbox/light-v9',
-        initial_view_state=pdk.ViewState(
-            latitude=df["latitude"].mean(),
-            longitude=df["longitude"].mean(),
-            zoom=10,
-            pitch=50,
-        ),
-        layers=[
-            pdk.Layer(
-                "ScatterplotLayer",
-                data=df,
-                get_position="[longitude, latitude]",
-                get_color="color",
-                get_radius=100,
-                pickable=True,
-                auto_highlight=True,
-            )
-        ],
-        tooltip={
-            "text": "🏡 Price: ${sale_prc}\n📐 Area: {tot_lvg_area} sq ft\n🏗️ Quality: {structure_quality}"
-        }
-    ))
+        df["color"] = df["structure_quality"].apply(lambda q: [255, int(255 - q * 28), 0, 160])  # orange/red gradient
+
+        st.pydeck_chart(pdk.Deck(
+            map_style='mapbox://styles/mapbox/light-v9',
+            initial_view_state=pdk.ViewState(
+                latitude=center_lat,
+                longitude=center_lon,
+                zoom=zoom,
+                pitch=50,
+            ),
+            layers=[
+                pdk.Layer(
+                    "ScatterplotLayer",
+                    data=df,
+                    get_position="[longitude, latitude]",
+                    get_color="color",
+                    get_radius=100,
+                    pickable=True,
+                    auto_highlight=True,
+                )
+            ],
+            tooltip={
+                "text": "🏡 Price: ${sale_prc}\n📐 Area: {tot_lvg_area} sq ft\n🏗️ Quality: {structure_quality}"
+            }
+        ))
 
     # ------- Map 2: Hexbin of Property Density --------
     st.subheader("🟣 Property Density by Region (Hexagons)")
 
+    # Color from light to dark purple by mean price of the cell
+    price_rank = df_hex["mean_price"].rank(pct=True).fillna(0)
+    df_hex["color"] = [[int(220 - 140 * p), int(200 - 170 * p), 255, 200] for p in price_rank]
+    df_hex["price_label"] = df_hex["mean_price"].map(lambda v: f"{v:,.0f}" if pd.notna(v) else "N/A")
+    df_hex["quality_label"] = df_hex["mean_quality"].map(lambda v: f"{v:.1f}" if pd.notna(v) else "N/A")
+
     st.pydeck_chart(pdk.Deck(
         map_style='mapbox://styles/mapbox/light-v9',
         initial_view_state=pdk.ViewState(
-            latitude=df["latitude"].mean(),
-            longitude=df["longitude"].mean(),
+            latitude=center_lat,
+            longitude=center_lon,
             zoom=10,
             pitch=50,
         ),
         layers=[
             pdk.Layer(
-                "HexagonLayer",
-                data=df,
+                "ColumnLayer",
+                data=df_hex,
                 get_position='[longitude, latitude]',
-                radius=200,
+                get_elevation="count",
+                get_fill_color="color",
+                radius=HEX_RADIUS_M,
+                disk_resolution=6,
+                angle=90,  # pointy-top hexagons, matching the server grid
                 elevation_scale=4,
-                elevation_range=[0, 1000],
                 pickable=True,
                 extruded=True,
             )
         ],
-        tooltip={"text": "📍 Total properties in area: {elevationValue}"}
+        tooltip={"text": "📍 Total properties in area: {count}\n💲 Mean price: ${price_label}\n🏗️ Mean quality: {quality_label}"}
     ))
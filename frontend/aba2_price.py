@@ -1,11 +1,22 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
 
-def render_preco(get_data):
+# Histogram bins computed by the API
+HISTOGRAM_BINS = 30
+# Most points in the area-vs-price scatter; larger selections are sampled by the API
+SCATTER_POINT_BUDGET = 5000
+# Default number of geographic price clusters (k-means in the API)
+PRICE_CLUSTERS = 5
+
+def render_preco(get_data, params):
     st.header("💰 Price Analysis by Area")
 
-    price_stats = get_data("houses/price-stats")
+    # Summary mode: histogram and box statistics come precomputed from the API
+    price_stats = get_data("houses/price-stats", {
+        **params, "summary": 1, "bins": HISTOGRAM_BINS, "max_points": SCATTER_POINT_BUDGET
+    }, arrow=True)
     if price_stats:
         # ---------------- KPIs ----------------
         st.subheader("📊 Price Indicators")
@@ -17,12 +28,19 @@ def render_preco(get_data):
 
         # ---------------- Histogram ----------------
         st.subheader("📈 Price Distribution")
-        prices = price_stats.get("price_distribution", [])
-        if prices:
-            df_prices = pd.DataFrame(prices, columns=["Price"])
-            fig_hist = px.histogram(df_prices, x="Price", nbins=30,
-                                    title="Price Distribution",
-                                    labels={'Price': 'Price ($)', 'y': 'Count'})
+        histogram = price_stats.get("price_histogram", {})
+        edges, counts = histogram.get("edges", []), histogram.get("counts", [])
+        if len(counts):
+            # One bar per bin, centered between its edges and as wide as the bin
+            centers = [(lo + hi) / 2 for lo, hi in zip(edges[:-1], edges[1:])]
+            widths = [hi - lo for lo, hi in zip(edges[:-1], edges[1:])]
+            fig_hist = go.Figure(go.Bar(
+                x=centers, y=counts, width=widths,
+                customdata=list(zip(edges[:-1], edges[1:])),
+                hovertemplate="$%{customdata[0]:,.0f} – $%{customdata[1]:,.0f}<br>Count: %{y}<extra></extra>"
+            ))
+            fig_hist.update_layout(title="Price Distribution", xaxis_title="Price ($)", yaxis_title="Count",
+                                   bargap=0)
             fig_hist.update_layout(
                 plot_bgcolor='rgba(0,0,0,0)',
                 paper_bgcolor='rgba(0,0,0,0)',
@@ -34,8 +52,20 @@ def render_preco(get_data):
 
             # ---------------- Boxplot ----------------
             st.subheader("📦 Price Boxplot")
-            fig_box = px.box(df_prices, y="Price", title="Price Boxplot",
-                             labels={'Price': 'Price ($)'})
+            box = price_stats.get("price_box", {})
+            fig_box = go.Figure(go.Box(
+                name="Price", q1=[box["q1"]], median=[box["median"]], q3=[box["q3"]],
+                lowerfence=[box["lower_whisker"]], upperfence=[box["upper_whisker"]],
+                boxpoints=False
+            ))
+            outliers = box.get("outliers", [])
+            if len(outliers):
+                # Sampled outliers drawn as points on top of the precomputed box
+                fig_box.add_trace(go.Scatter(
+                    x=["Price"] * len(outliers), y=outliers, mode="markers", showlegend=False,
+                    name=f"Outliers ({len(outliers)} of {box['outlier_count']})"
+                ))
+            fig_box.update_layout(title="Price Boxplot", yaxis_title="Price ($)", showlegend=False)
             fig_box.update_layout(
                 plot_bgcolor='rgba(0,0,0,0)',
                 paper_bgcolor='rgba(0,0,0,0)',
@@ -64,14 +94,18 @@ def render_preco(get_data):
 
         # ---------------- Area vs Price Scatter ----------------
         st.subheader("📐 Area vs. Price Relationship")
-        living_area = price_stats.get("living_area_distribution", [])
-        if prices and living_area and len(prices) == len(living_area):
+        # Summary mode has no per-row price list: price_cluster carries the area/price points
+        price_cluster = pd.DataFrame(price_stats.get("price_cluster", []))
+        if len(price_cluster) and "tot_lvg_area" in price_cluster:
             df_area_price = pd.DataFrame({
-                "Living Area (sq ft)": living_area,
-                "Price ($)": prices
+                "Living Area (sq ft)": price_cluster["tot_lvg_area"],
+                "Price ($)": price_cluster["sale_prc"]
             })
+            title = "Correlation Between Area and Price"
+            if price_stats.get("sampled"):
+                title += f" (sample of {len(df_area_price):,} of {price_stats['population_size']:,})"
             fig_scatter = px.scatter(df_area_price, x="Living Area (sq ft)", y="Price ($)",
-                                     title="Correlation Between Area and Price",
+                                     title=title,
                                      labels={"Living Area (sq ft)": "Living Area (sq ft)", "Price ($)": "Price ($)"})
             fig_scatter.update_layout(
                 plot_bgcolor='rgba(0,0,0,0)',
@@ -84,28 +118,49 @@ def render_preco(get_data):
 
         # ---------------- Price Cluster by Location ----------------
         st.subheader("📍 Price Range Clustering by Location")
+        n_clusters = st.slider("Number of Clusters", 2, 10, PRICE_CLUSTERS)
 
-        price_cluster = price_stats.get("price_cluster", [])
-        if price_cluster:
-            df_cluster = pd.DataFrame(price_cluster)
+        # Clusters fitted by the API on location and log price; one int8 label per property,
+        # plus the per-property coordinates and prices (points=1) the map draws
+        clusters = get_data("houses/price-clusters", {**params, "k": n_clusters, "points": 1}, arrow=True)
+        labels = clusters.get("labels") if clusters else None
 
-            color_map = {
-                "Low": "#3B82F6",     # Blue
-                "Medium": "#F59E0B",  # Orange
-                "High": "#EF4444"     # Red
-            }
+        if labels is not None and len(labels) and clusters["k"]:
+            centroids = clusters["centroids"]
+            # Clusters come ordered by price, cheapest first
+            names = [f"Cluster {i + 1} (~${price:,.0f})" for i, price in enumerate(centroids["sale_prc"])]
+            valid = labels >= 0
+            df_cluster = pd.DataFrame({
+                "latitude": clusters["latitude"][valid],
+                "longitude": clusters["longitude"][valid],
+                "sale_prc": clusters["sale_prc"][valid],
+                "Price Cluster": [names[label] for label in labels[valid]],
+            })
 
             fig_cluster = px.scatter_mapbox(
                 df_cluster,
                 lat="latitude",
                 lon="longitude",
-                color="Price Range",  # This key must match the API
-                color_discrete_map=color_map,
+                color="Price Cluster",
+                category_orders={"Price Cluster": names},
+                color_discrete_sequence=px.colors.sample_colorscale(
+                    "Bluered", [i / max(len(names) - 1, 1) for i in range(len(names))]
+                ),
                 zoom=9,
                 height=550,
                 mapbox_style="carto-positron",
                 hover_data={"sale_prc": True, "latitude": False, "longitude": False}
             )
+            # Cluster centers, sized by the number of properties
+            fig_cluster.add_trace(go.Scattermapbox(
+                lat=centroids["latitude"],
+                lon=centroids["longitude"],
+                mode="markers",
+                marker=dict(size=[8 + 22 * size / max(centroids["size"]) for size in centroids["size"]], color="black"),
+                text=[f"{name}: {size:,} properties" for name, size in zip(names, centroids["size"])],
+                hoverinfo="text",
+                name="Cluster centers",
+            ))
 
             fig_cluster.update_layout(
                 margin={"r": 0, "t": 0, "l": 0, "b": 0},
@@ -2,21 +2,42 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 
-def render_distancias(get_data):
+# Columns offered for the binned price-vs-distance curves, with their axis labels
+DISTANCE_LABELS = {
+    "ocean_dist": "Distance to Ocean (m)",
+    "hwy_dist": "Distance to Highway (m)",
+    "rail_dist": "Distance to Rail (m)",
+    "water_dist": "Distance to Water (m)",
+    "cntr_dist": "Distance to Downtown (m)",
+    "subcntr_di": "Distance to Subcenter (m)",
+    "spec_feat_val": "Special Features Value ($)",
+}
+# Equal-width buckets per curve
+DISTANCE_BUCKETS = 20
+# Most prices per box plot category; larger categories are sampled by the API
+BOX_POINT_BUDGET = 5000
+
+def format_price(value):
+    # Averages are None when the selected filters leave a category empty
+    return f"${value:,.2f}" if value is not None else "N/A"
+
+def render_distancias(get_data, params):
     st.header("🚗 Impact of Distance on Price")
 
-    distance_stats = get_data("houses/distance-impact")
+    distance_stats = get_data("houses/distance-impact", {
+        **params, "columns": ",".join(DISTANCE_LABELS), "buckets": DISTANCE_BUCKETS, "max_points": BOX_POINT_BUDGET
+    })
     if distance_stats:
         # ---------------- KPIs ----------------
         st.subheader("📊 Price Indicators by Distance")
         col1, col2, col3 = st.columns(3)
-        col1.metric("Avg. Price Near Ocean", f"${distance_stats['avg_price_near_ocean']:,.2f}")
-        col2.metric("Avg. Price Far from Ocean", f"${distance_stats['avg_price_far_from_ocean']:,.2f}")
+        col1.metric("Avg. Price Near Ocean", format_price(distance_stats['avg_price_near_ocean']))
+        col2.metric("Avg. Price Far from Ocean", format_price(distance_stats['avg_price_far_from_ocean']))
         col3.metric("Properties Near Ocean", f"{distance_stats['count_near_ocean']}")
 
         col4, col5, col6 = st.columns(3)
-        col4.metric("Avg. Price Near Highway", f"${distance_stats['avg_price_near_highway']:,.2f}")
-        col5.metric("Avg. Price Far from Highway", f"${distance_stats['avg_price_far_from_highway']:,.2f}")
+        col4.metric("Avg. Price Near Highway", format_price(distance_stats['avg_price_near_highway']))
+        col5.metric("Avg. Price Far from Highway", format_price(distance_stats['avg_price_far_from_highway']))
         col6.metric("Properties Near Highway", f"{distance_stats['count_near_highway']}")
 
         col7, col8, col9 = st.columns(3)
@@ -62,7 +83,10 @@ def render_distancias(get_data):
                 distance_stats['prices_airport_noise'] + distance_stats['prices_no_airport_noise']
             )
         })
-        fig_box = px.box(df_boxplot, x="Category", y="Price", title="Price Boxplot by Category")
+        title = "Price Boxplot by Category"
+        if distance_stats.get("sampled"):
+            title += f" (up to {BOX_POINT_BUDGET:,} sampled prices per category, {distance_stats['population_size']:,} properties)"
+        fig_box = px.box(df_boxplot, x="Category", y="Price", title=title)
         fig_box.update_layout(
             plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)',
             font=dict(color="#31333F"), title_font=dict(size=18, color="#31333F"),
@@ -70,40 +94,31 @@ def render_distancias(get_data):
         )
         st.plotly_chart(fig_box, use_container_width=True)
 
-        # ---------------- Scatter: Ocean Distance ----------------
-        st.subheader("🌊 Scatter: Distance to Ocean vs Price")
-        if distance_stats.get("dist_ocean") and distance_stats.get("dist_ocean_price"):
-            df_scatter_ocean = pd.DataFrame({
-                "Distance to Ocean (m)": distance_stats["dist_ocean"],
-                "Price ($)": distance_stats["dist_ocean_price"]
-            })
-            fig_ocean = px.scatter(
-                df_scatter_ocean, x="Distance to Ocean (m)", y="Price ($)",
-                title="Distance to Ocean vs Price"
-            )
-            fig_ocean.update_layout(
-                plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)',
-                font=dict(color="#31333F"), title_font=dict(size=18, color="#31333F"),
-                hoverlabel=dict(bgcolor="#F0F2F6", font_size=12)
-            )
-            st.plotly_chart(fig_ocean, use_container_width=True)
-
-        # ---------------- Scatter: Highway Distance ----------------
-        st.subheader("🛣️ Scatter: Distance to Highway vs Price")
-        if distance_stats.get("dist_hwy") and distance_stats.get("dist_hwy_price"):
-            df_scatter_hwy = pd.DataFrame({
-                "Distance to Highway (m)": distance_stats["dist_hwy"],
-                "Price ($)": distance_stats["dist_hwy_price"]
+        # ---------------- Binned Curve: Price vs Distance ----------------
+        st.subheader("📈 Price vs. Distance")
+        curves = distance_stats.get("distance_curves", {})
+        column = st.selectbox("Distance", options=list(curves), format_func=DISTANCE_LABELS.get)
+        curve = curves.get(column)
+        if curve and curve["count"]:
+            edges = curve["edges"]
+            label = DISTANCE_LABELS[column]
+            df_curve = pd.DataFrame({
+                label: [(lo + hi) / 2 for lo, hi in zip(edges, edges[1:])],
+                "Mean Price ($)": curve["mean"],
+                "Median Price ($)": curve["median"],
+                "Properties": curve["count"],
             })
-            fig_hwy = px.scatter(
-                df_scatter_hwy, x="Distance to Highway (m)", y="Price ($)",
-                title="Distance to Highway vs Price"
+            fig_curve = px.line(
+                df_curve, x=label, y=["Mean Price ($)", "Median Price ($)"], markers=True,
+                hover_data={"Properties": True}, title=f"Price by {label} (bucket midpoints)"
             )
-            fig_hwy.update_layout(
+            fig_curve.update_layout(
                 plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)',
                 font=dict(color="#31333F"), title_font=dict(size=18, color="#31333F"),
-                hoverlabel=dict(bgcolor="#F0F2F6", font_size=12)
+                hoverlabel=dict(bgcolor="#F0F2F6", font_size=12), yaxis_title="Price ($)", legend_title=""
             )
-            st.plotly_chart(fig_hwy, use_container_width=True)
+            st.plotly_chart(fig_curve, use_container_width=True)
+        else:
+            st.warning("No properties for the selected filters.")
     else:
         st.warning("Distance impact data not found.")
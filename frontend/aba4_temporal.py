@@ -2,12 +2,13 @@ import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
 
-def render_temporal(get_data):
+def render_temporal(get_data, params):
     st.header("📅 Sales Time Analysis")
 
-    stats = get_data("houses/sales-time")
+    stats = get_data("houses/sales-time", params)
 
-    if stats:
+    # Month-over-month KPIs need at least two months of sales
+    if len(stats) >= 2:
         df = pd.DataFrame(stats)
         df = df.sort_values("month")
         df["average_price"] = df["average_price"].astype(float)
@@ -1,6 +1,11 @@
 import streamlit as st
 import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
 import requests
+import json
+from requests.adapters import HTTPAdapter
+from urllib3.util import make_headers
 from aba1_map import render_mapa
 from aba2_price import render_preco
 from aba3_distance import render_distancias
@@ -98,15 +103,124 @@ footer {
 
 # ------------------- FUNCTION TO FETCH DATA VIA API -------------------
 API_URL = "http://localhost:8000/api"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+# Compressed encodings this client can decode (br/zstd only when their decoders are installed)
+ACCEPT_ENCODING = make_headers(accept_encoding=True)["accept-encoding"]
 
-def get_data(endpoint, params=None):
+def read_arrow(contents):
+    """
+    Decodes Arrow IPC stream bodies (one per page) without going through JSON.
+    Plain tables become a DataFrame; statistics payloads become a dict whose
+    arrays are NumPy arrays and whose record lists are DataFrames.
+    """
+    table = pa.concat_tables([ipc.open_stream(content).read_all() for content in contents])
+    metadata = table.schema.metadata or {}
+    if b"payload" not in metadata:
+        return table.to_pandas()
+
+    layout = json.loads(metadata[b"payload"])
+    data = dict(layout["scalars"])
+    for name in layout["arrays"]:
+        data[name] = table.column(name).to_numpy()
+    for name, columns in layout["frames"].items():
+        frame = table.select([f"{name}.{column}" for column in columns]).to_pandas()
+        frame.columns = columns
+        data[name] = frame
+    return data
+
+# Keep-alive connections kept open to the API (shared by reruns and sessions)
+API_POOL_SIZE = 10
+# Seconds to open a connection / to wait for the response
+API_TIMEOUT = (3.05, 120)
+
+@st.cache_resource
+def api_session():
+    """
+    One requests.Session for every call: TCP connections to the API are
+    reused instead of opened per request.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=API_POOL_SIZE)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def pool_stats():
+    """
+    Connections opened vs. requests sent through the API session.
+    """
+    pools = api_session().get_adapter(API_URL).poolmanager.pools
+    connections = requests_sent = 0
+    for key in pools.keys():
+        pool = pools[key]
+        connections += pool.num_connections
+        requests_sent += pool.num_requests
+    return {"connections_opened": connections, "requests": requests_sent}
+
+# Bodies kept for revalidation (oldest dropped first above this many)
+MAX_CACHED_RESPONSES = 64
+
+@st.cache_resource
+def response_store():
+    """
+    Last response and ETag for each request, shared across reruns and sessions.
+    """
+    return {}
+
+def fetch(endpoint, params=None, headers=None):
+    """
+    GET that revalidates with If-None-Match: when the API answers
+    304 Not Modified, the previously downloaded response is reused.
+    """
+    key = (endpoint, tuple(sorted((params or {}).items())), tuple(sorted((headers or {}).items())))
+    store = response_store()
+    cached = store.get(key)
+
+    request_headers = {"Accept-Encoding": ACCEPT_ENCODING, **(headers or {})}
+    if cached is not None:
+        request_headers["If-None-Match"] = cached[0]
+
+    response = api_session().get(f"{API_URL}/{endpoint}", params=params, headers=request_headers, timeout=API_TIMEOUT)
+    if response.status_code == 304 and cached is not None:
+        return cached[1]
+    response.raise_for_status()
+
+    etag = response.headers.get("ETag")
+    if etag:
+        store.pop(key, None)
+        store[key] = (etag, response)
+        while len(store) > MAX_CACHED_RESPONSES:
+            store.pop(next(iter(store)), None)
+    return response
+
+def get_data(endpoint, params=None, paginate=False, arrow=False):
     """
     Generic function to make backend API calls.
+    With paginate=True, follows the X-Next-Cursor header and joins every page.
+    With arrow=True, asks for Arrow IPC and loads the columns straight into pandas/NumPy.
+    Every page is revalidated with its ETag, so unchanged data is not downloaded again.
     """
+    headers = {"Accept": ARROW_MEDIA_TYPE} if arrow else None
     try:
-        response = requests.get(f"{API_URL}/{endpoint}", params=params)
-        response.raise_for_status()
-        return response.json()
+        response = fetch(endpoint, params, headers)
+        pages = [response]
+
+        while paginate and response.headers.get("X-Next-Cursor"):
+            page_params = {**(params or {}), "after": response.headers["X-Next-Cursor"]}
+            response = fetch(endpoint, page_params, headers)
+            pages.append(response)
+
+        if arrow:
+            data = read_arrow([page.content for page in pages])
+            if isinstance(data, pd.DataFrame) and "X-Total-Count" in pages[0].headers:
+                # Rows matching the query before server-side sampling
+                data.attrs["total_count"] = int(pages[0].headers["X-Total-Count"])
+            return data
+
+        data = pages[0].json()
+        for page in pages[1:]:
+            data.extend(page.json())
+        return data
     except requests.RequestException as e:
         st.error(f"Error fetching data: {e}")
         return {}
@@ -135,6 +249,8 @@ age_max = filters_range.get("age_max", 100)
 area_min = filters_range.get("area_min", 0)
 area_max = filters_range.get("area_max", 10000)
 qualities = filters_range.get("qualities", list(range(1, 10)))
+ocean_dist_max = filters_range.get("ocean_dist_max", 30000)
+hwy_dist_max = filters_range.get("hwy_dist_max", 10000)
 
 # ------------------- SIDEBAR: INTERACTIVE FILTERS -------------------
 st.sidebar.markdown("## Common Filters")
@@ -156,8 +272,8 @@ structure_quality = st.sidebar.selectbox("Structure Quality", quality_options)
 
 # Additional filters
 with st.sidebar.expander("🌊 Distance and Noise", expanded=False):
-    max_ocean_dist = st.slider("Distance to Ocean (m)", 0, 30000, 30000)
-    max_hwy_dist = st.slider("Distance to Highway (m)", 0, 10000, 10000)
+    max_ocean_dist = st.slider("Distance to Ocean (m)", 0, ocean_dist_max, ocean_dist_max)
+    max_hwy_dist = st.slider("Distance to Highway (m)", 0, hwy_dist_max, hwy_dist_max)
     airport_noise = st.selectbox("Airport Noise", ["Any", "Yes", "No"])
 
 # ------------------- PARAMETER DICTIONARY -------------------
@@ -167,11 +283,13 @@ params = {
     "max_age": max_age,
     "min_area": min_area,
     "max_area": max_area,
-    "max_ocean_dist": max_ocean_dist,
-    "max_hwy_dist": max_hwy_dist,
 }
 
-# Optional filters
+# Optional filters (distance sliders at their maximum do not filter anything)
+if max_ocean_dist < ocean_dist_max:
+    params["max_ocean_dist"] = max_ocean_dist
+if max_hwy_dist < hwy_dist_max:
+    params["max_hwy_dist"] = max_hwy_dist
 if structure_quality != "Any":
     params["structure_quality"] = int(structure_quality)
 if airport_noise == "Yes":
@@ -183,11 +301,17 @@ elif airport_noise == "No":
 if selected_tab == "Interactive Map":
     render_mapa(get_data, params)
 elif selected_tab == "Price Analysis":
-    render_preco(get_data)
+    render_preco(get_data, params)
 elif selected_tab == "Impact of Distances":
-    render_distancias(get_data)
+    render_distancias(get_data, params)
 elif selected_tab == "Sales Time Analysis":
-    render_temporal(get_data)
+    render_temporal(get_data, params)
+
+# ------------------- SIDEBAR: CONNECTION STATS -------------------
+with st.sidebar.expander("🔌 API Connections", expanded=False):
+    stats = pool_stats()
+    st.caption(f"{stats['requests']:,} requests over {stats['connections_opened']:,} connection(s) "
+               f"(pool size {API_POOL_SIZE})")
 
 # ------------------- FOOTER -------------------
 st.markdown("""
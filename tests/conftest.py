@@ -0,0 +1,217 @@
+"""
+Shared fixtures: a PostgREST stand-in served over HTTP on localhost and,
+when PARITY_DATABASE_URL points at a Postgres, the same table loaded there.
+
+The API modules build their Supabase client at import time, so the stand-in's
+address goes into the environment before any of them is imported.
+"""
+import json
+import os
+import random
+import socket
+import threading
+import time
+
+import pytest
+import uvicorn
+from fastapi import FastAPI, Request, Response
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+PORT = free_port()
+os.environ["SUPABASE_URL"] = f"http://127.0.0.1:{PORT}"
+os.environ["SUPABASE_KEY"] = "test.test.test"
+# Each test drives the client from its own asyncio.run loop: no connection outlives it
+os.environ["UPSTREAM_MAX_KEEPALIVE"] = "0"
+
+# PostgREST answers at most this many rows per request (db-max-rows)
+MAX_ROWS = 1000
+ROW_COUNT = 2500
+
+# Scratch schema for the parity tests and the SQL functions they exercise
+SCHEMA = "parity_test"
+AGGREGATIONS_SQL = os.path.join(os.path.dirname(__file__), "..", "api", "sql", "aggregations.sql")
+
+OPERATORS = {
+    "eq": lambda a, b: a == b,
+    "gt": lambda a, b: a > b,
+    "gte": lambda a, b: a >= b,
+    "lt": lambda a, b: a < b,
+    "lte": lambda a, b: a <= b,
+}
+
+
+def make_rows(count, seed=0):
+    rng = random.Random(seed)
+    rows = [
+        {
+            "latitude": round(rng.uniform(25.4, 26.0), 6),
+            "longitude": round(rng.uniform(-80.5, -80.1), 6),
+            "parcelno": 1000000 + 7 * i,
+            "sale_prc": float(rng.randrange(50000, 2000000, 500)),
+            "lnd_sqfoot": rng.randrange(1000, 50000),
+            "tot_lvg_area": rng.randrange(500, 6000),
+            "spec_feat_val": rng.randrange(0, 100000),
+            "rail_dist": round(rng.uniform(0, 30000), 1),
+            "ocean_dist": round(rng.uniform(0, 80000), 1),
+            "water_dist": round(rng.uniform(0, 50000), 1),
+            "cntr_dist": round(rng.uniform(0, 150000), 1),
+            "subcntr_di": round(rng.uniform(0, 100000), 1),
+            "hwy_dist": round(rng.uniform(0, 50000), 1),
+            "age": rng.randrange(0, 97),
+            "avno60plus": int(rng.random() < 0.1),
+            "month_sold": rng.randint(1, 12),
+            "structure_quality": rng.randint(1, 5),
+        }
+        for i in range(count)
+    ]
+    # A few sales without a price: the statistics must skip nulls like Postgres does
+    for row in rows[::97]:
+        row["sale_prc"] = None
+    # Physical order unrelated to the key, as after updates and vacuums
+    rng.shuffle(rows)
+    return rows
+
+
+def make_app(rows):
+    """
+    Serves GET/HEAD /rest/v1/<table> with select, eq/gt/gte/lt/lte filters,
+    order, offset/limit, the db-max-rows cap and Content-Range (count=exact).
+    Like Postgres with synchronized scans, a query without "order" starts
+    reading the table at an arbitrary row, so unordered pages are not stable.
+    POST /rest/v1/rpc/<fn> runs the function on app.state.database, if set.
+    """
+    app = FastAPI()
+    app.state.queries = []
+    app.state.database = None
+    scan = random.Random(1)
+
+    @app.api_route("/rest/v1/{table}", methods=["GET", "HEAD"])
+    def table(table: str, request: Request):
+        params = request.query_params
+        app.state.queries.append(params)
+        result = rows
+        for column, value in params.multi_items():
+            if column in ("select", "order", "offset", "limit"):
+                continue
+            op, operand = value.split(".", 1)
+            # Comparisons with null are never true in SQL
+            result = [
+                row for row in result
+                if row[column] is not None and OPERATORS[op](row[column], float(operand))
+            ]
+
+        if "order" in params:
+            column, _, direction = params["order"].partition(".")
+            result = sorted(result, key=lambda row: row[column], reverse=direction.startswith("desc"))
+        elif result:
+            start = scan.randrange(len(result))
+            result = result[start:] + result[:start]
+
+        total = len(result)
+        offset = int(params.get("offset", 0))
+        limit = min(int(params.get("limit", MAX_ROWS)), MAX_ROWS)
+        result = result[offset:offset + limit]
+
+        select = params.get("select", "*")
+        if select != "*":
+            columns = select.split(",")
+            result = [{column: row[column] for column in columns} for row in result]
+
+        counted = total if "count=exact" in request.headers.get("prefer", "") else "*"
+        span = f"{offset}-{offset + len(result) - 1}" if result else "*"
+        headers = {"Content-Range": f"{span}/{counted}"}
+        if request.method == "HEAD":
+            return Response(headers=headers)
+        return Response(json.dumps(result), media_type="application/json", headers=headers)
+
+    @app.post("/rest/v1/rpc/{function}")
+    async def rpc(function: str, request: Request):
+        if app.state.database is None:
+            return Response(status_code=404)
+        params = await request.json()
+        arguments = ", ".join(f"{name} => %({name})s" for name in params)
+        with app.state.database.cursor() as cursor:
+            cursor.execute(f"select {function}({arguments})", params)
+            result = cursor.fetchone()[0]
+        return Response(json.dumps(result), media_type="application/json")
+
+    return app
+
+
+@pytest.fixture(scope="session")
+def postgrest():
+    """
+    Runs the stand-in in a background thread for the whole session and
+    yields the app (app.state.rows, app.state.queries).
+    """
+    rows = make_rows(ROW_COUNT)
+    app = make_app(rows)
+    app.state.rows = rows
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=PORT, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if time.monotonic() > deadline:
+            raise RuntimeError("PostgREST stand-in did not start")
+        time.sleep(0.05)
+    yield app
+    server.should_exit = True
+    thread.join()
+
+
+@pytest.fixture(scope="session")
+def database(postgrest):
+    """
+    Loads the stand-in's rows and api/sql/aggregations.sql into a scratch
+    schema of the Postgres at PARITY_DATABASE_URL, and routes the stand-in's
+    RPC calls there. Skips when no database is configured.
+    """
+    url = os.getenv("PARITY_DATABASE_URL")
+    if not url:
+        pytest.skip("PARITY_DATABASE_URL not set")
+    psycopg2 = pytest.importorskip("psycopg2")
+
+    connection = psycopg2.connect(url)
+    connection.autocommit = True
+    rows = postgrest.state.rows
+    columns = list(rows[0])
+    types = {
+        column: "float8" if any(isinstance(row[column], float) for row in rows) else "bigint"
+        for column in columns
+    }
+    with connection.cursor() as cursor:
+        cursor.execute(f"drop schema if exists {SCHEMA} cascade; create schema {SCHEMA}; set search_path to {SCHEMA}")
+        cursor.execute(f"create table miami_housing ({', '.join(f'{c} {types[c]}' for c in columns)})")
+        cursor.executemany(
+            f"insert into miami_housing values ({', '.join(['%s'] * len(columns))})",
+            [tuple(row[c] for c in columns) for row in rows],
+        )
+        with open(AGGREGATIONS_SQL) as sql:
+            cursor.execute(sql.read())
+
+    postgrest.state.database = connection
+    yield connection
+    postgrest.state.database = None
+    with connection.cursor() as cursor:
+        cursor.execute(f"drop schema {SCHEMA} cascade")
+    connection.close()
+
+
+@pytest.fixture(scope="session")
+def client(postgrest):
+    """
+    The API under test, reading from the stand-in (snapshot loaded at startup).
+    """
+    from fastapi.testclient import TestClient
+
+    import main
+
+    with TestClient(main.app) as client:
+        yield client
@@ -0,0 +1,150 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import cache
+from cache import ResponseCache, ResponseCacheMiddleware
+from responses import ARROW_MEDIA_TYPE
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class Route:
+    """ASGI app counting its calls; the body tells the calls apart."""
+
+    def __init__(self):
+        self.calls = 0
+        self.during = None
+
+    async def __call__(self, scope, receive, send):
+        self.calls += 1
+        if self.during is not None:
+            self.during()
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": b'{"call": %d}' % self.calls})
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def setup(clock):
+    route, state = Route(), {"generation": 1}
+    response_cache = ResponseCache()
+    app = ResponseCacheMiddleware(route, cache=response_cache, ttls={"/api/houses": 30},
+                                  version=lambda: state["generation"])
+    return TestClient(app), route, state, response_cache
+
+
+def test_miss_then_hit(setup):
+    client, route, _, response_cache = setup
+
+    first = client.get("/api/houses?limit=5")
+    second = client.get("/api/houses?limit=5")
+
+    assert first.headers["x-cache"] == "MISS"
+    assert second.headers["x-cache"] == "HIT"
+    assert second.content == first.content
+    assert second.headers["content-type"] == "application/json"
+    assert route.calls == 1
+    assert response_cache.stats()["endpoints"]["/api/houses"] == {"hits": 1, "misses": 1}
+
+
+def test_key_includes_sorted_params_and_format(setup):
+    client, route, _, _ = setup
+
+    client.get("/api/houses?limit=5&offset=0")
+    # Same parameters in another order share the entry
+    assert client.get("/api/houses?offset=0&limit=5").headers["x-cache"] == "HIT"
+    assert client.get("/api/houses?limit=6&offset=0").headers["x-cache"] == "MISS"
+    assert client.get("/api/houses?limit=5&offset=0", headers={"Accept": ARROW_MEDIA_TYPE}).headers["x-cache"] == "MISS"
+    assert route.calls == 3
+
+
+def test_uncached_requests_pass_through(setup):
+    client, route, _, response_cache = setup
+
+    for _ in range(2):
+        assert "x-cache" not in client.get("/api/houses?stream=true").headers
+        assert "x-cache" not in client.get("/api/other").headers
+        assert "x-cache" not in client.get("/api/houses", headers={"Accept": "application/x-ndjson"}).headers
+    assert route.calls == 6
+    assert response_cache.stats()["entries"] == 0
+
+
+def test_entry_expires_after_ttl(setup, clock):
+    client, route, _, _ = setup
+
+    client.get("/api/houses")
+    clock.now += 29.9
+    assert client.get("/api/houses").headers["x-cache"] == "HIT"
+    clock.now += 0.2
+    expired = client.get("/api/houses")
+
+    assert expired.headers["x-cache"] == "MISS"
+    assert expired.json() == {"call": 2}
+    assert client.get("/api/houses").headers["x-cache"] == "HIT"
+    assert route.calls == 2
+
+
+def test_generation_bump_invalidates(setup):
+    client, route, state, _ = setup
+
+    client.get("/api/houses")
+    state["generation"] = 2
+    after = client.get("/api/houses")
+
+    assert after.headers["x-cache"] == "MISS"
+    assert after.json() == {"call": 2}
+    assert client.get("/api/houses").headers["x-cache"] == "HIT"
+    # Going back to the old generation finds its own entry, not the new one
+    state["generation"] = 1
+    assert client.get("/api/houses").json() == {"call": 1}
+
+
+def test_swap_during_route_keeps_start_generation(setup):
+    client, route, state, _ = setup
+    # The snapshot changes while the route is building the response from the old one
+    route.during = lambda: state.update(generation=2)
+
+    client.get("/api/houses")
+    route.during = None
+
+    assert client.get("/api/houses").headers["x-cache"] == "MISS"
+    assert client.get("/api/houses").json() == {"call": 2}
+
+
+def test_first_load_is_stored_under_loaded_generation(setup):
+    client, route, state, _ = setup
+    state["generation"] = 0
+    # Generation 0: nothing loaded yet, the route performs the first load
+    route.during = lambda: state.update(generation=1)
+
+    client.get("/api/houses")
+
+    assert client.get("/api/houses").headers["x-cache"] == "HIT"
+    assert route.calls == 1
+
+
+def test_lru_limits():
+    response_cache = ResponseCache(max_entries=2, max_bytes=10)
+
+    response_cache.set("a", "A", 4, 30)
+    response_cache.set("b", "B", 4, 30)
+    assert response_cache.get("/", "a") == "A"
+    response_cache.set("c", "C", 4, 30)
+    # "b" was the least recently used; bytes also cap the total
+    assert response_cache.get("/", "b") is None
+    assert response_cache.stats()["bytes"] <= 10
+    response_cache.set("big", "X", 11, 30)
+    assert response_cache.get("/", "big") is None
@@ -0,0 +1,73 @@
+import asyncio
+import zlib
+
+import pytest
+
+import content_encoding
+from content_encoding import CompressionMiddleware
+
+BODY = b"".join(b'{"parcelno": %d, "sale_prc": %d}\n' % (i, i * 37 % 900000) for i in range(20000))
+CHUNK = 100000
+
+
+async def whole(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+    await send({"type": "http.response.body", "body": BODY})
+
+
+async def streamed(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200,
+                "headers": [(b"content-type", b"application/x-ndjson")]})
+    for start in range(0, len(BODY), CHUNK):
+        await send({"type": "http.response.body", "body": BODY[start:start + CHUNK], "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def wire_body(route, **kwargs):
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": [(b"accept-encoding", b"gzip")]}
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(CompressionMiddleware(route, **kwargs)(scope, None, send))
+    assert dict(messages[0]["headers"])[b"content-encoding"] == b"gzip"
+    return b"".join(message.get("body", b"") for message in messages[1:])
+
+
+@pytest.fixture
+def offloaded(monkeypatch):
+    calls = []
+    off_loop = content_encoding.off_loop
+
+    async def counting(fn, *args):
+        calls.append(fn)
+        return await off_loop(fn, *args)
+
+    monkeypatch.setattr(content_encoding, "off_loop", counting)
+    return calls
+
+
+@pytest.mark.parametrize("route, chunks", [(whole, 1), (streamed, -(-len(BODY) // CHUNK))])
+def test_compression_in_thread_matches_inline(offloaded, route, chunks):
+    inline = wire_body(route, thread_min_size=len(BODY) + 1)
+    assert offloaded == []
+
+    # Every chunk of at least 64 KiB, then every chunk (the empty closing one too)
+    for thread_min_size, expected in ((64 * 1024, chunks), (0, chunks if route is whole else chunks + 1)):
+        offloaded.clear()
+        assert wire_body(route, thread_min_size=thread_min_size) == inline
+        assert len(offloaded) == expected
+
+    assert zlib.decompress(inline, 31) == BODY
+
+
+def test_small_body_is_compressed_on_the_loop(offloaded):
+    small = BODY[:4096]
+
+    async def route(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": small})
+
+    assert zlib.decompress(wire_body(route), 31) == small
+    assert offloaded == []
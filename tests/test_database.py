@@ -0,0 +1,152 @@
+import asyncio
+
+import database
+
+
+def fetch_both(*columns, where=None):
+    async def run():
+        return (
+            await database.fetch_rows_sequential(*columns, where=where),
+            await database.fetch_rows_parallel(*columns, where=where, workers=3),
+        )
+    return asyncio.run(run())
+
+
+def test_parallel_matches_sequential(postgrest):
+    sequential, parallel = fetch_both()
+
+    assert parallel == sequential
+    parcelnos = [row["parcelno"] for row in sequential]
+    assert parcelnos == sorted(row["parcelno"] for row in postgrest.state.rows)
+
+
+def test_parallel_matches_sequential_with_filters(postgrest):
+    def where(query):
+        return query.gte("sale_prc", 400000)
+
+    sequential, parallel = fetch_both("parcelno", "sale_prc", where=where)
+
+    assert parallel == sequential
+    expected = sorted(row["parcelno"] for row in postgrest.state.rows if (row["sale_prc"] or 0) >= 400000)
+    assert [row["parcelno"] for row in parallel] == expected
+    assert all(set(row) == {"parcelno", "sale_prc"} for row in parallel)
+
+
+def test_pages_are_ordered_by_key(postgrest):
+    postgrest.state.queries.clear()
+    fetch_both("sale_prc")
+
+    pages = [query for query in postgrest.state.queries if "offset" in query]
+    assert pages
+    assert all(query["order"].split(".")[0] == "parcelno" for query in pages)
+
+
+class Upstream:
+    """Fake fetch: blocks until released, counts how many times it actually ran."""
+
+    def __init__(self):
+        self.calls = 0
+        self.release = None
+
+    async def fetch(self, value, fail=False):
+        self.calls += 1
+        await self.release.wait()
+        if fail:
+            raise RuntimeError(f"upstream failed for {value}")
+        return [value]
+
+
+def test_single_flight_shares_one_task():
+    flight, upstream = database.SingleFlight(), Upstream()
+
+    async def run():
+        upstream.release = asyncio.Event()
+        waiters = [asyncio.ensure_future(flight.run("a", upstream.fetch, 1)) for _ in range(5)]
+        other = asyncio.ensure_future(flight.run("b", upstream.fetch, 2))
+        await asyncio.sleep(0)
+        assert flight.stats() == {"calls": 6, "shared": 4, "in_flight": 2}
+        upstream.release.set()
+        results = await asyncio.gather(*waiters)
+        return results, await other
+
+    results, other = asyncio.run(run())
+
+    assert upstream.calls == 2
+    assert other == [2]
+    assert all(result == [1] for result in results)
+    # Every waiter receives the very same object
+    assert all(result is results[0] for result in results)
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_single_flight_propagates_exception_to_every_waiter():
+    flight, upstream = database.SingleFlight(), Upstream()
+
+    async def run():
+        upstream.release = asyncio.Event()
+        waiters = [asyncio.ensure_future(flight.run("a", upstream.fetch, 1, fail=True)) for _ in range(3)]
+        await asyncio.sleep(0)
+        upstream.release.set()
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+        # The failed flight is forgotten: the next call fetches again
+        retry = await flight.run("a", upstream.fetch, 1)
+        return results, retry
+
+    results, retry = asyncio.run(run())
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert all(result is results[0] for result in results)
+    assert retry == [1]
+    assert upstream.calls == 2
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_single_flight_cancelled_caller_does_not_cancel_others():
+    flight, upstream = database.SingleFlight(), Upstream()
+
+    async def run():
+        upstream.release = asyncio.Event()
+        first = asyncio.ensure_future(flight.run("a", upstream.fetch, 1))
+        second = asyncio.ensure_future(flight.run("a", upstream.fetch, 1))
+        await asyncio.sleep(0)
+        # The caller that started the flight goes away (client disconnected)
+        first.cancel()
+        await asyncio.sleep(0)
+        assert first.cancelled()
+        assert not second.done()
+        upstream.release.set()
+        return await second
+
+    assert asyncio.run(run()) == [1]
+    assert upstream.calls == 1
+
+
+def test_transport_stats_count_pool_connections(postgrest):
+    transport = database.UpstreamTransport(limits=database.httpx.Limits(max_keepalive_connections=4))
+
+    async def run():
+        async with database.httpx.AsyncClient(base_url=database.SUPABASE_URL, transport=transport) as client:
+            for _ in range(3):
+                response = await client.get("/rest/v1/miami_housing", params={"select": "parcelno", "limit": 1})
+                assert response.status_code == 200
+            return transport.stats()
+
+    stats = asyncio.run(run())
+
+    # One keep-alive connection served all three requests and is now idle
+    assert stats["requests"] == 3
+    assert stats["connections_opened"] == 1
+    assert stats["reuse_ratio"] == 1 - 1 / 3
+    assert (stats["connections"], stats["active"], stats["idle"]) == (1, 0, 1)
+    assert stats["http_versions"] == {"HTTP/1.1": 3}
+
+
+def test_transport_stats_without_pool_internals(monkeypatch):
+    transport = database.UpstreamTransport()
+    # An httpcore release without the attribute: the counts degrade to None
+    monkeypatch.setattr(transport, "_pool", object())
+
+    stats = transport.stats()
+
+    assert (stats["connections"], stats["active"], stats["idle"]) == (None, None, None)
+    assert stats["requests"] == 0 and stats["reuse_ratio"] is None
@@ -0,0 +1,86 @@
+import math
+
+import numpy as np
+import pytest
+
+from geo import KDTree
+
+
+def brute_force(x, y, px, py, k, radius=math.inf, accept=None):
+    rows = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+    if accept is not None:
+        rows = rows[accept(rows)]
+    dist = np.hypot(x[rows] - px, y[rows] - py)
+    rows, dist = rows[dist <= radius], dist[dist <= radius]
+    order = np.lexsort((rows, dist))[:k]
+    return rows[order], dist[order]
+
+
+def assert_same_neighbours(x, y, tree, px, py, k, radius=math.inf, accept=None):
+    rows, dist = tree.query(px, py, k, radius, accept)
+    expected_rows, expected_dist = brute_force(x, y, px, py, k, radius, accept)
+
+    np.testing.assert_allclose(dist, expected_dist)
+    assert len(set(rows.tolist())) == len(rows)
+    np.testing.assert_allclose(np.hypot(x[rows] - px, y[rows] - py), dist)
+    if len(dist):
+        # Ties at the k-th distance may be broken either way; closer rows must match exactly
+        closer = expected_dist < expected_dist[-1]
+        assert set(expected_rows[closer].tolist()) <= set(rows.tolist())
+        tied = np.flatnonzero(np.isclose(np.hypot(x - px, y - py), expected_dist[-1]))
+        assert set(rows[~np.isin(rows, expected_rows[closer])].tolist()) <= set(tied.tolist())
+
+
+@pytest.fixture(scope="module")
+def grid():
+    # Integer lattice with duplicated points: many equal distances, plus rows without coordinates
+    xs, ys = np.meshgrid(np.arange(40.0), np.arange(30.0))
+    x, y = np.concatenate([xs.ravel(), [5.0, 5.0, np.nan]]), np.concatenate([ys.ravel(), [5.0, 5.0, 3.0]])
+    return x, y, KDTree(x, y, leaf_size=8)
+
+
+@pytest.fixture(scope="module")
+def scattered():
+    rng = np.random.default_rng(3)
+    x, y = rng.normal(0, 1000, 5000), rng.normal(0, 500, 5000)
+    return x, y, KDTree(x, y)
+
+
+@pytest.mark.parametrize("point", [(5.0, 5.0), (10.5, 10.5), (0.0, 0.0), (39.0, 29.0), (19.5, 14.0)])
+@pytest.mark.parametrize("k", [1, 4, 9, 25])
+def test_ties_on_a_lattice(grid, point, k):
+    x, y, tree = grid
+    assert_same_neighbours(x, y, tree, *point, k)
+
+
+@pytest.mark.parametrize("point", [(-500.0, -500.0), (100.0, 15.0), (20.0, -1e6), (1e9, 1e9)])
+def test_queries_outside_the_bounding_box(grid, point):
+    x, y, tree = grid
+    for k in (1, 7, 50):
+        assert_same_neighbours(x, y, tree, *point, k)
+
+
+def test_k_larger_than_n(grid):
+    x, y, tree = grid
+    rows, dist = tree.query(3.0, 3.0, 10_000)
+    # Every row with coordinates, none twice, in order of distance
+    assert sorted(rows.tolist()) == np.flatnonzero(np.isfinite(x)).tolist()
+    assert np.all(np.diff(dist) >= 0)
+    assert_same_neighbours(x, y, tree, 3.0, 3.0, 10_000)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_queries(scattered, seed):
+    x, y, tree = scattered
+    rng = np.random.default_rng(seed)
+    px, py = rng.normal(0, 2000), rng.normal(0, 1000)
+    k = int(rng.integers(1, 60))
+    assert_same_neighbours(x, y, tree, px, py, k)
+    assert_same_neighbours(x, y, tree, px, py, k, radius=float(rng.uniform(10, 800)))
+    assert_same_neighbours(x, y, tree, px, py, k, accept=lambda rows: rows % 3 == 0)
+
+
+def test_empty_tree():
+    tree = KDTree(np.array([np.nan]), np.array([np.nan]))
+    rows, dist = tree.query(0.0, 0.0, 5)
+    assert len(rows) == 0 and len(dist) == 0
@@ -0,0 +1,79 @@
+import random
+
+import numpy as np
+import pytest
+
+from conftest import make_rows
+from filters import filter_mask
+from indexes import select_rows
+from snapshot import Snapshot
+
+# Same (column, operator) pairs as the sidebar filters, plus an unindexed column
+PREDICATES = [
+    ("sale_prc", "gte"), ("sale_prc", "lte"),
+    ("age", "gte"), ("age", "lte"),
+    ("tot_lvg_area", "gte"), ("tot_lvg_area", "lte"),
+    ("structure_quality", "eq"),
+    ("avno60plus", "eq"),
+    ("ocean_dist", "lte"),
+    ("hwy_dist", "lte"),
+    ("lnd_sqfoot", "gte"),
+]
+
+
+@pytest.fixture(scope="module")
+def snap():
+    # Includes null prices (NaN), which no predicate may select
+    return Snapshot.from_rows(make_rows(3000, seed=7))
+
+
+def pick_value(rng, values, op):
+    known = values[~np.isnan(values)] if values.dtype.kind == "f" else values
+    choice = rng.random()
+    if choice < 0.4:
+        # An existing value: the boundary itself must be included
+        return known[rng.randrange(len(known))].item()
+    if choice < 0.55:
+        return known.min().item()
+    if choice < 0.7:
+        return known.max().item()
+    if choice < 0.8:
+        # Outside the data on either side
+        return (known.min() - 1 if op == "lte" else known.max() + 1).item()
+    return rng.uniform(known.min().item(), known.max().item())
+
+
+def random_filters(snap, rng):
+    filters = []
+    for column, op in rng.sample(PREDICATES, rng.randint(1, 5)):
+        filters.append((column, op, pick_value(rng, snap[column], op)))
+    if rng.random() < 0.2:
+        # Contradictory or repeated predicates on one column
+        column, op = rng.choice(PREDICATES)
+        filters.append((column, op, pick_value(rng, snap[column], op)))
+    return filters
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_select_rows_matches_filter_mask(snap, seed):
+    filters = random_filters(snap, random.Random(seed))
+    expected = np.flatnonzero(filter_mask(snap, filters))
+    np.testing.assert_array_equal(select_rows(snap, filters), expected)
+
+
+@pytest.mark.parametrize("filters", [
+    [("sale_prc", "gte", 3e6)],
+    [("sale_prc", "gte", 900000), ("sale_prc", "lte", 100000)],
+    [("structure_quality", "eq", 2), ("structure_quality", "eq", 3)],
+    [("structure_quality", "eq", 9)],
+    [("avno60plus", "eq", 1), ("age", "lte", -1)],
+])
+def test_empty_selections(snap, filters):
+    rows = select_rows(snap, filters)
+    assert len(rows) == 0
+    assert not filter_mask(snap, filters).any()
+
+
+def test_no_filters_selects_everything(snap):
+    assert select_rows(snap, []) is None
+    assert filter_mask(snap, []).all()
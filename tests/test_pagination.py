@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+import main
+import pushdown
+from conftest import make_rows
+from indexes import select_rows
+from snapshot import Snapshot
+
+
+@pytest.fixture(scope="module")
+def snap():
+    return Snapshot.from_rows(make_rows(1000, seed=5))
+
+
+def walk(snap, rows, limit):
+    pages, cursor = [], None
+    while True:
+        page, cursor = snap.page_after(rows, cursor, limit)
+        pages.append(page)
+        if cursor is None:
+            return pages
+        # The cursor is the last parcelno of the page
+        assert cursor == snap["parcelno"][page[-1]]
+
+
+@pytest.mark.parametrize("limit", [1, 7, 100, 250, 999, 1000, 1001, 5000])
+@pytest.mark.parametrize("filters", [
+    [],
+    [("sale_prc", "gte", 800000)],
+    [("structure_quality", "eq", 5)],
+    [("sale_prc", "gte", 9e9)],
+])
+def test_page_after_walks_every_row_once(snap, limit, filters):
+    rows = select_rows(snap, filters)
+    pages = walk(snap, rows, limit)
+
+    expected = np.arange(len(snap)) if rows is None else rows
+    walked = np.concatenate(pages)
+    parcelnos = snap["parcelno"][walked]
+    # Every selected row exactly once, in parcelno order
+    assert len(walked) == len(expected)
+    assert set(walked.tolist()) == set(expected.tolist())
+    assert np.all(np.diff(parcelnos) > 0)
+    # Full pages except the last; the limit + 1 look-ahead leaves no trailing empty page
+    assert all(len(page) == limit for page in pages[:-1])
+    assert len(pages[-1]) > 0 or len(expected) == 0
+    assert len(pages) == max(1, -(-len(expected) // limit))
+
+
+def test_cursor_between_existing_keys(snap):
+    # A cursor that is not an existing parcelno resumes at the next larger one
+    ordered = np.sort(snap["parcelno"])
+    page, _ = snap.page_after(None, int(ordered[10]) + 1, 3)
+    assert snap["parcelno"][page].tolist() == ordered[11:14].tolist()
+
+
+@pytest.mark.parametrize("backend", ["python", "postgres"])
+@pytest.mark.parametrize("query, filters", [
+    ("", []),
+    ("&min_price=700000", [("sale_prc", "gte", 700000)]),
+    ("&structure_quality=4&max_age=40", [("structure_quality", "eq", 4), ("age", "lte", 40)]),
+])
+def test_next_cursor_header_walks_all_pages(client, postgrest, monkeypatch, backend, query, filters):
+    # The Postgres backend pages through the stand-in with keyset queries
+    monkeypatch.setattr(pushdown, "AGGREGATION_BACKEND", backend)
+    main.response_cache.clear()
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        url = f"/api/houses?limit=400&fields=parcelno{query}"
+        response = client.get(url if cursor is None else f"{url}&after={cursor}")
+        assert response.status_code == 200
+        page = [row["parcelno"] for row in response.json()]
+        seen.extend(page)
+        pages += 1
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+        assert int(cursor) == page[-1]
+        assert len(page) == 400
+
+    snapshot = Snapshot.from_rows(postgrest.state.rows)
+    rows = select_rows(snapshot, filters)
+    expected = np.sort(snapshot["parcelno"] if rows is None else snapshot["parcelno"][rows]).tolist()
+    assert seen == expected
+    assert pages == max(1, -(-len(expected) // 400))
@@ -0,0 +1,36 @@
+import pytest
+from fastapi import HTTPException
+
+import main
+
+
+@pytest.mark.parametrize("bbox", [
+    "nan,nan,nan,nan",
+    "-80.5,25.4,nan,26",
+    "-inf,25.4,-80.1,26",
+    "-80.5,25.4,-80.1,inf",
+    "-80.5,25.4,-80.1",
+    "-80.1,25.4,-80.5,26",
+    "a,b,c,d",
+])
+def test_parse_bbox_rejects_invalid(bbox):
+    with pytest.raises(HTTPException) as error:
+        main.parse_bbox(bbox)
+    assert error.value.status_code == 400
+
+
+def test_parse_bbox():
+    assert main.parse_bbox("-80.5,25.4,-80.1,26") == (-80.5, 25.4, -80.1, 26.0)
+    assert main.parse_bbox("") is None
+
+
+@pytest.mark.parametrize("edges", ["nan,1", "0,nan", "0,inf", "-inf,0", "0,0,1", "5,1", "1", "a,b"])
+def test_parse_edges_rejects_invalid(edges):
+    with pytest.raises(HTTPException) as error:
+        main.parse_edges(edges)
+    assert error.value.status_code == 400
+
+
+def test_parse_edges():
+    assert main.parse_edges("0,1000,5000") == [0.0, 1000.0, 5000.0]
+    assert main.parse_edges(None) is None
@@ -0,0 +1,72 @@
+"""
+The Python (snapshot) and Postgres (api/sql/aggregations.sql) aggregation
+backends must answer the statistics routes with the same JSON.
+
+Needs a Postgres at PARITY_DATABASE_URL (any scratch database; the tests
+create and drop their own schema); skipped otherwise.
+"""
+import math
+
+import pytest
+
+import main
+import pushdown
+
+FILTERS = (
+    "",
+    "min_price=200000&max_price=900000",
+    "structure_quality=4&min_age=10&max_age=60",
+    "avno60plus=1&max_ocean_dist=40000",
+    "min_area=1500&max_area=3000&max_hwy_dist=20000",
+)
+
+ROUTES = (
+    "/api/houses/price-stats",
+    "/api/houses/price-stats?summary=1",
+    "/api/houses/price-stats?summary=1&bins=12",
+    "/api/houses/price-stats?max_points=50",
+    "/api/houses/sales-time",
+    "/api/houses/distance-impact",
+    "/api/houses/distance-impact?columns=rail_dist,water_dist,spec_feat_val&buckets=5",
+    "/api/houses/distance-impact?edges=0,5000,20000,50000&ocean_near=10000&hwy_near=2000",
+    "/api/houses/distance-impact?raw=1&max_points=40",
+)
+
+
+@pytest.fixture(scope="module")
+def client(database, client):
+    return client
+
+
+def fetch(client, monkeypatch, backend, url):
+    monkeypatch.setattr(pushdown, "AGGREGATION_BACKEND", backend)
+    # The response cache key does not include the backend
+    main.response_cache.clear()
+    response = client.get(url)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def assert_same(python, postgres, path="$"):
+    if isinstance(python, dict):
+        assert isinstance(postgres, dict) and python.keys() == postgres.keys(), path
+        for key in python:
+            assert_same(python[key], postgres[key], f"{path}.{key}")
+    elif isinstance(python, list):
+        assert isinstance(postgres, list) and len(python) == len(postgres), path
+        for i, (a, b) in enumerate(zip(python, postgres)):
+            assert_same(a, b, f"{path}[{i}]")
+    elif isinstance(python, float) or isinstance(postgres, float):
+        # Sums and averages accumulate in a different order in each backend
+        assert math.isclose(python, postgres, rel_tol=1e-9, abs_tol=1e-6), (path, python, postgres)
+    else:
+        assert python == postgres, (path, python, postgres)
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+@pytest.mark.parametrize("route", ROUTES)
+def test_backends_agree(client, monkeypatch, route, filters):
+    url = f"{route}{'&' if '?' in route else '?'}{filters}" if filters else route
+    python = fetch(client, monkeypatch, "python", url)
+    postgres = fetch(client, monkeypatch, "postgres", url)
+    assert_same(python, postgres)
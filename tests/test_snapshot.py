@@ -0,0 +1,264 @@
+import asyncio
+import copy
+import types
+
+import pytest
+
+import snapshot
+from conftest import make_rows
+from snapshot import SnapshotStore
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Wall clock seen by the snapshot module only
+    clock = types.SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(snapshot, "time", types.SimpleNamespace(time=lambda: clock.now))
+    return clock
+
+
+class Table:
+    """Stand-in for the miami_housing table: rows plus a signature the test controls."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.signature = "s1"
+        self.loads = 0
+        self.checks = 0
+
+    async def load(self):
+        self.loads += 1
+        return copy.deepcopy(self.rows)
+
+    async def sign(self):
+        self.checks += 1
+        return self.signature
+
+
+def make_store(table, **kwargs):
+    kwargs.setdefault("ttl", 0)
+    kwargs.setdefault("check_interval", 0)
+    kwargs.setdefault("full_reload_interval", 0)
+    return SnapshotStore(table.load, table.sign, **kwargs)
+
+
+def test_revalidate_keeps_snapshot_when_signature_matches():
+    table = Table(make_rows(200, seed=1))
+    store = make_store(table)
+
+    async def run():
+        first = await store.get()
+        await store.revalidate()
+        await store.revalidate()
+        return first, await store.get()
+
+    first, second = asyncio.run(run())
+
+    assert second is first
+    assert table.loads == 1
+    assert store.generation == 1
+    assert store.metrics["checks"] == 2
+    assert store.metrics["changes"] == 0
+
+
+def test_revalidate_swaps_in_new_snapshot_and_bumps_generation():
+    table = Table(make_rows(200, seed=1))
+    store = make_store(table)
+
+    async def run():
+        first = await store.get()
+        table.rows[0]["sale_prc"] = 123456.0
+        table.signature = "s2"
+        await store.revalidate()
+        return first, await store.get()
+
+    first, second = asyncio.run(run())
+
+    assert second is not first
+    assert second.generation == store.generation == 2
+    assert second.version != first.version
+    assert second.modified_at >= first.modified_at
+    assert 123456.0 in second["sale_prc"]
+    assert store.metrics["changes"] == 1
+    assert store.stats()["signature"] == "s2"
+
+
+def test_reload_with_same_content_keeps_generation():
+    table = Table(make_rows(200, seed=1))
+    store = make_store(table)
+
+    async def run():
+        first = await store.get()
+        # Signature moved (e.g. a touched row) but the content is identical
+        table.signature = "s2"
+        await store.revalidate()
+        return first, await store.get()
+
+    first, second = asyncio.run(run())
+
+    assert table.loads == 2
+    assert second is not first
+    assert second.version == first.version
+    assert second.generation == first.generation == store.generation == 1
+    assert second.modified_at == first.modified_at
+
+
+def test_background_refresher_picks_up_changes():
+    table = Table(make_rows(200, seed=1))
+    store = make_store(table, check_interval=0.01)
+
+    async def wait_for(condition):
+        for _ in range(500):
+            if condition():
+                return
+            await asyncio.sleep(0.01)
+        raise AssertionError("refresher did not catch up")
+
+    async def run():
+        store.start()
+        try:
+            assert store.refreshing_in_background
+            # The first round of the loop loads the snapshot
+            await wait_for(lambda: store.current() is not None)
+            first = store.current()
+            generations = [store.generation]
+
+            # Several rounds with the same signature: nothing is reloaded
+            checks = table.checks
+            await wait_for(lambda: table.checks >= checks + 3)
+            generations.append(store.generation)
+            assert store.current() is first
+            assert table.loads == 1
+
+            table.rows = make_rows(150, seed=2)
+            table.signature = "s2"
+            await wait_for(lambda: store.current() is not first)
+            generations.append(store.generation)
+            return first, store.current(), generations
+        finally:
+            await store.stop()
+
+    first, second, generations = asyncio.run(run())
+
+    assert generations == [1, 1, 2]
+    assert len(first) == 200 and len(second) == 150
+    assert not store.refreshing_in_background
+
+
+def test_refresher_survives_failed_round():
+    table = Table(make_rows(200, seed=1))
+    store = make_store(table, check_interval=0.01)
+
+    async def fail():
+        table.checks += 1
+        raise RuntimeError("upstream down")
+
+    async def run():
+        first = await store.get()
+        store.signature = fail
+        store.start()
+        try:
+            while store.metrics["failures"] < 2:
+                await asyncio.sleep(0.01)
+            # Readers keep the previous snapshot while the table is unreachable
+            assert store.current() is first
+            store.signature = table.sign
+            table.rows = make_rows(150, seed=2)
+            table.signature = "s2"
+            while store.current() is first:
+                await asyncio.sleep(0.01)
+            return store.current()
+        finally:
+            await store.stop()
+
+    second = asyncio.run(asyncio.wait_for(run(), timeout=5))
+
+    assert len(second) == 150
+    assert store.generation == 2
+    assert "upstream down" in store.metrics["last_error"]
+
+
+def test_expired_ttl_with_same_signature_extends_instead_of_reloading(clock):
+    table = Table(make_rows(200, seed=1))
+    store = make_store(table, ttl=300)
+
+    async def run():
+        first = await store.get()
+        clock.now += 301
+        assert store.is_expired(first)
+        await store.revalidate()
+        assert not store.is_expired(first)
+        clock.now += 200
+        assert await store.get() is first
+        clock.now += 101
+        # Request path without the refresher: same check, same extension
+        assert await store.get() is first
+        assert not store.is_expired(first)
+        return first
+
+    asyncio.run(run())
+
+    assert table.loads == 1
+    assert store.metrics["reloads"] == 1
+    assert store.metrics["checks"] == 2
+
+
+def test_expired_ttl_with_changed_signature_reloads(clock):
+    table = Table(make_rows(200, seed=1))
+    store = make_store(table, ttl=300)
+
+    async def run():
+        first = await store.get()
+        clock.now += 301
+        table.rows = make_rows(150, seed=2)
+        table.signature = "s2"
+        return first, await store.get()
+
+    first, second = asyncio.run(run())
+
+    assert second is not first
+    assert len(second) == 150
+    assert store.generation == 2
+
+
+def test_full_reload_interval_reloads_despite_same_signature(clock):
+    table = Table(make_rows(200, seed=1))
+    store = make_store(table, ttl=300, full_reload_interval=3600)
+
+    async def run():
+        first = await store.get()
+        # Confirmed every round: the TTL never runs out
+        for _ in range(11):
+            clock.now += 300
+            await store.revalidate()
+        assert table.loads == 1
+        clock.now += 300
+        await store.revalidate()
+        return first, await store.get()
+
+    first, second = asyncio.run(run())
+
+    assert table.loads == 2
+    assert second is not first
+    # Same content: the safety-net reload keeps the generation
+    assert second.generation == store.generation == 1
+
+
+def test_without_signature_reloads_at_ttl(clock):
+    table = Table(make_rows(200, seed=1))
+    store = SnapshotStore(table.load, None, ttl=300, check_interval=0, full_reload_interval=0)
+
+    async def run():
+        first = await store.get()
+        clock.now += 299
+        await store.revalidate()
+        assert table.loads == 1
+        clock.now += 1
+        await store.revalidate()
+        return first, await store.get()
+
+    first, second = asyncio.run(run())
+
+    assert table.loads == 2
+    assert second is not first
+    assert store.metrics["checks"] == 0